@@ -0,0 +1,62 @@
+import sys
+import os
+import asyncio
+import time
+import resource
+
+# Add project root to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from src.utxo_manager import UTXOManager
+from src.mempool import Mempool
+from src.chain import Blockchain
+from src.node import Node, NodeClient
+from src.transaction import create_transaction
+from src.keys import DEMO_KEYS, demo_address
+
+async def run_benchmark(clients, txs_per_client, port):
+    # Every client gets its own funded coins so all submissions are valid
+    # Transactions are signed up front so the timing covers the node, not the wallets
+    utxo = UTXOManager()
+    shops = [demo_address(f"shop_{s}") for s in range(100)]
+    txs = []
+    for c in range(clients):
+        wallet = demo_address(f"wallet_{c}")
+        for i in range(txs_per_client):
+            utxo.add_utxo(f"fund_{c}", i, 1.0, wallet)
+        txs.append([create_transaction([{"prev_tx": f"fund_{c}", "index": i, "owner": wallet}],
+                                       [{"amount": 0.999, "address": shops[c % 100]}], DEMO_KEYS)
+                    for i in range(txs_per_client)])
+    node = Node(utxo, Mempool(max_size=clients * txs_per_client), Blockchain(utxo))
+    server = await node.start("127.0.0.1", port)
+
+    async def client(c):
+        conn = await NodeClient.connect("127.0.0.1", port)
+        accepted = 0
+        for tx in txs[c]:
+            result = await conn.call("submit_transaction", tx=tx)
+            accepted += result["accepted"]
+        await conn.close()
+        return accepted
+
+    start = time.perf_counter()
+    accepted = sum(await asyncio.gather(*(client(c) for c in range(clients))))
+    elapsed = time.perf_counter() - start
+    server.close()
+    await server.wait_closed()
+    node.close()
+
+    print(f"Concurrent clients: {clients:,}")
+    print(f"Accepted:           {accepted:,} / {clients * txs_per_client:,}")
+    print(f"Throughput:         {accepted / elapsed:,.0f} tx/s")
+
+if __name__ == "__main__":
+    # Usage: python3 benchmarks/node_load.py [clients] [txs_per_client]
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    # Each client holds two sockets (ours and the server's end)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, 2 * clients + 256)), hard))
+    asyncio.run(run_benchmark(clients, per_client, 18333))
@@ -0,0 +1,315 @@
+import sys
+import os
+import time
+import json
+import argparse
+import itertools
+import statistics
+import platform
+import subprocess
+
+# Add project root to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+sys.path.append(current_dir)
+
+from src.workload import Workload
+from src.utxo_manager import UTXOManager
+from src.sharding import ShardedUTXOManager
+from src.commitment import UTXOCommitment, verify_utxo
+from src.mempool import Mempool
+from src.chain import Blockchain
+from src.mining import mine_block
+from src.keys import Keyring, demo_seckey
+from src.schnorr import verify, batch_verify
+from src import pow as proof_of_work
+from src import validator
+from utxo_memory import measure, build_compact_layout
+
+def percentiles(samples):
+    """p50/p90/p99/max of a list of seconds, reported in milliseconds."""
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {"p50_ms": pick(0.50), "p90_ms": pick(0.90), "p99_ms": pick(0.99), "max_ms": ordered[-1] * 1000}
+
+def fresh_state(args):
+    """Funded UTXO set, empty mempool, and the pre-generated transactions."""
+    workload = Workload(args.wallets, seed=args.seed)
+    utxo = UTXOManager()
+    workload.fund(utxo)
+    txs = list(workload.transactions(args.txs))
+    return utxo, Mempool(max_size=len(txs)), txs
+
+def bench_admission(args):
+    utxo, mempool, txs = fresh_state(args)
+    start = time.perf_counter()
+    accepted = sum(mempool.add_transaction(tx, utxo)[0] for tx in txs)
+    single = time.perf_counter() - start
+
+    utxo, mempool, txs = fresh_state(args)
+    start = time.perf_counter()
+    batched = 0
+    for i in range(0, len(txs), args.batch):
+        batched += sum(ok for ok, _ in mempool.add_transactions(txs[i:i + args.batch], utxo))
+    batch = time.perf_counter() - start
+
+    return {
+        "txs": len(txs),
+        "accepted": accepted,
+        "accepts_per_sec": accepted / single,
+        "batch_size": args.batch,
+        "batch_accepted": batched,
+        "batch_accepts_per_sec": batched / batch,
+    }
+
+def bench_block_building(args):
+    utxo, mempool, txs = fresh_state(args)
+    for tx in txs:
+        mempool.add_transaction(tx, utxo)
+
+    top = []
+    for _ in range(args.samples):
+        start = time.perf_counter()
+        mempool.get_top_transactions(args.block_txs)
+        top.append(time.perf_counter() - start)
+
+    chain = Blockchain(utxo)
+    mined = []
+    while len(mempool) and len(mined) < args.samples:
+        start = time.perf_counter()
+        block = mine_block("bench_miner", mempool, utxo, chain=chain, max_txs=args.block_txs, verbose=False)
+        mined.append(time.perf_counter() - start)
+        if block is None:
+            break
+
+    return {
+        "mempool_size": len(txs),
+        "block_txs": args.block_txs,
+        "get_top_transactions": percentiles(top),
+        "mine_block": dict(percentiles(mined), blocks=len(mined)),
+    }
+
+def bench_signatures(args):
+    """Schnorr sign/verify rates, batch verification, and re-checks answered by the signature cache."""
+    keyring = Keyring()
+    addresses = [keyring.add(demo_seckey(f"bench_{i}")) for i in range(args.signatures)]
+    msgs = [i.to_bytes(32, "big") for i in range(args.signatures)]
+
+    start = time.perf_counter()
+    items = [(keyring.pubkey(a), m, keyring.sign(a, m)) for a, m in zip(addresses, msgs)]
+    sign = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert all(verify(*item) for item in items)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert batch_verify(items)
+    batch = time.perf_counter() - start
+
+    utxo, _, txs = fresh_state(args)
+    sample = txs[:args.signatures]
+    validator.clear_signature_cache()
+    start = time.perf_counter()
+    validator.check_transactions_stateless(sample)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    validator.check_transactions_stateless(sample)
+    warm = time.perf_counter() - start
+
+    return {
+        "signatures": len(items),
+        "signs_per_sec": len(items) / sign,
+        "verifies_per_sec": len(items) / single,
+        "batch_verifies_per_sec": len(items) / batch,
+        "stateless_txs_per_sec": len(sample) / cold,
+        "cached_stateless_txs_per_sec": len(sample) / warm,
+    }
+
+def bench_analytics(args):
+    """UTXOStats snapshot and summary vs one Python pass over items() (needs NumPy)."""
+    from src.analytics import np, UTXOStats
+    if np is None:
+        return {"skipped": "NumPy not installed"}
+    utxo = build_compact_layout(args.analytics_size)
+
+    start = time.perf_counter()
+    stats = UTXOStats(utxo)
+    snapshot = time.perf_counter() - start
+    start = time.perf_counter()
+    stats.summary()
+    summary = time.perf_counter() - start
+
+    # Baseline: the per-entry loop the menu used to run, computing only the balances
+    start = time.perf_counter()
+    balances = {}
+    for _, record in utxo.items():
+        balances[record["owner"]] = balances.get(record["owner"], 0) + record["amount_sats"]
+    loop = time.perf_counter() - start
+
+    return {
+        "utxos": len(utxo),
+        "snapshot_ms": snapshot * 1000,
+        "summary_ms": summary * 1000,
+        "python_loop_balances_ms": loop * 1000,
+    }
+
+def bench_pow(args):
+    """Nonce search hash rate with 1, 2, 4, ... worker processes up to the CPU count."""
+    cpus = os.cpu_count() or 1
+    counts = sorted({1 << i for i in range(cpus.bit_length()) if 1 << i <= cpus} | {cpus})
+    results = {}
+    single = None
+    for workers in counts:
+        rate = proof_of_work.hashrate(workers, args.pow_hashes)
+        single = single or rate["hashes_per_sec"]
+        results[str(workers)] = {
+            "hashes_per_sec": rate["hashes_per_sec"],
+            "hashes_per_sec_per_core": rate["hashes_per_sec_per_core"],
+            "scaling_efficiency": rate["hashes_per_sec"] / (single * workers),
+        }
+    return results
+
+def bench_sharding(args):
+    """Batched inserts and lookups: in-process UTXOManager vs 2, 4, ... shard processes."""
+    cpus = os.cpu_count() or 1
+    adds = [(f"{i:064x}", i % 3, 1_000 + i, f"owner{i % 1_000}", 0) for i in range(args.shard_size)]
+    keys = [(tx_id, index) for tx_id, index, *_ in adds[::7]]
+    results = {}
+    for shards in [0] + [n for n in (2, 4, 8, 16) if n <= max(cpus, 2)]:
+        utxo = ShardedUTXOManager(shards) if shards else UTXOManager()
+        start = time.perf_counter()
+        for i in range(0, len(adds), 10_000):
+            utxo.apply_changes([], adds[i:i + 10_000])
+        len(utxo)  # Waits until every shard has applied its changes
+        inserts = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(0, len(keys), 1_000):
+            utxo.get_many(keys[i:i + 1_000])
+        lookups = time.perf_counter() - start
+        if shards:
+            utxo.close()
+        results["in_process" if not shards else f"{shards}_shards"] = {
+            "inserts_per_sec": len(adds) / inserts,
+            "lookups_per_sec": len(keys) / lookups,
+        }
+    return results
+
+def bench_commitment(args):
+    """UTXO set commitment: one-pass build, per-change cost, digest and proof times."""
+    utxo = build_compact_layout(args.commitment_size)
+    changes = [(f"bench_{i:08x}", 0, 1_000 + i, "bench_owner", 0) for i in range(1_000)]
+
+    def churn():
+        start = time.perf_counter()
+        utxo.apply_changes([], changes)
+        utxo.apply_changes([change[:2] for change in changes], [])
+        return (time.perf_counter() - start) / (2 * len(changes))
+
+    results = {"utxos": len(utxo), "plain_change_us": churn() * 1e6}
+    for name, proofs in (("muhash", False), ("muhash_and_tree", True)):
+        utxo.commitment = None
+        start = time.perf_counter()
+        utxo.attach_commitment(UTXOCommitment(proofs))
+        build = time.perf_counter() - start
+        change = churn()
+        start = time.perf_counter()
+        utxo.commitment.digest()
+        digest = time.perf_counter() - start
+        results[name] = {"build_ms": build * 1000, "change_us": change * 1e6, "digest_ms": digest * 1000}
+    keys = [key for key, _ in itertools.islice(utxo.items(), 0, None, max(1, len(utxo) // args.samples))]
+    start = time.perf_counter()
+    proofs = [utxo.commitment.prove(*key) for key in keys]
+    prove = time.perf_counter() - start
+    root = utxo.commitment.root
+    start = time.perf_counter()
+    for key, proof in zip(keys, proofs):
+        record = utxo.get_utxo(*key)
+        verify_utxo(root, *key, record["amount_sats"], record["owner"], record["height"], proof)
+    verify = time.perf_counter() - start
+    results["proof"] = {
+        "mean_hashes": statistics.fmean(len(proof) for proof in proofs),
+        "prove_us": prove / len(keys) * 1e6,
+        "verify_us": verify / len(keys) * 1e6,
+    }
+    return results
+
+def bench_memory(args):
+    results = {}
+    for n in args.utxo_sizes:
+        used = measure(build_compact_layout, n)
+        results[str(n)] = {"bytes": used, "bytes_per_utxo": used / n}
+    return results
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=parent_dir,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(current, baseline, path=""):
+    """Print every numeric result next to the baseline value and the relative change."""
+    for key, value in current.items():
+        name = f"{path}.{key}" if path else key
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            compare(value, old or {}, name)
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            print(f"{name:<50} {old:>14,.2f} -> {value:>14,.2f} ({value / old - 1:+.1%})")
+
+def run_benchmarks(args):
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": args.seed,
+            "wallets": args.wallets,
+        },
+        "admission": bench_admission(args),
+        "block_building": bench_block_building(args),
+        "signatures": bench_signatures(args),
+        "analytics": bench_analytics(args),
+        "proof_of_work": bench_pow(args),
+        "sharding": bench_sharding(args),
+        "commitment": bench_commitment(args),
+        "utxo_memory": bench_memory(args),
+    }
+    return report
+
+if __name__ == "__main__":
+    # Usage: python3 benchmarks/run_benchmarks.py [--txs N] [--utxo-sizes 10000,1000000] [--output out.json]
+    # The same seed always produces the same workload, so runs on different commits compare.
+    parser = argparse.ArgumentParser(description="End-to-end benchmark suite (JSON output).")
+    parser.add_argument("--txs", type=int, default=20_000, help="Transactions to generate")
+    parser.add_argument("--wallets", type=int, default=5_000, help="Funded wallets in the workload")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=1_000, help="Batch size for add_transactions")
+    parser.add_argument("--block-txs", type=int, default=1_000, help="Transactions per mined block")
+    parser.add_argument("--samples", type=int, default=50, help="Latency samples per operation")
+    parser.add_argument("--signatures", type=int, default=500, help="Signatures (and txs) in the signature benchmark")
+    parser.add_argument("--analytics-size", type=int, default=1_000_000, help="UTXOs in the analytics benchmark")
+    parser.add_argument("--pow-hashes", type=int, default=500_000, help="Hashes per worker in the proof-of-work benchmark")
+    parser.add_argument("--shard-size", type=int, default=200_000, help="UTXOs in the sharding benchmark")
+    parser.add_argument("--commitment-size", type=int, default=100_000, help="UTXOs in the commitment benchmark")
+    parser.add_argument("--utxo-sizes", default="10000,1000000,10000000",
+                        type=lambda s: [int(x) for x in s.split(",") if x])
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to diff against")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        compare({k: v for k, v in report.items() if k != "meta"}, baseline)
@@ -0,0 +1,40 @@
+import sys
+import os
+import time
+
+# Add project root to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from src.transaction import compute_tx_id, assign_tx_ids
+
+def make_txs(n, inputs=2, outputs=2):
+    """Unhashed transactions shaped like typical wallet payments."""
+    txs = []
+    for i in range(n):
+        txs.append({
+            "inputs": [{"prev_tx": f"{i:064x}", "index": j, "owner": f"owner_{i % 1000}"} for j in range(inputs)],
+            "outputs": [{"amount": 1.5 + j, "address": f"addr_{(i + j) % 1000}"} for j in range(outputs)]
+        })
+    return txs
+
+def run_benchmark(n):
+    txs = make_txs(n)
+    start = time.perf_counter()
+    for tx in txs:
+        compute_tx_id(tx)
+    single = n / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    ids = assign_tx_ids(txs)
+    batch = n / (time.perf_counter() - start)
+
+    print(f"Transactions:           {n:,}")
+    print(f"One at a time:          {single:,.0f} IDs/s")
+    print(f"assign_tx_ids (batch):  {batch:,.0f} IDs/s ({os.cpu_count()} CPUs)")
+    print(f"Unique IDs:             {len(set(ids)) == n}")
+
+if __name__ == "__main__":
+    # Usage: python3 benchmarks/tx_id_throughput.py [count]
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,65 @@
+import sys
+import os
+import gc
+import tracemalloc
+
+# Add project root to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from src.utxo_manager import UTXOManager
+
+OWNERS = 10_000     # Distinct addresses, so owners repeat like a real set
+OUTPUTS_PER_TX = 2
+
+def build_dict_layout(n):
+    """
+    The previous layout: (tx_id, index) -> {"amount": float, "owner": str},
+    plus the owner -> outpoints index and float balances kept next to it.
+    """
+    utxo_set = {}
+    owner_index = {}
+    balances = {}
+    for i in range(n):
+        key = (f"tx_{i // OUTPUTS_PER_TX:016x}", i % OUTPUTS_PER_TX)
+        owner = f"owner_{i % OWNERS}"
+        amount = (i % 5000) / 100.0
+        utxo_set[key] = {"amount": amount, "owner": owner}
+        owner_index.setdefault(owner, set()).add(key)
+        balances[owner] = balances.get(owner, 0.0) + amount
+    return utxo_set, owner_index, balances
+
+def build_compact_layout(n):
+    utxo = UTXOManager()
+    for i in range(n):
+        tx_id = f"tx_{i // OUTPUTS_PER_TX:016x}"
+        utxo.add_utxo(tx_id, i % OUTPUTS_PER_TX, (i % 5000) / 100.0, f"owner_{i % OWNERS}")
+    return utxo
+
+def measure(builder, n):
+    """Return bytes still allocated by the structure once it is built."""
+    gc.collect()
+    tracemalloc.start()
+    structure = builder(n)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del structure
+    gc.collect()
+    return current
+
+def run_benchmark(sizes):
+    print(f"{'UTXOs':>12} | {'dict layout':>14} | {'compact':>14} | {'saved':>6}")
+    for n in sizes:
+        legacy = measure(build_dict_layout, n)
+        compact = measure(build_compact_layout, n)
+        print(f"{n:>12,} | {legacy / n:>8.1f} B/utxo | {compact / n:>8.1f} B/utxo | {1 - compact / legacy:>6.1%}")
+
+if __name__ == "__main__":
+    # Usage: python3 benchmarks/utxo_memory.py [size,size,...]
+    # 10M needs several GB of RAM for the dict layout alone.
+    sizes = [1_000_000, 10_000_000]
+    if len(sys.argv) > 1:
+        sizes = [int(x) for x in sys.argv[1].split(",")]
+    run_benchmark(sizes)
@@ -0,0 +1,162 @@
+import sys
+import os
+import json
+import time
+import argparse
+
+# Add project root to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+try:
+    import numpy as np
+except ImportError:  # Optional: only this module needs it
+    np = None
+
+from src.wallet import DUST_SATS
+
+# Value histogram bucket edges in satoshis: dust, then powers of ten up to 100 BTC and above
+VALUE_EDGES = (0, DUST_SATS, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000, 1_000_000_000, 10_000_000_000)
+# Age bucket edges in blocks: same block, an hour, a day, a week, a month, a year (10-minute blocks)
+AGE_EDGES = (0, 1, 6, 144, 1_008, 4_320, 52_560)
+
+def _column(values, live):
+    """Copy of one array column as a NumPy array, without the free rows."""
+    # frombuffer is a zero-copy view, but while it exists the array can't grow,
+    # so it is only kept until the copy (mask or .copy()) is made
+    view = np.frombuffer(values, dtype=values.typecode)
+    return view[live] if live is not None else view.copy()
+
+def _buckets(values, edges, weights):
+    """[(count, weight total)] per bucket [edges[i], edges[i+1]); the last bucket is open-ended."""
+    bucket = np.searchsorted(np.asarray(edges), values, side="right") - 1
+    counts = np.bincount(bucket, minlength=len(edges))
+    totals = np.bincount(bucket, weights=weights, minlength=len(edges))
+    return list(zip(counts.tolist(), totals.tolist()))
+
+class UTXOStats:
+    """
+    Aggregate statistics over a snapshot of the UTXO set, held as NumPy columns
+    (amount, owner id, creation height per UTXO). Building the snapshot copies
+    the manager's array columns in bulk; every statistic is then a handful of
+    vectorized passes, with no per-UTXO Python code.
+    """
+
+    def __init__(self, utxo_manager):
+        if np is None:
+            raise ImportError("UTXO analytics need NumPy (pip install numpy)")
+        amounts, owner_ids, heights, free_rows, owners = utxo_manager.columns()
+        live = None
+        if free_rows:
+            live = np.ones(len(amounts), dtype=bool)
+            live[np.array(free_rows, dtype=np.intp)] = False
+        self.amounts = _column(amounts, live)
+        self.owner_ids = _column(owner_ids, live)
+        self.heights = _column(heights, live)
+        self.owners = list(owners)
+        self.best_height = utxo_manager.best_height
+        self._balances = None
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @property
+    def total_sats(self) -> int:
+        return int(self.amounts.sum())
+
+    def balances(self):
+        """Balance in satoshis per owner id."""
+        if self._balances is None:
+            # float64 sums are exact up to 2^53 sats (~90M BTC), more than any supply
+            self._balances = np.bincount(self.owner_ids, weights=self.amounts,
+                                         minlength=len(self.owners)).astype(np.int64)
+        return self._balances
+
+    def top_holders(self, n=10) -> list:
+        """The 'n' largest balances: [{"owner", "balance_sats", "utxos"}], largest first."""
+        balances = self.balances()
+        n = min(n, int(np.count_nonzero(balances)))
+        if n <= 0:
+            return []
+        top = np.argpartition(-balances, n - 1)[:n]
+        top = top[np.argsort(-balances[top], kind="stable")]
+        counts = np.bincount(self.owner_ids, minlength=len(self.owners))
+        return [{"owner": self.owners[i], "balance_sats": int(balances[i]), "utxos": int(counts[i])}
+                for i in top.tolist()]
+
+    def value_histogram(self, edges=VALUE_EDGES) -> list:
+        """UTXO count and value per amount bucket: [{"min_sats", "max_sats", "count", "total_sats"}]."""
+        rows = _buckets(self.amounts, edges, self.amounts)
+        return [{"min_sats": low, "max_sats": high, "count": count, "total_sats": int(total)}
+                for (count, total), low, high in zip(rows, edges, list(edges[1:]) + [None])]
+
+    def dust(self, threshold=DUST_SATS) -> dict:
+        """UTXOs worth less than 'threshold' (by default, less than it costs to keep change)."""
+        mask = self.amounts < threshold
+        count = int(np.count_nonzero(mask))
+        return {
+            "threshold_sats": threshold,
+            "count": count,
+            "total_sats": int(self.amounts[mask].sum()),
+            "share_of_utxos": count / len(self) if len(self) else 0.0,
+        }
+
+    def age_distribution(self, edges=AGE_EDGES) -> list:
+        """UTXO count and value by age in blocks (tip height minus creation height)."""
+        ages = np.maximum(self.best_height - self.heights, 0)
+        rows = _buckets(ages, edges, self.amounts)
+        return [{"min_blocks": low, "max_blocks": high, "count": count, "total_sats": int(total)}
+                for (count, total), low, high in zip(rows, edges, list(edges[1:]) + [None])]
+
+    def concentration(self) -> dict:
+        """How unevenly value is spread over owners with a non-zero balance."""
+        held = np.sort(self.balances()[self.balances() > 0])
+        holders = len(held)
+        total = float(held.sum())
+        if not holders or not total:
+            return {"holders": 0, "gini": 0.0, "top_1pct_share": 0.0, "top_10pct_share": 0.0, "owners_for_half": 0}
+        # Gini coefficient of the sorted balances
+        ranks = np.arange(1, holders + 1, dtype=np.float64)
+        gini = float(2 * np.dot(ranks, held) / (holders * total) - (holders + 1) / holders)
+        largest = np.cumsum(held[::-1], dtype=np.float64)
+        share = lambda fraction: float(largest[max(1, int(np.ceil(holders * fraction))) - 1] / total)
+        return {
+            "holders": holders,
+            "gini": gini,
+            "top_1pct_share": share(0.01),
+            "top_10pct_share": share(0.10),
+            "owners_for_half": int(np.searchsorted(largest, total / 2)) + 1,
+        }
+
+    def summary(self, top=10) -> dict:
+        """Every statistic in one JSON-friendly dict."""
+        return {
+            "utxo_count": len(self),
+            "total_sats": self.total_sats,
+            "best_height": self.best_height,
+            "top_holders": self.top_holders(top),
+            "value_histogram": self.value_histogram(),
+            "dust": self.dust(),
+            "age_distribution": self.age_distribution(),
+            "concentration": self.concentration(),
+        }
+
+def main():
+    from src.main import load_state
+
+    parser = argparse.ArgumentParser(description="Aggregate statistics over the UTXO set (needs NumPy)")
+    parser.add_argument("--data-dir", help="Saved state to analyse (default: fresh genesis)")
+    parser.add_argument("--top", type=int, default=10, help="How many top holders to list")
+    args = parser.parse_args()
+
+    utxo_manager, store = load_state(args.data_dir)
+    start = time.perf_counter()
+    summary = UTXOStats(utxo_manager).summary(args.top)
+    summary["seconds"] = time.perf_counter() - start
+    if store is not None:
+        store.close()
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
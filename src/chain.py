@@ -0,0 +1,249 @@
+import hashlib
+import time
+import statistics
+from collections import deque
+
+from src.transaction import create_coinbase_transaction, compute_tx_id
+from src.utxo_manager import UTXOView
+from src.validator import validate_transaction
+from src.units import to_sats
+from src.pow import POW_LIMIT, POW_LIMIT_BITS, bits_to_target, target_to_bits, header_bytes, hash_header, check_pow, mine_header
+from src import metrics
+
+# How many recent blocks keep undo data (the deepest reorg we can handle)
+UNDO_DEPTH = 100
+# Difficulty retargeting (when a Blockchain has a target_spacing): every
+# RETARGET_INTERVAL blocks, scale the target by actual/expected time, at most 4x either way
+RETARGET_INTERVAL = 10
+MAX_RETARGET_FACTOR = 4
+# Timestamps must beat the median of the last MEDIAN_TIME_SPAN blocks and may be
+# at most MAX_FUTURE_DRIFT seconds ahead of our clock
+MEDIAN_TIME_SPAN = 11
+MAX_FUTURE_DRIFT = 2 * 3600
+
+def merkle_root(tx_ids) -> str:
+    """Bitcoin-style merkle root of the tx IDs (an odd last node is paired with itself)."""
+    level = [bytes.fromhex(tx_id) for tx_id in tx_ids]
+    if not level:
+        return "0" * 64
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(hashlib.sha256(level[i] + level[i + 1]).digest()).digest()
+                 for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+def compute_block_hash(block) -> str:
+    """Double SHA-256 of the block header (see pow.HEADER)."""
+    return hash_header(header_bytes(block))
+
+class Blockchain:
+    """
+    The chain tip on top of a UTXOManager.
+    Blocks are checked on a UTXOView overlay and flushed to the set in one step,
+    so a bad block never leaves the set half-applied. Undo data for the last
+    'undo_depth' blocks allows them to be disconnected again (reorgs).
+    Blocks carry SHA-256 proof-of-work. With 'target_spacing' (seconds) the target
+    is retargeted every RETARGET_INTERVAL blocks toward that block interval;
+    without it every block uses 'initial_bits'. Difficulty follows the blocks kept
+    in 'recent', so a restarted node starts again from 'initial_bits'.
+    'workers' is the number of processes searching nonces (None = all cores).
+    """
+
+    def __init__(self, utxo_manager, undo_depth=UNDO_DEPTH, target_spacing=None,
+                 initial_bits=POW_LIMIT_BITS, workers=None):
+        self.utxo_manager = utxo_manager
+        self.recent = deque(maxlen=max(undo_depth, RETARGET_INTERVAL + 1))  # (block, undo data), oldest first
+        self.target_spacing = target_spacing
+        self.initial_bits = initial_bits
+        self.workers = workers
+        self.last_pow = None  # Stats of the last nonce search (see pow.mine_header)
+
+    @property
+    def height(self) -> int:
+        return self.utxo_manager.best_height
+
+    @property
+    def tip_hash(self) -> str:
+        return self.utxo_manager.best_hash
+
+    def next_bits(self) -> int:
+        """Compact target the next block must meet."""
+        if not self.recent:
+            return self.initial_bits
+        tip = self.recent[-1][0]
+        if not self.target_spacing or (tip["height"] + 1) % RETARGET_INTERVAL:
+            return tip["bits"]
+        if len(self.recent) <= RETARGET_INTERVAL:
+            return tip["bits"]  # Window start not known (e.g. after a restart)
+        first = self.recent[-RETARGET_INTERVAL - 1][0]
+        expected = max(1, round(RETARGET_INTERVAL * self.target_spacing))  # Timestamps are whole seconds
+        old = bits_to_target(tip["bits"])
+        target = old * max(tip["timestamp"] - first["timestamp"], 0) // expected
+        # Difficulty moves at most MAX_RETARGET_FACTOR per window, never below the limit
+        target = min(max(target, old // MAX_RETARGET_FACTOR), old * MAX_RETARGET_FACTOR, POW_LIMIT)
+        return target_to_bits(target)
+
+    def median_time_past(self) -> int:
+        """Median timestamp of the last MEDIAN_TIME_SPAN blocks (0 if none are known)."""
+        times = [block["timestamp"] for block, _ in list(self.recent)[-MEDIAN_TIME_SPAN:]]
+        return int(statistics.median_low(times)) if times else 0
+
+    def create_block(self, miner_address: str, transactions, fee_sats: int) -> dict:
+        """Build a block on the current tip paying 'fee_sats' to the miner, and mine it."""
+        return self.solve_block(self.block_template(miner_address, transactions, fee_sats))
+
+    def block_template(self, miner_address: str, transactions, fee_sats: int) -> dict:
+        """The block create_block would mine, before its nonce search."""
+        coinbase = create_coinbase_transaction(miner_address, fee_sats, [tx["tx_id"] for tx in transactions], self.height + 1)
+        transactions = [coinbase] + list(transactions)
+        return {
+            "height": self.height + 1,
+            "prev_hash": self.tip_hash,
+            "merkle_root": merkle_root([tx["tx_id"] for tx in transactions]),
+            "timestamp": max(int(time.time()), self.median_time_past() + 1),
+            "bits": self.next_bits(),
+            "nonce": 0,
+            "transactions": transactions
+        }
+
+    def solve_block(self, block) -> dict:
+        """
+        Search for the block's nonce (sets "nonce" and "hash") and return it.
+        Touches nothing but the block and the stats, so it may run off the event loop.
+        """
+        self.last_pow = mine_header(block, self.workers)
+        if metrics.ENABLED:
+            metrics.observe("pow_seconds", self.last_pow["seconds"])
+            metrics.inc("pow_hashes_total", self.last_pow["hashes"])
+            metrics.gauge("pow_hashes_per_sec_per_core", self.last_pow["hashes_per_sec_per_core"])
+        return block
+
+    def _apply(self, view, tx, height: int):
+        """Spend inputs and create outputs on the overlay. Returns an error or None."""
+        tx_id = tx["tx_id"]
+        for i in range(len(tx["outputs"])):
+            if view.exists(tx_id, i):
+                return f"Output {(tx_id, i)} already exists (duplicate transaction)"
+        for inp in tx["inputs"]:
+            view.remove_utxo(inp["prev_tx"], inp["index"])
+        for i, out in enumerate(tx["outputs"]):
+            view.add_utxo_sats(tx_id, i, to_sats(out["amount"]), out["address"], height)
+        return None
+
+    @metrics.timed("connect_block", lambda r: "connected" if r[0] else "rejected")
+    def connect_block(self, block):
+        """
+        Validate 'block' against the current tip and apply it atomically.
+        Returns: (success: bool, message: str)
+        """
+        if block["height"] != self.height + 1 or block["prev_hash"] != self.tip_hash:
+            return False, "Block does not extend the current tip"
+        if not block["transactions"] or block["transactions"][0]["inputs"]:
+            return False, "First transaction must be a coinbase"
+        # The merkle root commits to tx IDs only, so the coinbase's ID must match its outputs
+        if block["transactions"][0]["tx_id"] != compute_tx_id(block["transactions"][0]):
+            return False, "Coinbase ID does not match its contents"
+        if block["merkle_root"] != merkle_root([tx["tx_id"] for tx in block["transactions"]]):
+            return False, "Merkle root does not match the block's transactions"
+        if block["hash"] != compute_block_hash(block):
+            return False, "Block hash does not match its header"
+        if block["bits"] != self.next_bits():
+            return False, f"Wrong difficulty: bits {block['bits']:#x}, expected {self.next_bits():#x}"
+        if not check_pow(block["hash"], block["bits"]):
+            return False, "Block hash does not meet the proof-of-work target"
+        if block["timestamp"] <= self.median_time_past():
+            return False, "Block timestamp is not after the median of recent blocks"
+        if block["timestamp"] > time.time() + MAX_FUTURE_DRIFT:
+            return False, "Block timestamp is too far in the future"
+
+        view = UTXOView(self.utxo_manager)
+        # Read every confirmed input in one batch; outputs created in this block just miss
+        view.prefetch([(inp["prev_tx"], inp["index"]) for tx in block["transactions"][1:] for inp in tx["inputs"]])
+        coinbase = block["transactions"][0]
+        fee_sats = 0
+        for tx in block["transactions"][1:]:
+            # No mempool here: inputs must be confirmed or created earlier in this block
+            is_valid, msg, fee = validate_transaction(tx, view, None)
+            if not is_valid:
+                return False, f"Transaction {tx['tx_id']} is invalid: {msg}"
+            error = self._apply(view, tx, block["height"])
+            if error:
+                return False, error
+            fee_sats += to_sats(fee)
+
+        # Rule 4 for the coinbase too: a negative output would offset a larger positive one
+        if any(out["amount"] < 0 for out in coinbase["outputs"]):
+            return False, "Coinbase output amount cannot be negative"
+        reward_sats = sum(to_sats(out["amount"]) for out in coinbase["outputs"])
+        if reward_sats > fee_sats:
+            return False, f"Coinbase claims {reward_sats} sats but fees are only {fee_sats}"
+        error = self._apply(view, coinbase, block["height"])
+        if error:
+            return False, error
+
+        undo = view.flush()
+        self.utxo_manager.set_best_block(block["height"], block["hash"])
+        self.utxo_manager.commit()
+        self.recent.append((block, undo))
+        self._report_state()
+        return True, "Block connected"
+
+    def disconnect_block(self):
+        """Undo the tip block and return it (None if no undo data is left)."""
+        if not self.recent:
+            return None
+        block, undo = self.recent.pop()
+        self.utxo_manager.apply_changes(reversed(undo["created"]), undo["spent"])
+        self.utxo_manager.set_best_block(block["height"] - 1, block["prev_hash"])
+        self.utxo_manager.commit()
+        self._report_state()
+        return block
+
+    def _report_state(self):
+        if metrics.ENABLED:
+            metrics.gauge("chain_height", self.height)
+            metrics.gauge("utxo_set_size", len(self.utxo_manager))
+
+    def reorganize(self, new_blocks):
+        """
+        Switch to a competing branch: disconnect blocks back to the fork point
+        (new_blocks[0]'s parent), then connect 'new_blocks'. If any new block is
+        invalid, the original blocks are restored.
+        Returns: (success: bool, message: str, disconnected blocks, tip first)
+        """
+        fork_height = new_blocks[0]["height"] - 1
+        depth = self.height - fork_height
+        if depth < 0 or depth > len(self.recent):
+            return False, f"Fork point is {depth} blocks deep, undo data covers {len(self.recent)}", []
+        fork_hash = self.recent[-depth][0]["prev_hash"] if depth else self.tip_hash
+        if fork_hash != new_blocks[0]["prev_hash"]:
+            return False, "New branch does not fork from this chain", []
+        if len(new_blocks) > self.recent.maxlen:
+            return False, f"New branch is {len(new_blocks)} blocks long, undo data covers {self.recent.maxlen}", []
+
+        saved = list(self.recent)
+        disconnected = [self.disconnect_block() for _ in range(depth)]
+        for i, block in enumerate(new_blocks):
+            ok, msg = self.connect_block(block)
+            if not ok:
+                for _ in range(i):
+                    self.disconnect_block()
+                # The old blocks were valid when connected; revalidating them now could
+                # fail (e.g. a retarget window shortened by the disconnects), so they
+                # are reapplied as they were and 'recent' restored
+                for old, undo in saved[len(saved) - depth:]:
+                    self._reapply(old, undo)
+                self.recent = deque(saved, maxlen=self.recent.maxlen)
+                self.utxo_manager.commit()
+                self._report_state()
+                return False, f"Reorg failed at height {block['height']}: {msg}", []
+        return True, f"Reorganized {depth} block(s) deep", disconnected
+
+    def _reapply(self, block, undo):
+        """Redo a disconnected block's changes from its undo data (the inverse of disconnect_block)."""
+        outputs = {(tx["tx_id"], i): out for tx in block["transactions"] for i, out in enumerate(tx["outputs"])}
+        adds = [(tx_id, index, to_sats(outputs[tx_id, index]["amount"]), outputs[tx_id, index]["address"], block["height"])
+                for tx_id, index in undo["created"]]
+        self.utxo_manager.apply_changes([(tx_id, index) for tx_id, index, *_ in undo["spent"]], adds)
+        self.utxo_manager.set_best_block(block["height"], block["hash"])
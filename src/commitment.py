@@ -0,0 +1,197 @@
+import struct
+import hashlib
+
+# MuHash3072 (as in Bitcoin Core's coinstats index): the set's hash is the product,
+# modulo a 3072-bit prime, of one 3072-bit number per element. Multiplication is
+# commutative, so the result doesn't depend on insertion order; a removal
+# multiplies the denominator instead and one modular inverse at digest time
+# cancels it. Elements are expanded to 384 bytes with SHAKE-256 (Bitcoin uses ChaCha20).
+MUHASH_PRIME = 2 ** 3072 - 1103717
+MUHASH_BYTES = 384
+
+EMPTY = bytes(32)  # Hash of an empty sparse merkle subtree
+KEY_BITS = 256
+
+def utxo_bytes(tx_id: str, index: int, amount_sats: int, owner: str, height: int) -> bytes:
+    """Canonical encoding of one UTXO: the element MuHash and the merkle leaf commit to."""
+    tx_id = tx_id.encode()
+    owner = owner.encode()
+    return struct.pack("<H", len(tx_id)) + tx_id + struct.pack("<IqIH", index, amount_sats, height, len(owner)) + owner
+
+def outpoint_key(tx_id: str, index: int) -> bytes:
+    """Position of an outpoint in the sparse merkle tree: SHA-256 of tx ID and index."""
+    return hashlib.sha256(tx_id.encode() + struct.pack("<I", index)).digest()
+
+class MuHash:
+    """Rolling multiset hash: O(1) insert and remove, order-independent digest."""
+
+    def __init__(self):
+        self.numerator = 1
+        self.denominator = 1
+
+    @staticmethod
+    def _element(data: bytes) -> int:
+        return int.from_bytes(hashlib.shake_256(data).digest(MUHASH_BYTES), "little") % MUHASH_PRIME
+
+    def insert(self, data: bytes):
+        self.numerator = self.numerator * self._element(data) % MUHASH_PRIME
+
+    def remove(self, data: bytes):
+        self.denominator = self.denominator * self._element(data) % MUHASH_PRIME
+
+    def combine(self, other: "MuHash"):
+        """Add every element of 'other' (the hash of the multiset union)."""
+        self.numerator = self.numerator * other.numerator % MUHASH_PRIME
+        self.denominator = self.denominator * other.denominator % MUHASH_PRIME
+
+    def digest(self) -> str:
+        value = self.numerator * pow(self.denominator, -1, MUHASH_PRIME) % MUHASH_PRIME
+        # Fold the quotient back into the numerator so later digests skip the old work
+        self.numerator, self.denominator = value, 1
+        return hashlib.sha256(value.to_bytes(MUHASH_BYTES, "little")).hexdigest()
+
+def _bit(key: bytes, depth: int) -> int:
+    return key[depth >> 3] >> (7 - (depth & 7)) & 1
+
+def _leaf_hash(key: bytes, value_hash: bytes) -> bytes:
+    return hashlib.sha256(b"\x00" + key + value_hash).digest()
+
+def _branch_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+class SparseMerkleTree:
+    """
+    Merkle tree over 256-bit keys, where a key's bits (most significant first)
+    give its path. A subtree holding a single leaf is replaced by that leaf, so
+    the tree is only about log2(n) deep and an update rehashes only that path.
+    Nodes are None (empty), leaf tuples (key, value_hash, hash) or branch lists
+    [left, right, hash].
+    """
+
+    def __init__(self):
+        self.top = None
+        self.leaves = {}  # key -> value hash
+
+    def __len__(self):
+        return len(self.leaves)
+
+    @property
+    def root(self) -> bytes:
+        return self.top[-1] if self.top is not None else EMPTY
+
+    def insert(self, key: bytes, value_hash: bytes):
+        """Set the value hash of 'key' (replacing any previous one)."""
+        self.top = self._insert(self.top, (key, value_hash, _leaf_hash(key, value_hash)), 0)
+        self.leaves[key] = value_hash
+
+    def _insert(self, node, leaf, depth):
+        if node is None:
+            return leaf
+        if isinstance(node, tuple):
+            if node[0] == leaf[0]:
+                return leaf
+            return self._split(node, leaf, depth)
+        bit = _bit(leaf[0], depth)
+        node[bit] = self._insert(node[bit], leaf, depth + 1)
+        node[2] = _branch_hash(self._hash(node[0]), self._hash(node[1]))
+        return node
+
+    def _split(self, a, b, depth):
+        """Branch(es) holding two leaves whose keys agree on the first 'depth' bits."""
+        bit_a, bit_b = _bit(a[0], depth), _bit(b[0], depth)
+        if bit_a != bit_b:
+            children = [b, a] if bit_a else [a, b]
+        else:
+            child = self._split(a, b, depth + 1)
+            children = [None, child] if bit_a else [child, None]
+        return children + [_branch_hash(self._hash(children[0]), self._hash(children[1]))]
+
+    def remove(self, key: bytes):
+        """Remove 'key' (no-op if absent)."""
+        if self.leaves.pop(key, None) is not None:
+            self.top = self._remove(self.top, key, 0)
+
+    def _remove(self, node, key, depth):
+        if isinstance(node, tuple):
+            return None
+        bit = _bit(key, depth)
+        node[bit] = self._remove(node[bit], key, depth + 1)
+        for child, other in ((node[0], node[1]), (node[1], node[0])):
+            if child is None and (other is None or isinstance(other, tuple)):
+                return other  # One leaf left below: it takes this branch's place
+        node[2] = _branch_hash(self._hash(node[0]), self._hash(node[1]))
+        return node
+
+    @staticmethod
+    def _hash(node) -> bytes:
+        return EMPTY if node is None else node[-1]
+
+    def prove(self, key: bytes):
+        """Sibling hashes from the root down to 'key's leaf, or None if the key is absent."""
+        if key not in self.leaves:
+            return None
+        siblings = []
+        node = self.top
+        depth = 0
+        while not isinstance(node, tuple):
+            bit = _bit(key, depth)
+            siblings.append(self._hash(node[1 - bit]))
+            node = node[bit]
+            depth += 1
+        return siblings
+
+def verify_proof(root: bytes, key: bytes, value_hash: bytes, siblings) -> bool:
+    """Check that 'key' maps to 'value_hash' in the tree with this root."""
+    node = _leaf_hash(key, value_hash)
+    for depth in range(len(siblings) - 1, -1, -1):
+        if _bit(key, depth):
+            node = _branch_hash(siblings[depth], node)
+        else:
+            node = _branch_hash(node, siblings[depth])
+    return node == root
+
+def verify_utxo(root: str, tx_id: str, index: int, amount_sats: int, owner: str, height: int, siblings) -> bool:
+    """Light-client check that a UTXO is in the set with this merkle root (hex strings)."""
+    value_hash = hashlib.sha256(utxo_bytes(tx_id, index, amount_sats, owner, height)).digest()
+    return verify_proof(bytes.fromhex(root), outpoint_key(tx_id, index), value_hash,
+                        [bytes.fromhex(sibling) for sibling in siblings])
+
+class UTXOCommitment:
+    """
+    Commitment to a UTXO set, kept up to date by UTXOManager.attach_commitment:
+    a MuHash digest, O(1) per change, for comparing whole sets, and (with
+    'proofs') a sparse merkle root, O(log n) per change, whose inclusion proofs
+    show that single outpoints are unspent.
+    """
+
+    def __init__(self, proofs=True):
+        self.muhash = MuHash()
+        self.tree = SparseMerkleTree() if proofs else None
+
+    def add(self, tx_id: str, index: int, amount_sats: int, owner: str, height: int):
+        data = utxo_bytes(tx_id, index, amount_sats, owner, height)
+        self.muhash.insert(data)
+        if self.tree is not None:
+            self.tree.insert(outpoint_key(tx_id, index), hashlib.sha256(data).digest())
+
+    def remove(self, tx_id: str, index: int, amount_sats: int, owner: str, height: int):
+        self.muhash.remove(utxo_bytes(tx_id, index, amount_sats, owner, height))
+        if self.tree is not None:
+            self.tree.remove(outpoint_key(tx_id, index))
+
+    def digest(self) -> str:
+        """MuHash of the set: equal for equal sets, whatever order they were built in."""
+        return self.muhash.digest()
+
+    @property
+    def root(self) -> str:
+        if self.tree is None:
+            raise ValueError("Commitment was created without proofs")
+        return self.tree.root.hex()
+
+    def prove(self, tx_id: str, index: int):
+        """Inclusion proof (hex sibling hashes, root first) for an unspent outpoint, or None."""
+        if self.tree is None:
+            raise ValueError("Commitment was created without proofs")
+        siblings = self.tree.prove(outpoint_key(tx_id, index))
+        return None if siblings is None else [sibling.hex() for sibling in siblings]
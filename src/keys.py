@@ -0,0 +1,79 @@
+import hashlib
+
+from src.schnorr import N, pubkey_from_seckey, sign
+
+ADDRESS_BYTES = 20
+
+def address_from_pubkey(pubkey: bytes) -> str:
+    """Address = hex of the first 20 bytes of SHA-256(x-only public key)."""
+    return hashlib.sha256(pubkey).digest()[:ADDRESS_BYTES].hex()
+
+def is_address(value: str) -> bool:
+    if len(value) != 2 * ADDRESS_BYTES:
+        return False
+    try:
+        bytes.fromhex(value)
+    except ValueError:
+        return False
+    return True
+
+def demo_seckey(name: str) -> int:
+    """
+    Deterministic secret key for a demo wallet name. Anyone who knows the name
+    can spend its coins: fine for a simulator, never for real funds.
+    """
+    return int.from_bytes(hashlib.sha256(b"utxo-sim demo key:" + name.encode("utf-8")).digest(), "big") % (N - 1) + 1
+
+class Keyring:
+    """
+    Secret keys by address, with optional human-readable names.
+    Signs transaction inputs whose 'owner' address it holds the key for.
+    """
+
+    def __init__(self):
+        self._seckeys = {}  # address -> secret key (int)
+        self._pubkeys = {}  # address -> x-only public key (bytes)
+        self._names = {}    # address -> name
+        self._by_name = {}  # name -> address
+
+    def add(self, seckey: int, name: str = None) -> str:
+        pubkey = pubkey_from_seckey(seckey)
+        address = address_from_pubkey(pubkey)
+        self._seckeys[address] = seckey
+        self._pubkeys[address] = pubkey
+        if name is not None:
+            self._names[address] = name
+            self._by_name[name] = address
+        return address
+
+    def address(self, name: str) -> str:
+        """Address of a named demo wallet (its key is derived from the name on first use)."""
+        address = self._by_name.get(name)
+        if address is None:
+            address = self.add(demo_seckey(name), name)
+        return address
+
+    def resolve(self, name_or_address: str) -> str:
+        """Accept either an address or a demo wallet name."""
+        if is_address(name_or_address):
+            return name_or_address
+        return self.address(name_or_address)
+
+    def name_of(self, address: str) -> str:
+        """Display name for an address ('Alice'), or the address itself if unknown."""
+        return self._names.get(address, address)
+
+    def __contains__(self, address):
+        return address in self._seckeys
+
+    def pubkey(self, address: str) -> bytes:
+        return self._pubkeys[address]
+
+    def sign(self, address: str, msg: bytes) -> bytes:
+        return sign(self._seckeys[address], msg)
+
+# Shared demo keys: genesis wallets, tests, the interactive menu and simulations
+DEMO_KEYS = Keyring()
+
+def demo_address(name: str) -> str:
+    return DEMO_KEYS.address(name)
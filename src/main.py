@@ -1,5 +1,7 @@
 import sys
 import os
+import argparse
+import json
 
 # Add the project root directory to Python's search path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -7,69 +9,78 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 from src.utxo_manager import UTXOManager
+from src.sharding import ShardedUTXOManager
 from src.mempool import Mempool
-from src.transaction import create_transaction
+from src.wallet import create_payment
+from src.units import to_sats, to_btc
+from src.keys import DEMO_KEYS, demo_address
 from src.mining import mine_block
+from src.storage import UTXOStore
+from src.chain import Blockchain
+from src import metrics
 # Now this import will work because Python can see the 'tests' folder
 from tests.test_scenarios import run_tests as execute_tests
+
+DEFAULT_DATA_DIR = os.path.join(parent_dir, "data")
+UTXO_LIST_LIMIT = 50  # Bigger sets are summarized instead of listed
+
 def initialize_genesis(utxo_mgr):
-    """Setup initial state as per assignment reqs."""
-    utxo_mgr.add_utxo("genesis", 0, 50.0, "Alice")
-    utxo_mgr.add_utxo("genesis", 1, 30.0, "Bob")
-    utxo_mgr.add_utxo("genesis", 2, 20.0, "Charlie")
-    utxo_mgr.add_utxo("genesis", 3, 10.0, "David")
-    utxo_mgr.add_utxo("genesis", 4, 5.0, "Eve")
+    """Setup initial state as per assignment reqs (coins go to the named demo keys' addresses)."""
+    utxo_mgr.add_utxo("genesis", 0, 50.0, demo_address("Alice"))
+    utxo_mgr.add_utxo("genesis", 1, 30.0, demo_address("Bob"))
+    utxo_mgr.add_utxo("genesis", 2, 20.0, demo_address("Charlie"))
+    utxo_mgr.add_utxo("genesis", 3, 10.0, demo_address("David"))
+    utxo_mgr.add_utxo("genesis", 4, 5.0, demo_address("Eve"))
 
 def interactive_create_tx(utxo_mgr, mempool):
     print("\n--- Create New Transaction ---")
-    sender = input("Enter sender: ").strip()
+    # Names ("Alice") map to demo keys; raw addresses are accepted too
+    sender = DEMO_KEYS.resolve(input("Enter sender: ").strip())
+    if sender not in DEMO_KEYS:
+        print("Error: No key for that sender, so it can't sign.")
+        return
     
-    # 1. Get Sender's UTXOs
-    user_utxos = utxo_mgr.get_utxos_for_owner(sender)
-    if not user_utxos:
+    # 1. Check Sender's Funds
+    if utxo_mgr.get_balance_sats(sender) == 0:
         print("Error: Sender has no UTXOs/Funds.")
         return
 
-    current_balance = sum(u["amount"] for u in user_utxos)
+    current_balance = utxo_mgr.get_balance(sender)
     print(f"Available Balance: {current_balance} BTC")
     
-    recipient = input("Enter recipient: ").strip()
+    # 2. Recipients (several can be paid by one transaction)
+    payments = []
+    while True:
+        recipient = input("Enter recipient" + (" (blank to finish): " if payments else ": ")).strip()
+        if not recipient:
+            if payments:
+                break
+            print("At least one recipient is required.")
+            continue
+        try:
+            payments.append((DEMO_KEYS.resolve(recipient), float(input("Enter amount to send: "))))
+        except ValueError:
+            print("Invalid number.")
+            return
     try:
-        amount = float(input("Enter amount to send: "))
         fee = float(input("Enter mining fee (optional, default 0): ") or 0)
     except ValueError:
         print("Invalid number.")
         return
 
-    total_needed = amount + fee
-
+    total_needed = sum(amount for _, amount in payments) + fee
     if current_balance < total_needed:
         print(f"Insufficient funds. Have {current_balance}, need {total_needed}.")
         return
 
-    # 2. Select Inputs (Simple Coin Selection Algorithm: First-Fit)
-    inputs = []
-    input_sum = 0.0
-    for u in user_utxos:
-        inputs.append({
-            "prev_tx": u["tx_id"],
-            "index": u["index"],
-            "owner": sender
-        })
-        input_sum += u["amount"]
-        if input_sum >= total_needed:
-            break
-            
-    # 3. Create Outputs
-    outputs = [{"amount": amount, "address": recipient}]
-    
-    # Calculate Change
-    change = input_sum - total_needed
-    if change > 0:
-        outputs.append({"amount": change, "address": sender})
-        
-    # 4. Create and Submit
-    tx = create_transaction(inputs, outputs)
+    # 3. Select Inputs (branch-and-bound, else largest-first; skips coins pending txs spend)
+    tx, msg = create_payment(utxo_mgr, sender, payments, fee_sats=to_sats(fee), mempool=mempool)
+    if tx is None:
+        print(f"Transaction Failed: {msg}")
+        return
+    print(f"Coin selection: {msg}")
+
+    # 4. Submit
     success, msg = mempool.add_transaction(tx, utxo_mgr)
     
     if success:
@@ -78,10 +89,81 @@ def interactive_create_tx(utxo_mgr, mempool):
     else:
         print(f"Transaction Failed: {msg}")
 
+def print_utxo_stats(utxo_mgr):
+    """Aggregate view of a large UTXO set (analytics.py, needs NumPy)."""
+    from src.analytics import UTXOStats
+    stats = UTXOStats(utxo_mgr).summary(top=5)
+    print(f"{stats['utxo_count']:,} UTXOs, {to_btc(stats['total_sats'])} BTC, tip height {stats['best_height']}")
+    print("Top holders:")
+    for holder in stats["top_holders"]:
+        print(f"  {DEMO_KEYS.name_of(holder['owner'])}: {to_btc(holder['balance_sats'])} BTC in {holder['utxos']} UTXOs")
+    print("Value histogram:")
+    for bucket in stats["value_histogram"]:
+        high = f"{bucket['max_sats']:,}" if bucket["max_sats"] is not None else "+"
+        print(f"  {bucket['min_sats']:,} - {high} sats: {bucket['count']:,}")
+    dust = stats["dust"]
+    print(f"Dust (< {dust['threshold_sats']} sats): {dust['count']:,} UTXOs ({dust['share_of_utxos']:.2%})")
+    print("Age (blocks):")
+    for bucket in stats["age_distribution"]:
+        high = bucket["max_blocks"] if bucket["max_blocks"] is not None else "+"
+        print(f"  {bucket['min_blocks']} - {high}: {bucket['count']:,}")
+    c = stats["concentration"]
+    print(f"Concentration: {c['holders']:,} holders, Gini {c['gini']:.3f}, "
+          f"top 1% hold {c['top_1pct_share']:.1%}, {c['owners_for_half']:,} owners hold half")
+
+def load_state(data_dir, shards=None):
+    """
+    Build the UTXO set: snapshot + journal tail if 'data_dir' has saved state,
+    otherwise genesis. Returns the manager with the store attached (or None).
+    With 'shards', the set lives in that many worker processes (ShardedUTXOManager).
+    """
+    utxo_manager = ShardedUTXOManager(shards) if shards else UTXOManager()
+    if data_dir is None:
+        initialize_genesis(utxo_manager)
+        return utxo_manager, None
+
+    store = UTXOStore(data_dir)
+    if store.load(utxo_manager):
+        print(f"Loaded {len(utxo_manager)} UTXOs from {data_dir}")
+        utxo_manager.attach_store(store)
+    else:
+        initialize_genesis(utxo_manager)
+        utxo_manager.attach_store(store)
+        store.write_snapshot(utxo_manager)
+    return utxo_manager, store
+
 def main():
-    utxo_manager = UTXOManager()
+    parser = argparse.ArgumentParser(description="Bitcoin Transaction Simulator")
+    parser.add_argument("--persist", action="store_true", help="Save the UTXO set under data/ and reload it on the next start")
+    parser.add_argument("--data-dir", help="Persist under this directory instead (implies --persist)")
+    parser.add_argument("--metrics", metavar="PATH", help="Record timings and counters; dump them to PATH on exit (.json or Prometheus text)")
+    parser.add_argument("--replay", metavar="SCRIPT", help="Replay a JSONL/binary event script instead of showing the menu")
+    parser.add_argument("--output", default="-", help="With --replay: per-event results as JSONL ('-' = stdout)")
+    parser.add_argument("--block-interval", type=float, metavar="SECONDS",
+                        help="Retarget proof-of-work difficulty toward this block interval (default: fixed minimum difficulty)")
+    parser.add_argument("--pow-workers", type=int, metavar="N", help="Processes searching for nonces (default: one per CPU)")
+    parser.add_argument("--shards", type=int, metavar="N", help="Partition the UTXO set over N worker processes")
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable()
+
+    # In memory from genesis unless asked to persist
+    data_dir = args.data_dir or (DEFAULT_DATA_DIR if args.persist else None)
+    utxo_manager, store = load_state(data_dir, args.shards)
+
+    if args.replay:
+        from src.replay import replay_file  # replay.py imports this module
+        summary = replay_file(args.replay, utxo_manager, args.output)
+        if store is not None:
+            store.close()
+        if args.shards:
+            utxo_manager.close()
+        if args.metrics:
+            metrics.dump(args.metrics)
+        print(json.dumps(summary, indent=2), file=sys.stderr)
+        return
     mempool = Mempool()
-    initialize_genesis(utxo_manager)
+    chain = Blockchain(utxo_manager, target_spacing=args.block_interval, workers=args.pow_workers)
 
     while True:
         print("\n=== Bitcoin Transaction Simulator ===")
@@ -105,21 +187,30 @@ def main():
         
         elif choice == '2':
             print("\n--- Current UTXO Set ---")
-            for key, val in utxo_manager.utxo_set.items():
-                print(f"Tx: {key[0]} [{key[1]}] -> {val['amount']} BTC ({val['owner']})")
+            if len(utxo_manager) > UTXO_LIST_LIMIT:
+                try:
+                    print_utxo_stats(utxo_manager)
+                    continue
+                except ImportError as e:
+                    print(f"{e}; listing the first {UTXO_LIST_LIMIT} of {len(utxo_manager):,} UTXOs")
+            for n, (key, val) in enumerate(utxo_manager.items()):
+                if n >= UTXO_LIST_LIMIT:
+                    break
+                print(f"Tx: {key[0]} [{key[1]}] -> {val['amount']} BTC ({DEMO_KEYS.name_of(val['owner'])}, height {val['height']})")
         
         elif choice == '3':
-            print(f"\n--- Mempool ({len(mempool.transactions)} txs) ---")
-            for item in mempool.transactions:
+            pending = mempool.transactions
+            print(f"\n--- Mempool ({len(pending)} txs) ---")
+            for item in pending:
                 t = item["tx"]
                 print(f"ID: {t['tx_id']} | Fee: {item['fee']} | Inputs: {len(t['inputs'])}")
         
         elif choice == '4':
-            if not mempool.transactions:
+            if len(mempool) == 0:
                 print("Mempool is empty. Create a transaction first.")
                 continue
 
-            miner = input("Enter miner name: ")
+            miner = DEMO_KEYS.resolve(input("Enter miner name: ").strip())
             
             # --- NEW: Transaction Selection ---
             print("\n--- Pending Transactions in Mempool ---")
@@ -127,7 +218,7 @@ def main():
             for i, item in enumerate(pending):
                 t = item["tx"]
                 # Try to get sender name for display
-                sender = t["inputs"][0]["owner"] if t["inputs"] else "Unknown"
+                sender = DEMO_KEYS.name_of(t["inputs"][0]["owner"]) if t["inputs"] else "Unknown"
                 print(f"[{i+1}] ID: {t['tx_id']} | Fee: {item['fee']:.5f} | Sender: {sender}")
             
             print("\nOptions:")
@@ -156,7 +247,7 @@ def main():
                     continue
             
             # Call mining with selection (if None, it defaults to auto-mining)
-            mine_block(miner, mempool, utxo_manager, specific_txs=selected_txs)
+            mine_block(miner, mempool, utxo_manager, specific_txs=selected_txs, chain=chain)
             
         elif choice == '5':
             # Create a clean instance for tests to avoid messing up interactive state
@@ -166,6 +257,13 @@ def main():
             execute_tests(test_utxo, test_mempool, mine_block)
             
         elif choice == '6':
+            if store is not None:
+                store.close()
+            if args.shards:
+                utxo_manager.close()
+            if args.metrics:
+                metrics.dump(args.metrics)
+                print(f"Metrics written to {args.metrics}")
             print("Exiting.")
             break
         else:
@@ -1,52 +1,481 @@
-from src.validator import validate_transaction
+import heapq
+import itertools
+import math
+import time
+
+from src.validator import validate_transaction, check_transactions_stateless, MALFORMED
+from src.transaction import transaction_size
+from src.utxo_manager import UTXOView
+from src.units import to_sats
+from src import metrics
+
+# Package limits, as in Bitcoin Core: bound how far the graph walks can go
+MAX_ANCESTORS = 25
+MAX_DESCENDANTS = 25
+# Replace-by-fee (BIP125-style): a replacement pays for its own bytes on top of
+# everything it evicts, and may evict at most this many transactions
+INCREMENTAL_RELAY_FEE = 1  # sat/byte
+MAX_REPLACEMENT_EVICTIONS = 100
+# Pending transactions older than this are dropped (Bitcoin Core: 336 hours)
+DEFAULT_EXPIRY = 14 * 24 * 3600  # seconds
 
 class Mempool:
-    def __init__(self, max_size=50):
-        self.transactions = [] # List of full tx objects
-        self.spent_utxos = set() # Set of (tx_id, index) to prevent double spends
+    """
+    Pending transactions, indexed by tx_id.
+    Transactions may spend outputs of other pending transactions, so entries form an
+    ancestor/descendant graph. Each entry keeps running totals for its ancestor and
+    descendant packages, updated incrementally as the graph changes, and two
+    lazily-cleaned heaps order entries by:
+      - ancestor package fee rate (best first) -> block templates, CPFP
+      - descendant score (worst first)          -> eviction when full
+    A third heap orders entries by arrival time, so expiry pops only stale ones.
+    With 'replace_by_fee', a tx that spends outputs pending txs already spend may
+    replace them (and their descendants) by paying more; otherwise first-seen wins.
+    """
+
+    def __init__(self, max_size=50, replace_by_fee=True, expiry=DEFAULT_EXPIRY):
+        self.entries = {} # tx_id -> entry dict, in arrival order
+        self.spent_utxos = {} # (tx_id, index) -> tx_id of the pending tx spending it
         self.max_size = max_size
+        self.replace_by_fee = replace_by_fee
+        self.expiry = expiry # Seconds a tx may stay pending (None = forever)
+        self.total_size = 0 # Bytes of all pending transactions
+        # Heap items are (sort key..., seq, tx_id). An item is stale once the entry
+        # is gone or has been re-scored (its best_seq/worst_seq moved on).
+        self._best = []   # (-ancestor_fee_rate, timestamp, seq, tx_id)
+        self._worst = []  # (descendant_score, -timestamp, seq, tx_id)
+        self._expiry = [] # (timestamp, seq, tx_id); stale once the tx_id is gone or re-added
+        self._seq = itertools.count()
 
-    def add_transaction(self, tx, utxo_manager):
-        """Validate and add transaction."""
-        if len(self.transactions) >= self.max_size:
-            # Simple eviction policy: Reject if full (or implement fee-based eviction)
-            return False, "Mempool is full"
-
-        is_valid, msg, fee = validate_transaction(tx, utxo_manager, self)
-        
-        if is_valid:
-            self.transactions.append({
-                "tx": tx,
-                "fee": fee,
-                "timestamp": time.time() # For FIFO tie-breaking
-            })
-            # Mark inputs as spent in mempool to prevent Race Attacks
-            for inp in tx["inputs"]:
-                self.spent_utxos.add((inp["prev_tx"], inp["index"]))
-            return True, f"Transaction added. Fee: {fee:.5f} BTC"
-        else:
+    @property
+    def transactions(self) -> list:
+        """All pending entries in arrival order (a new list each time; len(mempool) counts them)."""
+        return list(self.entries.values())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_unconfirmed_output(self, tx_id: str, index: int):
+        """Return {amount, amount_sats, owner} for an output of a pending tx, or None."""
+        entry = self.entries.get(tx_id)
+        if entry is None:
+            return None
+        outputs = entry["tx"]["outputs"]
+        if not 0 <= index < len(outputs):
+            return None
+        out = outputs[index]
+        return {"amount": out["amount"], "amount_sats": to_sats(out["amount"]), "owner": out["address"]}
+
+    # --- Scores ---
+
+    @staticmethod
+    def _ancestor_rate(entry) -> float:
+        return entry["ancestor_fee"] / entry["ancestor_size"]
+
+    @staticmethod
+    def _descendant_score(entry) -> float:
+        return max(entry["fee_rate"], entry["descendant_fee"] / entry["descendant_size"])
+
+    def _push_best(self, entry):
+        entry["best_seq"] = next(self._seq)
+        heapq.heappush(self._best, (-self._ancestor_rate(entry), entry["timestamp"], entry["best_seq"], entry["tx"]["tx_id"]))
+
+    def _push_worst(self, entry):
+        entry["worst_seq"] = next(self._seq)
+        heapq.heappush(self._worst, (self._descendant_score(entry), -entry["timestamp"], entry["worst_seq"], entry["tx"]["tx_id"]))
+
+    def _is_live(self, item, seq_field) -> bool:
+        entry = self.entries.get(item[3])
+        return entry is not None and entry[seq_field] == item[2]
+
+    def _peek_worst(self):
+        while self._worst and not self._is_live(self._worst[0], "worst_seq"):
+            heapq.heappop(self._worst)
+        return self.entries[self._worst[0][3]] if self._worst else None
+
+    def _collect(self, start, link: str) -> set:
+        """All tx_ids reachable from 'start' through 'parents' or 'children' links."""
+        found = set()
+        stack = list(start)
+        while stack:
+            tx_id = stack.pop()
+            if tx_id not in found:
+                found.add(tx_id)
+                stack.extend(self.entries[tx_id][link])
+        return found
+
+    # --- Admission ---
+
+    def add_transactions(self, batch, utxo_manager, workers=None) -> list:
+        """
+        Add a batch of transactions; returns one (success, message) per tx, exactly as
+        if each had been passed to add_transaction in order.
+        Stateless checks run in parallel first; UTXO-set and mempool conflicts are then
+        resolved in a single ordered pass. A tx that failed the stateless checks goes
+        through full validation so it reports the same first error as sequential mode,
+        except a malformed one (fields missing or mistyped), which keeps its precheck verdict.
+        Confirmed inputs of the whole batch are read in one get_many call up front.
+        """
+        prechecks = check_transactions_stateless(batch, workers)
+        # The set doesn't change while the batch is admitted, so a read-only view can cache it
+        view = UTXOView(utxo_manager)
+        view.prefetch([(inp["prev_tx"], inp["index"])
+                       for tx, (ok, _) in zip(batch, prechecks) if ok for inp in tx["inputs"]])
+        return [check if check[1].startswith(MALFORMED) else self.add_transaction(tx, view, prechecked=check[0])
+                for tx, check in zip(batch, prechecks)]
+
+    @metrics.timed("mempool_add", lambda r: "accepted" if r[0] else metrics.rejection_reason(r[1]))
+    def add_transaction(self, tx, utxo_manager, prechecked=False):
+        """
+        Validate and add transaction. It may replace pending txs it conflicts with
+        (see _check_replacement); otherwise, if the pool is full, it evicts the
+        lowest-scoring package.
+        """
+        self.expire()
+        if tx["tx_id"] in self.entries:
+            return False, f"Transaction {tx['tx_id']} already in mempool"
+        is_valid, msg, fee = validate_transaction(tx, utxo_manager, self, prechecked, self.replace_by_fee)
+        if not is_valid:
             return False, msg
 
-    def remove_transaction(self, tx_id: str):
-        """Remove transaction and its spent_utxo locks."""
-        # Note: In mining, we remove the TX but we DON'T free the spent_utxos 
-        # because they are now spent in the blockchain. 
-        # This method is for dropping invalid/expired txs.
-        tx_to_remove = next((t for t in self.transactions if t["tx"]["tx_id"] == tx_id), None)
-        if tx_to_remove:
-            self.transactions.remove(tx_to_remove)
-            for inp in tx_to_remove["tx"]["inputs"]:
-                if (inp["prev_tx"], inp["index"]) in self.spent_utxos:
-                    self.spent_utxos.remove((inp["prev_tx"], inp["index"]))
+        fee_sats = to_sats(fee)
+        size = transaction_size(tx)
+        entry = {
+            "tx": tx,
+            "fee": fee,
+            "fee_sats": fee_sats,
+            "fee_rate": fee_sats / size, # sat/byte
+            "size": size,
+            "timestamp": time.time(), # For FIFO tie-breaking
+            # Unconfirmed parents: pending txs whose outputs this one spends
+            "parents": {inp["prev_tx"] for inp in tx["inputs"] if inp["prev_tx"] in self.entries},
+            "children": set()
+        }
+
+        conflicts = {self.spent_utxos[key] for key in ((inp["prev_tx"], inp["index"]) for inp in tx["inputs"])
+                     if key in self.spent_utxos}
+        replaced = set()
+        if conflicts:
+            replaced, msg = self._check_replacement(entry, conflicts)
+            if replaced is None:
+                return False, msg
+
+        ancestors = self._collect(entry["parents"], "parents")
+        if len(ancestors) + 1 > MAX_ANCESTORS:
+            return False, f"Too many unconfirmed ancestors (limit {MAX_ANCESTORS})"
+        for tx_id in ancestors:
+            # Descendants about to be replaced no longer count toward the limit
+            leaving = len(self._collect(self.entries[tx_id]["children"], "children") & replaced) if replaced else 0
+            if self.entries[tx_id]["descendant_count"] - leaving + 1 > MAX_DESCENDANTS:
+                return False, f"Too many unconfirmed descendants for {tx_id} (limit {MAX_DESCENDANTS})"
+
+        if replaced:
+            for tx_id in conflicts:
+                self.remove_transaction(tx_id)
+            if metrics.ENABLED:
+                metrics.inc("mempool_replaced_total", len(replaced))
+
+        evicted = []
+        if not replaced and len(self.entries) >= self.max_size:
+            worst = self._peek_worst()
+            # First-seen wins ties: only strictly better fee rates can evict.
+            # Never evict our own ancestor, that would orphan the new tx.
+            if (worst is None or self._descendant_score(worst) >= entry["fee_rate"]
+                    or worst["tx"]["tx_id"] in ancestors):
+                return False, "Mempool is full (fee rate too low to evict)"
+            evicted = self.remove_transaction(worst["tx"]["tx_id"])
+
+        self._insert(entry, ancestors)
+        msg = f"Transaction added. Fee: {fee:.5f} BTC"
+        if replaced:
+            msg += f" (replaced {', '.join(sorted(replaced))})"
+        if evicted:
+            msg += f" (evicted {', '.join(evicted)})"
+        return True, msg
+
+    def _check_replacement(self, entry, conflicts):
+        """
+        Replace-by-fee rules (BIP125, every tx replaceable) for a new entry spending
+        outputs that the pending txs 'conflicts' already spend. The replacement must:
+          - not spend outputs of any tx it would evict
+          - not add unconfirmed inputs the replaced txs didn't already have
+          - pay a higher fee rate than each tx it directly replaces
+          - pay at least the fees of everything evicted (conflicts and their
+            descendants), plus INCREMENTAL_RELAY_FEE for its own bytes
+          - evict at most MAX_REPLACEMENT_EVICTIONS txs
+        Returns (tx_ids to evict, "") or (None, rejection message).
+        """
+        prefix = f"UTXO already spent in pending transaction {min(conflicts)} (Mempool conflict)"
+        if not self.replace_by_fee:
+            return None, prefix
+        replaced = self._collect(conflicts, "children")
+        if len(replaced) > MAX_REPLACEMENT_EVICTIONS:
+            return None, f"{prefix}: replacing it would evict {len(replaced)} txs (limit {MAX_REPLACEMENT_EVICTIONS})"
+        if entry["parents"] & replaced:
+            return None, f"{prefix}: replacement spends an output of a tx it replaces"
+        allowed_parents = set().union(*(self.entries[tx_id]["parents"] for tx_id in conflicts))
+        if entry["parents"] - allowed_parents:
+            return None, f"{prefix}: replacement adds new unconfirmed inputs"
+        for tx_id in sorted(conflicts):
+            if entry["fee_rate"] <= self.entries[tx_id]["fee_rate"]:
+                return None, (f"UTXO already spent in pending transaction {tx_id} (Mempool conflict): replacement fee rate "
+                              f"{entry['fee_rate']:.2f} sat/B is not above its {self.entries[tx_id]['fee_rate']:.2f} sat/B")
+        evicted_fees = sum(self.entries[tx_id]["fee_sats"] for tx_id in replaced)
+        required = evicted_fees + math.ceil(INCREMENTAL_RELAY_FEE * entry["size"])
+        if entry["fee_sats"] < required:
+            return None, (f"{prefix}: replacement fee {entry['fee_sats']} sats is below the "
+                          f"{required} sats required (replaced fees plus relay fee)")
+        return replaced, ""
+
+    def _insert(self, entry, ancestors):
+        tx = entry["tx"]
+        tx_id = tx["tx_id"]
+        self.entries[tx_id] = entry
+
+        entry["ancestor_fee"] = entry["fee_sats"] + sum(self.entries[a]["fee_sats"] for a in ancestors)
+        entry["ancestor_size"] = entry["size"] + sum(self.entries[a]["size"] for a in ancestors)
+        entry["ancestor_count"] = len(ancestors) + 1
+        entry["descendant_fee"] = entry["fee_sats"]
+        entry["descendant_size"] = entry["size"]
+        entry["descendant_count"] = 1
+
+        for parent_id in entry["parents"]:
+            self.entries[parent_id]["children"].add(tx_id)
+        for ancestor_id in ancestors:
+            ancestor = self.entries[ancestor_id]
+            ancestor["descendant_fee"] += entry["fee_sats"]
+            ancestor["descendant_size"] += entry["size"]
+            ancestor["descendant_count"] += 1
+            self._push_worst(ancestor)
+
+        self._push_best(entry)
+        self._push_worst(entry)
+        heapq.heappush(self._expiry, (entry["timestamp"], next(self._seq), tx_id))
+        self.total_size += entry["size"]
+        self._report_size()
+        # Mark inputs as spent in mempool to prevent Race Attacks (and find what a replacement conflicts with)
+        for inp in tx["inputs"]:
+            self.spent_utxos[(inp["prev_tx"], inp["index"])] = tx_id
+
+    # --- Removal ---
+
+    def remove_transaction(self, tx_id: str) -> list:
+        """
+        Drop a transaction (invalid/evicted) together with all its descendants,
+        which can no longer be valid without it. Returns the removed tx_ids.
+        """
+        if tx_id not in self.entries:
+            return []
+        doomed = self._collect([tx_id], "children")
+
+        for doomed_id in doomed:
+            entry = self.entries[doomed_id]
+            # Surviving ancestors lose this descendant from their package totals
+            for ancestor_id in self._collect(entry["parents"], "parents") - doomed:
+                ancestor = self.entries[ancestor_id]
+                ancestor["descendant_fee"] -= entry["fee_sats"]
+                ancestor["descendant_size"] -= entry["size"]
+                ancestor["descendant_count"] -= 1
+                self._push_worst(ancestor)
+            for parent_id in entry["parents"] - doomed:
+                self.entries[parent_id]["children"].discard(doomed_id)
+
+        for doomed_id in doomed:
+            self._release(self.entries.pop(doomed_id))
+        self._compact_heaps()
+        self._report_size()
+        return sorted(doomed)
+
+    def confirm_transaction(self, tx_id: str):
+        """
+        Remove a transaction that was mined. Its children stay in the pool: the
+        outputs they spend are now confirmed, so they simply lose that ancestor.
+        """
+        entry = self.entries.get(tx_id)
+        if entry is None:
+            return
+        # Blocks include ancestors first, but stay correct if a parent is still pending
+        for ancestor_id in self._collect(entry["parents"], "parents"):
+            ancestor = self.entries[ancestor_id]
+            ancestor["descendant_fee"] -= entry["fee_sats"]
+            ancestor["descendant_size"] -= entry["size"]
+            ancestor["descendant_count"] -= 1
+            self._push_worst(ancestor)
+        for parent_id in entry["parents"]:
+            self.entries[parent_id]["children"].discard(tx_id)
+
+        for descendant_id in self._collect(entry["children"], "children"):
+            descendant = self.entries[descendant_id]
+            descendant["ancestor_fee"] -= entry["fee_sats"]
+            descendant["ancestor_size"] -= entry["size"]
+            descendant["ancestor_count"] -= 1
+            self._push_best(descendant)
+        for child_id in entry["children"]:
+            self.entries[child_id]["parents"].discard(tx_id)
+
+        del self.entries[tx_id]
+        self._release(entry)
+        self._compact_heaps()
+        self._report_size()
+
+    def block_connected(self, block) -> list:
+        """
+        Update the pool for a block connected from elsewhere: its transactions are
+        confirmed, and pending ones that spend the same outputs are dropped (with their
+        descendants). Returns the tx_ids dropped as conflicts.
+        """
+        for tx in block["transactions"]:
+            self.confirm_transaction(tx["tx_id"])
+
+        # The outpoint index names the pending tx spending each output the block spent
+        conflicts = []
+        for tx in block["transactions"]:
+            for inp in tx["inputs"]:
+                tx_id = self.spent_utxos.get((inp["prev_tx"], inp["index"]))
+                if tx_id is not None:
+                    conflicts.extend(self.remove_transaction(tx_id))
+        self.expire()
+        return conflicts
+
+    def expire(self, now=None) -> list:
+        """
+        Drop transactions that arrived more than 'expiry' seconds before 'now'
+        (default: the current time), with their descendants. Pops only expired items
+        off the arrival-time heap, so it costs O(log n) per expired tx.
+        Returns the removed tx_ids.
+        """
+        if self.expiry is None:
+            return []
+        cutoff = (time.time() if now is None else now) - self.expiry
+        expired = []
+        while self._expiry and self._expiry[0][0] <= cutoff:
+            timestamp, _, tx_id = heapq.heappop(self._expiry)
+            entry = self.entries.get(tx_id)
+            if entry is not None and entry["timestamp"] == timestamp:
+                expired.extend(self.remove_transaction(tx_id))
+        if expired and metrics.ENABLED:
+            metrics.inc("mempool_expired_total", len(expired))
+        return expired
+
+    def _release(self, entry):
+        self.total_size -= entry["size"]
+        tx_id = entry["tx"]["tx_id"]
+        for inp in entry["tx"]["inputs"]:
+            key = (inp["prev_tx"], inp["index"])
+            if self.spent_utxos.get(key) == tx_id:
+                del self.spent_utxos[key]
+
+    def _report_size(self):
+        if metrics.ENABLED:
+            metrics.gauge("mempool_transactions", len(self.entries))
+            metrics.gauge("mempool_bytes", self.total_size)
+
+    def _compact_heaps(self):
+        # Stale heap items are normally dropped as they surface; rebuild if they pile up
+        limit = 2 * len(self.entries) + 64
+        if len(self._best) > limit:
+            self._best = [item for item in self._best if self._is_live(item, "best_seq")]
+            heapq.heapify(self._best)
+        if len(self._worst) > limit:
+            self._worst = [item for item in self._worst if self._is_live(item, "worst_seq")]
+            heapq.heapify(self._worst)
+        if len(self._expiry) > limit:
+            self._expiry = [item for item in self._expiry
+                            if item[2] in self.entries and self.entries[item[2]]["timestamp"] == item[0]]
+            heapq.heapify(self._expiry)
+
+    # --- Selection ---
 
     def get_top_transactions(self, n: int) -> list:
-        """Return top N transactions by fee (highest first)."""
-        # Sort by fee desc, then timestamp asc
-        sorted_txs = sorted(self.transactions, key=lambda x: (-x["fee"], x["timestamp"]))
-        return sorted_txs[:n]
+        """Return top N transactions by ancestor package fee rate (FIFO on ties)."""
+        # Pop the best N live items, then push them back: O(N log n)
+        popped = []
+        while self._best and len(popped) < n:
+            item = heapq.heappop(self._best)
+            if self._is_live(item, "best_seq"):
+                popped.append(item)
+        for item in popped:
+            heapq.heappush(self._best, item)
+        return [self.entries[item[3]] for item in popped]
+
+    def _topological(self, tx_ids) -> list:
+        # A parent always has fewer in-pool ancestors than its child
+        return sorted((self.entries[t] for t in tx_ids), key=lambda e: (e["ancestor_count"], e["timestamp"]))
+
+    def with_ancestors(self, selected) -> list:
+        """Expand selected entries with their pending ancestors, parents first."""
+        tx_ids = set()
+        for item in selected:
+            tx_id = item["tx"]["tx_id"]
+            if tx_id in self.entries:
+                tx_ids.add(tx_id)
+                tx_ids |= self._collect(self.entries[tx_id]["parents"], "parents")
+        return self._topological(tx_ids)
+
+    @metrics.timed("block_template")
+    def build_block_template(self, max_txs: int) -> list:
+        """
+        Select up to 'max_txs' entries by ancestor package fee rate (child-pays-for-parent).
+        Picking a package lowers the package totals of its remaining descendants; those
+        are tracked in a side heap, so only selected txs and their descendants are visited.
+        Returns entries with parents before children.
+        """
+        in_block = set()
+        block = []
+        modified = {}     # tx_id -> (fee, size) still owed once in-block ancestors are paid
+        modified_heap = []
+        popped = []       # Live items taken off self._best, pushed back at the end
+        skipped = set()   # Packages that didn't fit in the remaining space
+
+        while len(block) < max_txs:
+            # Best unmodified candidate
+            while self._best:
+                item = self._best[0]
+                if not self._is_live(item, "best_seq"):
+                    heapq.heappop(self._best)
+                elif item[3] in in_block or item[3] in modified or item[3] in skipped:
+                    popped.append(heapq.heappop(self._best))
+                else:
+                    break
+            # Best modified candidate
+            while modified_heap and (modified_heap[0][2] in in_block or modified_heap[0][2] in skipped
+                                     or modified.get(modified_heap[0][2]) != modified_heap[0][3]):
+                heapq.heappop(modified_heap)
+
+            if not self._best and not modified_heap:
+                break
+            if modified_heap and (not self._best or modified_heap[0][:2] < self._best[0][:2]):
+                tx_id = modified_heap[0][2]
+            else:
+                tx_id = self._best[0][3]
+
+            package = self._collect([tx_id], "parents") - in_block
+            if len(block) + len(package) > max_txs:
+                skipped.add(tx_id)
+                continue
+
+            for entry in self._topological(package):
+                block.append(entry)
+                in_block.add(entry["tx"]["tx_id"])
+            # Descendants of the package no longer pay for what is already in the block
+            for package_id in package:
+                paid = self.entries[package_id]
+                for descendant_id in self._collect(paid["children"], "children") - in_block:
+                    descendant = self.entries[descendant_id]
+                    fee, size = modified.get(descendant_id, (descendant["ancestor_fee"], descendant["ancestor_size"]))
+                    owed = (fee - paid["fee_sats"], size - paid["size"])
+                    modified[descendant_id] = owed
+                    heapq.heappush(modified_heap, (-owed[0] / owed[1], descendant["timestamp"], descendant_id, owed))
+
+        for item in popped:
+            heapq.heappush(self._best, item)
+        return block
 
     def clear(self):
-        self.transactions = []
-        self.spent_utxos = set()
-        
-import time # Needed for timestamp
\ No newline at end of file
+        self.entries = {}
+        self.spent_utxos = {}
+        self._best = []
+        self._worst = []
+        self._expiry = []
+        self.total_size = 0
+        self._report_size()
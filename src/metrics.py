@@ -0,0 +1,189 @@
+import json
+import time
+import random
+import bisect
+import functools
+import threading
+from collections import deque
+
+# Read on each call (main --metrics sets it after import); disabled timers still cost a wrapper call
+ENABLED = False
+
+# Latency histogram bucket upper bounds, in seconds (Prometheus "le" labels)
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_counters = {}  # (name, labels) -> value
+_gauges = {}    # (name, labels) -> value
+_timers = {}    # (name, labels) -> [count, sum, max, bucket counts...]
+_trace_rate = 0.0
+_traces = deque(maxlen=1000)
+# Recording can happen off the event loop (the node's stateless checks run on an
+# executor thread), so updates and exports hold this lock
+_lock = threading.Lock()
+
+# Rejection messages -> short reason labels (first match wins)
+REJECTION_REASONS = (
+    ("ID does not match", "bad_tx_id"),
+    ("no inputs", "no_inputs"),
+    ("Double spend", "duplicate_input"),
+    ("does not exist", "missing_input"),
+    ("Mempool conflict", "mempool_conflict"),
+    ("already in mempool", "already_in_mempool"),
+    ("Signature mismatch", "bad_signature"),
+    ("Invalid signature", "bad_signature"),
+    ("Missing signature", "missing_signature"),
+    ("Malformed", "malformed"),
+    ("negative", "negative_output"),
+    ("Insufficient funds", "insufficient_funds"),
+    ("ancestors", "too_many_ancestors"),
+    ("descendants", "too_many_descendants"),
+    ("Mempool is full", "mempool_full"),
+)
+
+def rejection_reason(msg: str) -> str:
+    for needle, reason in REJECTION_REASONS:
+        if needle in msg:
+            return reason
+    return "other"
+
+def enable(trace_rate=0.0, trace_limit=1000):
+    """
+    Start recording. 'trace_rate' is the fraction of stage calls kept as trace spans
+    (0.01 = 1 in 100); the newest 'trace_limit' spans are kept.
+    """
+    global ENABLED, _trace_rate, _traces
+    ENABLED = True
+    _trace_rate = trace_rate
+    _traces = deque(_traces, maxlen=trace_limit)
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+def reset():
+    """Drop everything recorded so far."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timers.clear()
+        _traces.clear()
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name: str, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def gauge(name: str, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+def observe(name: str, seconds: float, **labels):
+    key = _key(name, labels)
+    bucket = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        timer = _timers.get(key)
+        if timer is None:
+            timer = _timers[key] = [0, 0.0, 0.0] + [0] * len(BUCKETS)
+        timer[0] += 1
+        timer[1] += seconds
+        timer[2] = max(timer[2], seconds)
+        if bucket < len(BUCKETS):
+            timer[3 + bucket] += 1
+
+def timed(stage: str, outcome=None):
+    """
+    Decorator for a pipeline stage. When enabled it records '<stage>_seconds' and
+    '<stage>_total{result=...}', where 'outcome' maps the return value to the result
+    label, and keeps a sampled trace span.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+            label = outcome(result) if outcome else "ok"
+            observe(stage + "_seconds", elapsed)
+            inc(stage + "_total", result=label)
+            if _trace_rate and random.random() < _trace_rate:
+                with _lock:
+                    _traces.append({"stage": stage, "at": time.time() - elapsed,
+                                    "duration_ms": elapsed * 1000, "result": label})
+            return result
+        return wrapper
+    return decorate
+
+def traces() -> list:
+    with _lock:
+        return list(_traces)
+
+def _sorted_items(store) -> list:
+    """Sorted copy of a store's entries (timer lists copied too), taken under the lock."""
+    with _lock:
+        return sorted((key, list(v) if isinstance(v, list) else v) for key, v in store.items())
+
+# --- Export ---
+
+def snapshot() -> dict:
+    """Everything recorded, as plain JSON-friendly data."""
+    def rows(store, value):
+        return [{"name": name, "labels": dict(labels), **value(v)} for (name, labels), v in _sorted_items(store)]
+
+    return {
+        "counters": rows(_counters, lambda v: {"value": v}),
+        "gauges": rows(_gauges, lambda v: {"value": v}),
+        "timers": rows(_timers, lambda t: {
+            "count": t[0], "sum": t[1], "max": t[2],
+            "mean": t[1] / t[0] if t[0] else 0.0,
+            "buckets": dict(zip(map(str, BUCKETS), t[3:])),
+        }),
+        "traces": traces(),
+    }
+
+def to_json(indent=2) -> str:
+    return json.dumps(snapshot(), indent=indent)
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def to_prometheus(prefix="utxo_") -> str:
+    """Prometheus text exposition format (counters, gauges, timers as histograms)."""
+    lines = []
+    typed = set()
+
+    def header(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in _sorted_items(_counters):
+        header(prefix + name, "counter")
+        lines.append(f"{prefix}{name}{_labels(labels)} {value}")
+    for (name, labels), value in _sorted_items(_gauges):
+        header(prefix + name, "gauge")
+        lines.append(f"{prefix}{name}{_labels(labels)} {value}")
+    for (name, labels), timer in _sorted_items(_timers):
+        full = prefix + name
+        header(full, "histogram")
+        cumulative = 0
+        for bound, hits in zip(BUCKETS, timer[3:]):
+            cumulative += hits
+            lines.append(f"{full}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{full}_bucket{_labels(labels, [('le', '+Inf')])} {timer[0]}")
+        lines.append(f"{full}_sum{_labels(labels)} {timer[1]}")
+        lines.append(f"{full}_count{_labels(labels)} {timer[0]}")
+    return "\n".join(lines) + "\n"
+
+def dump(path: str):
+    """Write a snapshot; '.json' files get JSON, anything else Prometheus text."""
+    with open(path, "w") as f:
+        f.write(to_json() if path.endswith(".json") else to_prometheus())
@@ -1,55 +1,80 @@
-from src.transaction import generate_tx_id
+from src.chain import Blockchain
+from src.units import to_sats
+from src import metrics
 
-def mine_block(miner_address: str, mempool, utxo_manager, specific_txs=None):
+MAX_BLOCK_TXS = 5
+
+def prepare_block(miner_address: str, mempool, chain, specific_txs=None, max_txs=MAX_BLOCK_TXS, say=print):
     """
-    Mines a block.
-    If 'specific_txs' is provided, it mines ONLY those.
-    Otherwise, it mines the top 5 highest-fee transactions.
+    Select transactions and build the block paying their fees to the miner, before
+    its proof-of-work search (chain.solve_block). Returns the block, or None.
     """
-    if not mempool.transactions:
-        print("Mempool is empty. Nothing to mine.")
-        return
+    if len(mempool) == 0:
+        say("Mempool is empty. Nothing to mine.")
+        return None
 
     # 1. Select transactions
     if specific_txs is not None:
-        candidates = specific_txs
-        print(f"Mining block with {len(candidates)} USER-SELECTED transactions...")
+        # Unconfirmed parents must be confirmed first (and in the same block)
+        candidates = mempool.with_ancestors(specific_txs)
+        say(f"Mining block with {len(specific_txs)} USER-SELECTED transactions...")
+        if len(candidates) > len(specific_txs):
+            say(f"Including {len(candidates) - len(specific_txs)} unconfirmed parent transaction(s).")
     else:
-        # Default behavior: Mine top 5 by fee
-        candidates = mempool.get_top_transactions(5)
-        print(f"Mining block with top {len(candidates)} transactions...")
-
-    total_fee = 0.0
-    tx_ids_to_remove = []
-
-    # 2. Process transactions
-    for item in candidates:
-        tx = item["tx"]
-        total_fee += item["fee"]
-        tx_ids_to_remove.append(tx["tx_id"])
-
-        # Remove Inputs (Destroy UTXOs)
-        for inp in tx["inputs"]:
-            utxo_manager.remove_utxo(inp["prev_tx"], inp["index"])
-
-        # Add Outputs (Create UTXOs)
-        for i, out in enumerate(tx["outputs"]):
-            utxo_manager.add_utxo(tx["tx_id"], i, out["amount"], out["address"])
-
-    # 3. Coinbase Transaction (Miner Reward)
-    coinbase_tx_id = generate_tx_id()
-    utxo_manager.add_utxo(coinbase_tx_id, 0, total_fee, miner_address)
-    
-    # 4. Clean up Mempool
-    # Remove mined transactions from main list
-    mempool.transactions = [t for t in mempool.transactions if t["tx"]["tx_id"] not in tx_ids_to_remove]
-    
-    # Remove spent_utxos locks
-    for item in candidates:
-        for inp in item["tx"]["inputs"]:
-            key = (inp["prev_tx"], inp["index"])
-            if key in mempool.spent_utxos:
-                mempool.spent_utxos.remove(key)
-
-    print(f"Block mined! Miner {miner_address} earned {total_fee:.5f} BTC.")
-    print(f"Transactions confirmed: {tx_ids_to_remove}")
\ No newline at end of file
+        # Default behavior: Mine top 5 by ancestor package fee rate
+        candidates = mempool.build_block_template(max_txs)
+        say(f"Mining block with top {len(candidates)} transactions...")
+
+    if not candidates:
+        say("No transactions fit in this block.")
+        return None
+
+    # 2. Build the block (coinbase pays the fees to the miner)
+    total_fee_sats = sum(to_sats(item["fee"]) for item in candidates)
+    return chain.block_template(miner_address, [item["tx"] for item in candidates], total_fee_sats)
+
+def finish_block(block, mempool, chain, say=print) -> bool:
+    """
+    Connect a solved block and update the mempool. Returns False if it was rejected
+    (e.g. another block took the tip while this one was being mined).
+    """
+    # connect_block checks every tx on a UTXOView overlay first, so an invalid
+    # selection leaves the UTXO set untouched. It also commits the journal.
+    success, msg = chain.connect_block(block)
+    if not success:
+        say(f"Block rejected, UTXO set unchanged: {msg}")
+        return False
+
+    # 4. Clean up Mempool: drop the mined txs and their spent_utxos locks, and any
+    # pending tx that arrived during the search spending the same outputs
+    mempool.block_connected(block)
+
+    reward = block["transactions"][0]["outputs"][0]
+    say(f"Block {block['height']} mined! Miner {reward['address']} earned {reward['amount']:.5f} BTC.")
+    pow_stats = chain.last_pow
+    say(f"Proof of work: {pow_stats['hashes']:,} hashes in {pow_stats['seconds']:.3f}s "
+        f"({pow_stats['hashes_per_sec_per_core']:,.0f} H/s per core, {pow_stats['workers']} worker(s)), hash {block['hash']}")
+    say(f"Transactions confirmed: {[tx['tx_id'] for tx in block['transactions'][1:]]}")
+    return True
+
+@metrics.timed("mine_block", lambda block: "mined" if block else "empty")
+def mine_block(miner_address: str, mempool, utxo_manager, specific_txs=None, chain=None,
+               max_txs=MAX_BLOCK_TXS, verbose=True):
+    """
+    Mines a block.
+    If 'specific_txs' is provided, it mines ONLY those (plus any pending parents they need).
+    Otherwise, it mines up to 'max_txs' (default 5) transactions chosen by ancestor
+    package fee rate, so a high-fee child can pull its low-fee parent into the block (CPFP).
+    Pass the node's Blockchain as 'chain' to keep undo data for reorgs.
+    'verbose=False' silences the progress prints (simulations, node service).
+    Returns the connected block, or None if nothing was mined.
+    """
+    say = print if verbose else (lambda *args: None)
+    if chain is None:
+        chain = Blockchain(utxo_manager)
+    block = prepare_block(miner_address, mempool, chain, specific_txs, max_txs, say)
+    if block is None:
+        return None
+    # 3. Search for the proof-of-work nonce
+    chain.solve_block(block)
+    return block if finish_block(block, mempool, chain, say) else None
@@ -0,0 +1,372 @@
+import sys
+import os
+import argparse
+import heapq
+import itertools
+import json
+import random
+import statistics
+
+# Add the project root directory to Python's search path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from src.utxo_manager import UTXOManager
+from src.commitment import UTXOCommitment
+from src.mempool import Mempool
+from src.chain import Blockchain
+from src.mining import mine_block
+from src.transaction import create_transaction
+from src.keys import DEMO_KEYS, demo_address
+from src.wire import encode_transaction, decode_transaction, encode_block, decode_block
+
+# Message sizes for bandwidth accounting (payloads use their real wire size)
+MESSAGE_HEADER = 24   # Like Bitcoin's P2P header
+INV_ITEM = 36         # Type + 32-byte hash
+MAX_ORPHANS = 100     # Per node, orphan transactions kept while waiting for a parent
+PROCESSING_TIME = 0.0005  # Simulated seconds a node spends handling one message
+TAIL_BLOCKS = 3      # Blocks still found after the last transaction is submitted
+
+class SimNode:
+    """
+    One simulated node: its own UTXO set, mempool and chain, validating everything
+    independently. Relay is inventory based: new txs/blocks are announced by ID
+    ("inv"), peers ask for what they haven't seen ("getdata"), then get the data.
+    Messages are handled one at a time; each costs PROCESSING_TIME of simulated time.
+    """
+
+    def __init__(self, node_id, network, funding, commitment=False):
+        self.node_id = node_id
+        self.network = network
+        self.utxo_manager = UTXOManager()
+        for args in funding:
+            self.utxo_manager.add_utxo(*args)
+        if commitment:
+            self.utxo_manager.attach_commitment(UTXOCommitment(proofs=False))
+        self.mempool = Mempool(max_size=1_000_000)
+        self.chain = Blockchain(self.utxo_manager)
+        self.peers = []
+        self.busy_until = 0.0
+        self.known = set()          # Every tx/block ID seen or requested, for dedup
+        self.relay = {}             # ID -> encoded bytes we can serve to peers
+        self.orphans = {}           # Missing parent tx_id -> [encoded child txs]
+        self.orphan_count = 0
+        self.orphan_blocks = {}     # Missing parent hash -> [blocks]
+        self.side_blocks = {}       # hash -> valid-looking block not on our chain
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.tx_received = 0
+        self.conflicts = 0
+
+    # --- Messaging ---
+
+    def send(self, peer, kind, payload, size):
+        self.bytes_sent += MESSAGE_HEADER + size
+        self.network.deliver(self, peer, (kind, payload), MESSAGE_HEADER + size)
+
+    def announce(self, kind, item_id, exclude=None):
+        for peer in self.peers:
+            if peer is not exclude:
+                self.send(peer, "inv", (kind, [item_id]), INV_ITEM)
+
+    def receive(self, sender, kind, payload):
+        if kind == "inv":
+            self.on_inv(sender, *payload)
+        elif kind == "getdata":
+            self.on_getdata(sender, *payload)
+        elif kind == "tx":
+            self.on_tx(payload, sender)
+        elif kind == "block":
+            self.on_block(payload, sender)
+
+    def on_inv(self, sender, kind, ids):
+        wanted = [i for i in ids if i not in self.known]
+        self.known.update(wanted)
+        if wanted:
+            self.send(sender, "getdata", (kind, wanted), INV_ITEM * len(wanted))
+
+    def on_getdata(self, sender, kind, ids):
+        for item_id in ids:
+            raw = self.relay.get(item_id)
+            if raw is not None:
+                self.send(sender, kind, raw, len(raw))
+
+    # --- Transactions ---
+
+    def submit(self, tx):
+        """A local wallet hands us a transaction."""
+        self.on_tx(encode_transaction(tx), None)
+
+    def on_tx(self, raw, sender):
+        tx = decode_transaction(raw)
+        tx_id = tx["tx_id"]
+        self.known.add(tx_id)
+        self.tx_received += 1
+        self.network.first_seen(self, "tx", tx_id)
+
+        success, msg = self.mempool.add_transaction(tx, self.utxo_manager)
+        if success:
+            self.relay[tx_id] = raw
+            self.announce("tx", tx_id, exclude=sender)
+            self._retry_orphans(tx_id)
+        elif "does not exist" in msg:
+            # Probably a child that outran its parent: park it until the parent shows up
+            missing = [inp["prev_tx"] for inp in tx["inputs"]
+                       if not self.utxo_manager.exists(inp["prev_tx"], inp["index"])
+                       and inp["prev_tx"] not in self.mempool.entries]
+            if missing and sum(len(v) for v in self.orphans.values()) < MAX_ORPHANS:
+                self.orphan_count += 1
+                self.orphans.setdefault(missing[0], []).append(raw)
+        elif "Mempool conflict" in msg:
+            self.conflicts += 1
+
+    def _retry_orphans(self, parent_id):
+        for raw in self.orphans.pop(parent_id, []):
+            self.tx_received -= 1  # A retry is not a new reception
+            self.on_tx(raw, None)
+
+    # --- Blocks ---
+
+    def mine(self, max_txs):
+        block = mine_block(f"miner_{self.node_id}", self.mempool, self.utxo_manager,
+                           chain=self.chain, max_txs=max_txs, verbose=False)
+        if block is None:
+            # Nothing pending: a coinbase-only block still extends the chain
+            block = self.chain.create_block(f"miner_{self.node_id}", [], 0)
+            if not self.chain.connect_block(block)[0]:
+                return None
+        self.network.first_seen(self, "block", block["hash"])
+        self._accept_block(block, encode_block(block), None)
+        return block
+
+    def on_block(self, raw, sender):
+        block = decode_block(raw)
+        self.known.add(block["hash"])
+        self.network.first_seen(self, "block", block["hash"])
+
+        if block["prev_hash"] == self.chain.tip_hash:
+            success, msg = self.chain.connect_block(block)
+            if success:
+                self.mempool.block_connected(block)
+                self._accept_block(block, raw, sender)
+            return
+
+        # Blocks we could fork from: the tip and every block below it we can still undo to
+        main_chain = {b["prev_hash"] for b, _ in self.chain.recent} | {self.chain.tip_hash}
+        if block["prev_hash"] in self.side_blocks or block["prev_hash"] in main_chain:
+            self.side_blocks[block["hash"]] = block
+            self.relay[block["hash"]] = raw
+            if not self._try_reorg(block, main_chain, sender):
+                # Still a side branch, but children waiting on it may make it the longest
+                for child_raw, child_sender in self.orphan_blocks.pop(block["hash"], []):
+                    self.on_block(child_raw, child_sender)
+        else:
+            # Parent not seen yet (e.g. it lost a race elsewhere): ask the sender for it
+            self.network.orphan_blocks += 1
+            self.orphan_blocks.setdefault(block["prev_hash"], []).append((raw, sender))
+            if sender is not None:
+                self.send(sender, "getdata", ("block", [block["prev_hash"]]), INV_ITEM)
+
+    def _try_reorg(self, block, main_chain, sender):
+        """Switch to the side branch ending at 'block' if it is now the longer one."""
+        if block["height"] <= self.chain.height:
+            self.network.stale_blocks += 1
+            return False
+        branch = [block]
+        while branch[0]["prev_hash"] not in main_chain:
+            parent = self.side_blocks.get(branch[0]["prev_hash"])
+            if parent is None:
+                return False
+            branch.insert(0, parent)
+        success, msg, disconnected = self.chain.reorganize(branch)
+        if not success:
+            return False
+        self.network.reorgs += 1
+        for old in disconnected:
+            self.side_blocks[old["hash"]] = old
+        for new in branch:
+            self.side_blocks.pop(new["hash"], None)
+            self.mempool.block_connected(new)
+        # Transactions from the abandoned blocks go back to the mempool if still valid
+        for old in reversed(disconnected):
+            for tx in old["transactions"][1:]:
+                self.mempool.add_transaction(tx, self.utxo_manager)
+        self._accept_block(block, self.relay[block["hash"]], sender)
+        return True
+
+    def _accept_block(self, block, raw, sender):
+        self.known.add(block["hash"])
+        self.relay[block["hash"]] = raw
+        self.announce("block", block["hash"], exclude=sender)
+        for tx in block["transactions"]:
+            self._retry_orphans(tx["tx_id"])
+        for child_raw, child_sender in self.orphan_blocks.pop(block["hash"], []):
+            self.on_block(child_raw, child_sender)
+
+class Network:
+    """
+    N SimNodes linked by a random graph with per-link latency, driven by a
+    discrete-event scheduler. Time is simulated, so latency figures don't depend
+    on how fast the host machine runs 1,000 nodes.
+    """
+
+    def __init__(self, n_nodes, degree, latency, funding, seed, processing_time=PROCESSING_TIME, commitments=False):
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.processing_time = processing_time
+        self.nodes = [SimNode(i, self, funding, commitments) for i in range(n_nodes)]
+        self.links = {}
+        self.now = 0.0
+        self._events = []           # (time, seq, callback, args)
+        self._seq = itertools.count()
+        self.seen = {}              # (kind, id) -> {"origin": t, "nodes": {node_id: t}}
+        self.orphan_blocks = 0
+        self.stale_blocks = 0
+        self.reorgs = 0
+        self._connect(degree)
+
+    def _connect(self, degree):
+        # A ring keeps the graph connected; random extra links bring the degree up
+        n = len(self.nodes)
+        for i in range(n):
+            self._link(self.nodes[i], self.nodes[(i + 1) % n])
+        for node in self.nodes:
+            while len(node.peers) < min(degree, n - 1):
+                self._link(node, self.rng.choice(self.nodes))
+
+    def _link(self, a, b):
+        if a is b or b in a.peers:
+            return
+        a.peers.append(b)
+        b.peers.append(a)
+        self.links[(a.node_id, b.node_id)] = self.links[(b.node_id, a.node_id)] = self.rng.uniform(*self.latency)
+
+    def schedule(self, delay, callback, *args):
+        heapq.heappush(self._events, (self.now + delay, next(self._seq), callback, args))
+
+    def run(self, until=None):
+        """Process events in time order until none are left (or 'until' is reached)."""
+        while self._events and (until is None or self._events[0][0] <= until):
+            self.now, _, callback, args = heapq.heappop(self._events)
+            callback(*args)
+        if until is not None:
+            self.now = max(self.now, until)
+
+    def deliver(self, sender, receiver, message, size):
+        self.schedule(self.links[(sender.node_id, receiver.node_id)], self._arrive, sender, receiver, message, size)
+
+    def _arrive(self, sender, receiver, message, size):
+        receiver.bytes_received += size
+        # A busy node queues the message behind the ones it is still handling
+        start = max(self.now, receiver.busy_until)
+        receiver.busy_until = start + self.processing_time
+        self.schedule(receiver.busy_until - self.now, receiver.receive, sender, *message)
+
+    def first_seen(self, node, kind, item_id):
+        record = self.seen.setdefault((kind, item_id), {"origin": self.now, "nodes": {}})
+        record["nodes"].setdefault(node.node_id, self.now)
+
+    def report(self) -> dict:
+        n = len(self.nodes)
+        result = {"nodes": n}
+        for kind in ("tx", "block"):
+            delays = []
+            coverage = []
+            for (k, _), record in self.seen.items():
+                if k != kind:
+                    continue
+                delays.extend(t - record["origin"] for t in record["nodes"].values())
+                coverage.append(len(record["nodes"]) / n)
+            delays.sort()
+            result[kind] = {
+                "count": len(coverage),
+                "mean_coverage": statistics.fmean(coverage) if coverage else 0.0,
+                "latency_ms": {
+                    "mean": 1000 * statistics.fmean(delays) if delays else 0.0,
+                    "p50": 1000 * delays[len(delays) // 2] if delays else 0.0,
+                    "p90": 1000 * delays[int(len(delays) * 0.9)] if delays else 0.0,
+                    "max": 1000 * delays[-1] if delays else 0.0
+                }
+            }
+        traffic = [node.bytes_sent + node.bytes_received for node in self.nodes]
+        received = sum(node.tx_received for node in self.nodes) or 1
+        result["bandwidth_bytes_per_node"] = {"mean": statistics.fmean(traffic), "max": max(traffic)}
+        result["orphan_tx_rate"] = sum(node.orphan_count for node in self.nodes) / received
+        result["conflict_rate"] = sum(node.conflicts for node in self.nodes) / received
+        result["orphan_blocks"] = self.orphan_blocks
+        result["stale_blocks"] = self.stale_blocks
+        result["reorgs"] = self.reorgs
+        tips = [node.chain.tip_hash for node in self.nodes]
+        heights = [node.chain.height for node in self.nodes]
+        result["best_height"] = max(heights)
+        result["at_best_height"] = heights.count(max(heights)) / n
+        result["tip_agreement"] = max(tips.count(t) for t in set(tips)) / n
+        if self.nodes[0].utxo_manager.commitment is not None:
+            # Same UTXO set, checked by comparing MuHash digests instead of the sets
+            digests = [node.utxo_manager.commitment.digest() for node in self.nodes]
+            result["utxo_set_agreement"] = max(digests.count(d) for d in set(digests)) / n
+        return result
+
+def make_funding(n_wallets):
+    """Identical starting UTXO set for every node: one 1 BTC coin per wallet."""
+    return [("funding", i, 1.0, demo_address(f"wallet_{i}")) for i in range(n_wallets)]
+
+def simulate(n_nodes=10, n_txs=200, degree=8, latency=(0.005, 0.05), tx_rate=100.0,
+             conflict_rate=0.05, chain_rate=0.1, block_interval=5.0, block_txs=100, seed=1, commitments=False):
+    """Run a relay simulation and return Network.report()."""
+    rng = random.Random(seed)
+    network = Network(n_nodes, degree, latency, make_funding(n_txs), seed, commitments=commitments)
+
+    last = None
+    for i in range(n_txs):
+        at = i / tx_rate
+        wallet = demo_address(f"wallet_{i}")
+        if last is not None and rng.random() < chain_rate:
+            # Spend the previous payment's unconfirmed output from another node
+            child = create_transaction([{"prev_tx": last["tx_id"], "index": 0, "owner": last["outputs"][0]["address"]}],
+                                       [{"amount": 0.998, "address": demo_address(f"shop_{i}")}], DEMO_KEYS)
+            network.schedule(at, rng.choice(network.nodes).submit, child)
+        tx = create_transaction([{"prev_tx": "funding", "index": i, "owner": wallet}],
+                                [{"amount": 0.999, "address": demo_address(f"payee_{i}")}], DEMO_KEYS)
+        network.schedule(at, rng.choice(network.nodes).submit, tx)
+        if rng.random() < conflict_rate:
+            # Double spend of the same coin injected at another node
+            double = create_transaction([{"prev_tx": "funding", "index": i, "owner": wallet}],
+                                        [{"amount": 0.999, "address": demo_address(f"thief_{i}")}], DEMO_KEYS)
+            network.schedule(at, rng.choice(network.nodes).submit, double)
+        last = tx
+
+    # Blocks at exponential intervals (Poisson process), found by a random node, until
+    # TAIL_BLOCKS of them fall after the last submission (so pending txs get mined)
+    at, tail = 0.0, 0
+    while tail < TAIL_BLOCKS:
+        at += rng.expovariate(1 / block_interval)
+        network.schedule(at, rng.choice(network.nodes).mine, block_txs)
+        if at >= (n_txs - 1) / tx_rate:
+            tail += 1
+
+    network.run()
+    return network.report()
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-node gossip relay simulation")
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--txs", type=int, default=200)
+    parser.add_argument("--degree", type=int, default=8)
+    parser.add_argument("--min-latency", type=float, default=0.005, help="Seconds")
+    parser.add_argument("--max-latency", type=float, default=0.05, help="Seconds")
+    parser.add_argument("--tx-rate", type=float, default=100.0, help="Transactions submitted per (simulated) second")
+    parser.add_argument("--block-interval", type=float, default=5.0, help="Mean (simulated) seconds between blocks")
+    parser.add_argument("--block-txs", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--commitments", action="store_true",
+                        help="Keep a MuHash commitment per node and report UTXO set agreement")
+    args = parser.parse_args()
+    report = simulate(args.nodes, args.txs, args.degree, (args.min_latency, args.max_latency),
+                      args.tx_rate, block_interval=args.block_interval,
+                      block_txs=args.block_txs, seed=args.seed, commitments=args.commitments)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
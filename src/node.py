@@ -0,0 +1,301 @@
+import sys
+import os
+import asyncio
+import argparse
+import json
+
+# Add the project root directory to Python's search path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from src.main import load_state, DEFAULT_DATA_DIR
+from src.mempool import Mempool
+from src.chain import Blockchain
+from src.mining import prepare_block, finish_block
+from src.transaction import get_tx_id
+from src.keys import DEMO_KEYS
+from src.validator import check_transactions_stateless
+from src.wire import decode_transaction
+from src.commitment import UTXOCommitment
+from src import metrics
+
+# Submissions are coalesced: a batch closes after BATCH_WINDOW seconds or BATCH_MAX txs
+BATCH_WINDOW = 0.005
+BATCH_MAX = 1000
+MAX_LINE = 1 << 20
+
+class Node:
+    """
+    Asyncio node owning one UTXOManager, Mempool and Blockchain.
+    Serves newline-delimited JSON over TCP, one request object per line:
+        {"id": 1, "method": "submit_transaction", "params": {"tx": {...}}}
+        {"id": 1, "result": ...}  or  {"id": 1, "error": "..."}
+    Methods: submit_transaction (params: tx dict, or raw = wire bytes as hex),
+    get_balance (owner), get_mempool, mine_block (miner), get_metrics (format),
+    get_utxo_stats (top), get_utxo_commitment, get_balance_proof (owner).
+    The UTXO set, mempool and chain are touched only from the event loop thread.
+    Stateless checks and the proof-of-work search run on executor threads; they
+    share only the signature cache and metrics (both locked) and the block being solved.
+    """
+
+    def __init__(self, utxo_manager, mempool, chain):
+        self.utxo_manager = utxo_manager
+        self.mempool = mempool
+        self.chain = chain
+        self._queue = asyncio.Queue()
+        self._batcher = None
+        self._mining = asyncio.Lock()  # One nonce search at a time
+        self.connections = 0
+
+    async def start(self, host="127.0.0.1", port=8333):
+        self._batcher = asyncio.create_task(self._batch_loop())
+        return await asyncio.start_server(self._handle_client, host, port, limit=MAX_LINE, backlog=4096)
+
+    def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+
+    # --- Batching ---
+
+    async def submit(self, tx):
+        """Queue a transaction for the next micro-batch and wait for its (success, message)."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((tx, future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + BATCH_WINDOW
+            while len(batch) < BATCH_MAX:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._process_batch(batch)
+
+    async def _process_batch(self, batch):
+        txs = [tx for tx, _ in batch]
+        # Stateless checks off the loop (they fan out to the process pool),
+        # then the ordered UTXO/mempool pass back on the loop thread. Malformed
+        # txs are rejected one by one there (see validate_transaction).
+        prechecks = await asyncio.get_running_loop().run_in_executor(None, check_transactions_stateless, txs)
+        for (tx, future), (ok, _) in zip(batch, prechecks):
+            result = self.mempool.add_transaction(tx, self.utxo_manager, prechecked=ok)
+            if not future.done():
+                future.set_result(result)
+
+    # --- Request handling ---
+
+    async def _handle_client(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                response = await self._dispatch(line)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _dispatch(self, line: bytes) -> dict:
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            handler = getattr(self, "rpc_" + str(request.get("method")), None)
+            if handler is None:
+                return {"id": request_id, "error": f"Unknown method {request.get('method')!r}"}
+            return {"id": request_id, "result": await handler(**request.get("params", {}))}
+        except Exception as e:
+            return {"id": request_id, "error": f"{type(e).__name__}: {e}"}
+
+    async def rpc_submit_transaction(self, tx=None, raw=None):
+        if raw is not None:
+            tx = decode_transaction(bytes.fromhex(raw))
+        get_tx_id(tx)
+        success, msg = await self.submit(tx)
+        return {"accepted": success, "message": msg, "tx_id": tx["tx_id"]}
+
+    async def rpc_get_balance(self, owner):
+        owner = DEMO_KEYS.resolve(owner)  # Demo wallet names are accepted as well as addresses
+        return {"owner": owner, "balance": self.utxo_manager.get_balance(owner)}
+
+    async def rpc_get_mempool(self):
+        return [{
+            "tx_id": item["tx"]["tx_id"],
+            "fee": item["fee"],
+            "fee_rate": item["fee_rate"],
+            "size": item["size"],
+            "inputs": len(item["tx"]["inputs"]),
+            "outputs": len(item["tx"]["outputs"])
+        } for item in self.mempool.transactions]
+
+    async def rpc_mine_block(self, miner):
+        miner = DEMO_KEYS.resolve(miner)
+        say = lambda *args: None
+        async with self._mining:
+            block = prepare_block(miner, self.mempool, self.chain, say=say)
+            if block is None:
+                return None
+            # The nonce search blocks, so it runs on an executor thread while the
+            # loop keeps serving; the block is connected back on the loop.
+            await asyncio.get_running_loop().run_in_executor(None, self.chain.solve_block, block)
+            if not finish_block(block, self.mempool, self.chain, say=say):
+                return None
+        return {
+            "height": block["height"],
+            "hash": block["hash"],
+            "bits": block["bits"],
+            "nonce": block["nonce"],
+            "pow": self.chain.last_pow,
+            "transactions": [tx["tx_id"] for tx in block["transactions"]]
+        }
+
+    async def rpc_get_metrics(self, format="json"):
+        """Snapshot of the instrumentation counters ('json' or 'prometheus' text)."""
+        return metrics.to_prometheus() if format == "prometheus" else metrics.snapshot()
+
+    async def rpc_get_utxo_stats(self, top=10):
+        """Aggregate UTXO set statistics (see analytics.py; needs NumPy on the node)."""
+        from src.analytics import UTXOStats
+        return UTXOStats(self.utxo_manager).summary(top)
+
+    async def rpc_get_utxo_commitment(self):
+        """MuHash and merkle root of the UTXO set (node started with --commitment)."""
+        commitment = self._commitment()
+        return {
+            "height": self.utxo_manager.best_height,
+            "best_hash": self.utxo_manager.best_hash,
+            "utxos": len(self.utxo_manager),
+            "muhash": commitment.digest(),
+            "root": commitment.root,
+        }
+
+    async def rpc_get_balance_proof(self, owner):
+        """
+        An owner's UTXOs, each with its inclusion proof against 'root', so a light
+        client can check them with commitment.verify_utxo and add them up. (Proofs
+        show these coins are unspent; they can't show that none were left out.)
+        """
+        commitment = self._commitment()
+        owner = DEMO_KEYS.resolve(owner)
+        utxos = []
+        for tx_id, index, amount_sats in self.utxo_manager.iter_owner_utxos(owner):
+            utxos.append({
+                "tx_id": tx_id,
+                "index": index,
+                "amount_sats": amount_sats,
+                "height": self.utxo_manager.get_utxo(tx_id, index)["height"],
+                "proof": commitment.prove(tx_id, index),
+            })
+        return {"owner": owner, "height": self.utxo_manager.best_height, "root": commitment.root, "utxos": utxos}
+
+    def _commitment(self):
+        if self.utxo_manager.commitment is None:
+            raise RuntimeError("UTXO commitments are off (start the node with --commitment)")
+        return self.utxo_manager.commitment
+
+class NodeClient:
+    """Minimal asyncio client: one connection, requests pipelined by id."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self._next_id = 0
+        self._pending = {}
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8333):
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+        return cls(reader, writer)
+
+    async def _read_loop(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            future = self._pending.pop(response.get("id"), None)
+            if future is not None:
+                future.set_result(response)
+        for future in self._pending.values():
+            future.set_exception(ConnectionError("Node closed the connection"))
+
+    async def call(self, method, **params):
+        """Send one request; returns its result or raises RuntimeError with the error."""
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._next_id] = future
+        self.writer.write(json.dumps({"id": self._next_id, "method": method, "params": params}).encode() + b"\n")
+        await self.writer.drain()
+        response = await future
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self._reader_task.cancel()
+
+async def serve(host, port, data_dir, block_interval=None, pow_workers=None, shards=None, commitment=False):
+    utxo_manager, store = load_state(data_dir, shards)
+    if commitment:
+        utxo_manager.attach_commitment(UTXOCommitment())
+    chain = Blockchain(utxo_manager, target_spacing=block_interval, workers=pow_workers)
+    node = Node(utxo_manager, Mempool(max_size=100_000), chain)
+    server = await node.start(host, port)
+    print(f"Node listening on {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        node.close()
+        if store is not None:
+            store.close()
+        if shards:
+            utxo_manager.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="UTXO simulator node (JSON over TCP)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8333)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where the UTXO snapshot and journal live")
+    parser.add_argument("--in-memory", action="store_true", help="Don't persist anything (start from genesis)")
+    parser.add_argument("--metrics", action="store_true", help="Record timings and counters (get_metrics RPC)")
+    parser.add_argument("--trace-rate", type=float, default=0.0, help="Fraction of stage calls kept as trace spans")
+    parser.add_argument("--block-interval", type=float, metavar="SECONDS",
+                        help="Retarget proof-of-work difficulty toward this block interval (default: fixed minimum difficulty)")
+    parser.add_argument("--shards", type=int, metavar="N", help="Partition the UTXO set over N worker processes")
+    parser.add_argument("--commitment", action="store_true",
+                        help="Maintain a UTXO set commitment (MuHash + merkle proofs; costs time on every change)")
+    parser.add_argument("--pow-workers", type=int, metavar="N", help="Processes searching for nonces (default: one per CPU)")
+    args = parser.parse_args()
+    if args.commitment and args.shards:
+        parser.error("--commitment needs the in-process UTXO set (drop --shards)")
+    if args.metrics:
+        metrics.enable(trace_rate=args.trace_rate)
+    try:
+        asyncio.run(serve(args.host, args.port, None if args.in_memory else args.data_dir,
+                          args.block_interval, args.pow_workers, args.shards, args.commitment))
+    except KeyboardInterrupt:
+        print("Node stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os
+import time
+import hashlib
+import struct
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Block header (little-endian, 80 bytes):
+#   u32 height, 32-byte prev_hash, 32-byte merkle_root, u32 timestamp, u32 bits, u32 nonce
+# The block hash is SHA-256(SHA-256(header)); it must be <= the target encoded in 'bits'.
+HEADER = struct.Struct("<I32s32sIII")
+NONCE = struct.Struct("<I")
+NONCE_SPACE = 1 << 32
+
+# Easiest target (Bitcoin's regtest limit): about 1 in 2 hashes qualifies
+POW_LIMIT_BITS = 0x207FFFFF
+STOP_CHECK = 4096  # Nonces between checks of the cancellation flag
+# Targets expected to need fewer hashes than this are searched inline: starting
+# the worker processes would take longer than the search
+PARALLEL_MIN_HASHES = 1 << 18
+
+_pool = None
+_pool_workers = 0
+_pool_stop = None  # multiprocessing.Event shared with the pool's workers
+_stop = None       # The same event, as seen inside a worker process
+
+def bits_to_target(bits: int) -> int:
+    """Decode Bitcoin's compact target: mantissa * 256^(exponent - 3)."""
+    exponent, mantissa = bits >> 24, bits & 0x7FFFFF
+    if exponent <= 3:
+        return mantissa >> (8 * (3 - exponent))
+    return mantissa << (8 * (exponent - 3))
+
+def target_to_bits(target: int) -> int:
+    """Compact encoding of 'target' (rounded down to 3 significant bytes)."""
+    size = (target.bit_length() + 7) // 8
+    if size <= 3:
+        mantissa = target << (8 * (3 - size))
+    else:
+        mantissa = target >> (8 * (size - 3))
+    if mantissa & 0x800000:
+        # The top mantissa bit is a sign bit: shift one byte to keep it clear
+        mantissa >>= 8
+        size += 1
+    return size << 24 | mantissa
+
+POW_LIMIT = bits_to_target(POW_LIMIT_BITS)
+
+def header_bytes(block, nonce=None) -> bytes:
+    return HEADER.pack(block["height"], bytes.fromhex(block["prev_hash"]), bytes.fromhex(block["merkle_root"]),
+                       block["timestamp"], block["bits"], block["nonce"] if nonce is None else nonce)
+
+def hash_header(header: bytes) -> str:
+    return hashlib.sha256(hashlib.sha256(header).digest()).hexdigest()
+
+def check_pow(block_hash: str, bits: int) -> bool:
+    return int(block_hash, 16) <= bits_to_target(bits)
+
+def difficulty(bits: int) -> float:
+    """Expected hashes per block relative to the easiest target (1.0 = POW_LIMIT)."""
+    return POW_LIMIT / bits_to_target(bits)
+
+# --- Nonce search ---
+
+def _init_worker(stop):
+    global _stop
+    _stop = stop
+
+def search(prefix: bytes, target: int, start: int, end: int):
+    """
+    Try nonces start..end-1 for the 76-byte header 'prefix' (everything but the nonce).
+    The first 64 bytes are hashed once (midstate); each nonce only hashes the last
+    16 bytes and the outer SHA-256. Stops early if another worker sets the stop flag.
+    Returns (nonce or None, hashes tried, seconds).
+    """
+    begin = time.perf_counter()
+    midstate = hashlib.sha256(prefix[:64])
+    tail = prefix[64:]
+    # Same-length big-endian byte strings compare like the numbers they encode
+    target_bytes = max(0, min(target, (1 << 256) - 1)).to_bytes(32, "big")
+    sha256 = hashlib.sha256
+    pack = NONCE.pack
+    nonce = start
+    while nonce < end:
+        if _stop is not None and _stop.is_set():
+            break
+        for nonce in range(nonce, min(nonce + STOP_CHECK, end)):
+            inner = midstate.copy()
+            inner.update(tail + pack(nonce))
+            if sha256(inner.digest()).digest() <= target_bytes:
+                return nonce, nonce - start + 1, time.perf_counter() - begin
+        nonce += 1
+    return None, nonce - start, time.perf_counter() - begin
+
+def _get_pool(workers):
+    global _pool, _pool_workers, _pool_stop
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+        _pool_stop = multiprocessing.Event()
+        _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(_pool_stop,))
+        _pool_workers = workers
+    return _pool
+
+def solve(prefix: bytes, target: int, workers=None, start=0, end=NONCE_SPACE):
+    """
+    Search nonces start..end-1, split into one contiguous range per worker process.
+    As soon as one worker finds a nonce the others are told to stop.
+    Returns (nonce or None, total hashes, seconds, per-worker hashes/sec list).
+    """
+    workers = workers or os.cpu_count() or 1
+    begin = time.perf_counter()
+    if workers < 2 or (target and (1 << 256) // target < PARALLEL_MIN_HASHES):
+        nonce, hashes, seconds = search(prefix, target, start, end)
+        return nonce, hashes, time.perf_counter() - begin, [hashes / seconds if seconds else 0.0]
+
+    pool = _get_pool(workers)
+    _pool_stop.clear()
+    span = -(-(end - start) // workers)
+    pending = {pool.submit(search, prefix, target, lo, min(lo + span, end)) for lo in range(start, end, span)}
+    found = None
+    rates = []
+    hashes = 0
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            nonce, tried, seconds = future.result()
+            hashes += tried
+            rates.append(tried / seconds if seconds else 0.0)
+            if nonce is not None and (found is None or nonce < found):
+                found = nonce
+        if found is not None:
+            _pool_stop.set()  # The rest return within STOP_CHECK hashes
+    return found, hashes, time.perf_counter() - begin, rates
+
+def mine_header(block, workers=None) -> dict:
+    """
+    Find a nonce for 'block' (its header fields already set), rolling the timestamp
+    forward whenever the 2^32 nonces are exhausted. Sets block["nonce"] and
+    block["hash"]; returns {"hashes", "seconds", "hashes_per_sec_per_core", "workers"}.
+    """
+    target = bits_to_target(block["bits"])
+    hashes = 0
+    seconds = 0.0
+    while True:
+        prefix = header_bytes(block, 0)[:-NONCE.size]
+        nonce, tried, elapsed, rates = solve(prefix, target, workers)
+        hashes += tried
+        seconds += elapsed
+        if nonce is not None:
+            break
+        block["timestamp"] += 1
+    block["nonce"] = nonce
+    block["hash"] = hash_header(header_bytes(block))
+    return {
+        "hashes": hashes,
+        "seconds": seconds,
+        "hashes_per_sec_per_core": sum(rates) / len(rates) if rates else 0.0,
+        "workers": len(rates),
+    }
+
+def hashrate(workers=None, hashes_per_worker=200_000) -> dict:
+    """Hashes/sec per core and in total, searching an impossible target for a fixed count."""
+    workers = workers or os.cpu_count() or 1
+    prefix = bytes(HEADER.size - NONCE.size)
+    _, hashes, seconds, rates = solve(prefix, 0, workers, 0, hashes_per_worker * workers)
+    return {
+        "workers": workers,
+        "hashes": hashes,
+        "hashes_per_sec": hashes / seconds if seconds else 0.0,
+        "hashes_per_sec_per_core": sum(rates) / len(rates) if rates else 0.0,
+    }
@@ -0,0 +1,303 @@
+import sys
+import os
+import json
+import time
+import struct
+import argparse
+
+# Add project root to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from src.main import load_state
+from src.mempool import Mempool
+from src.chain import Blockchain
+from src.mining import mine_block
+from src.transaction import U32, I64, get_tx_id
+from src.units import to_sats, to_btc
+from src.wire import encode_transaction, decode_transaction
+from src.validator import MALFORMED_ERRORS, malformed_message
+
+# Event scripts, one event per JSONL line:
+#   {"type": "fund", "tx_id": "genesis", "index": 0, "amount": 1.5, "owner": "Alice"}
+#   {"type": "tx", "tx": {...}}   or   {"type": "tx", "raw": "<wire bytes as hex>"}
+#   {"type": "mine", "miner": "Miner1", "max_txs": 1000}   (max_txs optional)
+# The binary form is BINARY_MAGIC followed by records of u8 op + u32 length + payload:
+#   F: i64 amount (sats), u32 index, str tx_id, str owner
+#   T: transaction wire bytes (see wire.py)
+#   M: u32 max_txs (0 = default), str miner
+# where str = u32 byte length + UTF-8 bytes.
+BINARY_MAGIC = b"UTXOREP1"
+RECORD = struct.Struct("<cI")
+BATCH_SIZE = 1000  # Consecutive tx events go through Mempool.add_transactions together
+DEFAULT_BLOCK_TXS = 1000
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return U32.pack(len(data)) + data
+
+def _unpack_str(buf, offset: int):
+    (length,) = U32.unpack_from(buf, offset)
+    offset += U32.size
+    return str(buf[offset:offset + length], "utf-8"), offset + length
+
+# --- Reading and writing event scripts ---
+
+def _read_jsonl(f):
+    for line_no, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError as e:
+            yield {"type": "error", "message": f"Line {line_no}: {e}"}
+            continue
+        if not isinstance(event, dict):
+            yield {"type": "error", "message": f"Line {line_no}: expected a JSON object, got {type(event).__name__}"}
+            continue
+        if event.get("type") == "tx":
+            try:
+                if "raw" in event:
+                    event["tx"] = decode_transaction(bytes.fromhex(event.pop("raw")))
+                elif not isinstance(event.get("tx"), dict):
+                    raise ValueError("tx event needs 'tx' or 'raw'")
+            except (ValueError, TypeError) as e:
+                yield {"type": "error", "message": f"Line {line_no}: {e}"}
+                continue
+        yield event
+
+def _read_binary(f):
+    while True:
+        header = f.read(RECORD.size)
+        if not header:
+            return
+        if len(header) < RECORD.size:
+            yield {"type": "error", "message": "Truncated record header"}
+            return
+        op, length = RECORD.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length:
+            yield {"type": "error", "message": "Truncated record"}
+            return
+        if op == b"T":
+            try:
+                yield {"type": "tx", "tx": decode_transaction(payload)}
+            except ValueError as e:
+                yield {"type": "error", "message": str(e)}
+        elif op in (b"M", b"F"):
+            try:
+                yield _parse_record(op, payload)
+            except (struct.error, UnicodeDecodeError) as e:
+                yield {"type": "error", "message": f"Bad {op.decode()} record: {e}"}
+        else:
+            yield {"type": "error", "message": f"Unknown record type {op!r}"}
+
+def _parse_record(op: bytes, payload: bytes) -> dict:
+    """Event for an M or F record payload."""
+    if op == b"M":
+        (max_txs,) = U32.unpack_from(payload, 0)
+        miner, _ = _unpack_str(payload, U32.size)
+        return {"type": "mine", "miner": miner, "max_txs": max_txs or None}
+    (amount_sats,) = I64.unpack_from(payload, 0)
+    (index,) = U32.unpack_from(payload, I64.size)
+    tx_id, offset = _unpack_str(payload, I64.size + U32.size)
+    owner, _ = _unpack_str(payload, offset)
+    return {"type": "fund", "tx_id": tx_id, "index": index, "amount_sats": amount_sats, "owner": owner}
+
+def read_events(path: str):
+    """Yield events from a JSONL or binary script ('-' = stdin), one at a time."""
+    if path == "-":
+        yield from _read_jsonl(sys.stdin)
+        return
+    with open(path, "rb") as f:
+        binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    if binary:
+        with open(path, "rb") as f:
+            f.seek(len(BINARY_MAGIC))
+            yield from _read_binary(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from _read_jsonl(f)
+
+def write_events(events, path: str, binary: bool = False) -> int:
+    """Stream events into a script file. Returns how many were written."""
+    count = 0
+    with open(path, "wb" if binary else "w") as f:
+        if binary:
+            f.write(BINARY_MAGIC)
+        for event in events:
+            kind = event["type"]
+            if binary:
+                if kind == "tx":
+                    payload = encode_transaction(event["tx"])
+                elif kind == "mine":
+                    payload = U32.pack(event.get("max_txs") or 0) + _pack_str(event["miner"])
+                else:
+                    amount_sats = event.get("amount_sats", to_sats(event.get("amount", 0)))
+                    payload = I64.pack(amount_sats) + U32.pack(event["index"]) + _pack_str(event["tx_id"]) + _pack_str(event["owner"])
+                f.write(RECORD.pack(kind[0].upper().encode(), len(payload)) + payload)
+            else:
+                if kind == "tx" and hasattr(event["tx"], "to_dict"):
+                    event = dict(event, tx=event["tx"].to_dict())
+                f.write(json.dumps(event) + "\n")
+            count += 1
+    return count
+
+def workload_events(workload, n_txs: int, block_every: int = 1000, block_txs: int = DEFAULT_BLOCK_TXS):
+    """Script for a synthetic workload: funding, then payments with a block every 'block_every' txs."""
+    for index, amount_sats, owner in workload.genesis:
+        yield {"type": "fund", "tx_id": "genesis", "index": index, "amount_sats": amount_sats, "owner": owner}
+    for i, tx in enumerate(workload.transactions(n_txs), 1):
+        yield {"type": "tx", "tx": tx}
+        if i % block_every == 0:
+            yield {"type": "mine", "miner": "replay_miner", "max_txs": block_txs}
+
+# --- Pipeline ---
+
+def _batched(events, size: int):
+    """Group consecutive tx events into lists of up to 'size'; other events pass through alone."""
+    batch = []
+    for event in events:
+        if event.get("type") == "tx":
+            batch.append(event)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        else:
+            if batch:
+                yield batch
+                batch = []
+            yield event
+    if batch:
+        yield batch
+
+def _apply_event(item, utxo_manager, mempool, chain, block_txs) -> dict:
+    """Apply one non-tx event and return its result fields."""
+    kind = item.get("type")
+    if kind == "mine":
+        block = mine_block(item.get("miner", "replay_miner"), mempool, utxo_manager, chain=chain,
+                           max_txs=item.get("max_txs") or block_txs, verbose=False)
+        if block is None:
+            return {"type": "mine", "mined": False}
+        return {"type": "mine", "mined": True, "height": block["height"],
+                "hash": block["hash"], "txs": len(block["transactions"]) - 1}
+    if kind == "fund":
+        amount_sats = item.get("amount_sats", to_sats(item.get("amount", 0)))
+        utxo_manager.add_utxo_sats(item["tx_id"], item["index"], amount_sats, item["owner"])
+        return {"type": "fund", "tx_id": item["tx_id"], "index": item["index"]}
+    if kind == "error":
+        return {"type": "error", "message": item["message"]}
+    return {"type": "error", "message": f"Unknown event type {kind!r}"}
+
+def run_events(events, utxo_manager, mempool, chain, block_txs=DEFAULT_BLOCK_TXS, batch_size=BATCH_SIZE):
+    """
+    Apply events in order and yield one result dict per event.
+    Memory stays flat: at most one batch of transactions is held at a time.
+    A bad event yields an error result and the replay carries on.
+    """
+    n = 0
+    for item in _batched(events, batch_size):
+        if isinstance(item, list):
+            txs = []
+            malformed = {}  # position in batch -> error
+            for pos, event in enumerate(item):
+                try:
+                    get_tx_id(event["tx"])
+                    txs.append(event["tx"])
+                except MALFORMED_ERRORS as e:
+                    malformed[pos] = malformed_message(e)
+            results = iter(zip(txs, mempool.add_transactions(txs, utxo_manager)))
+            for pos in range(len(item)):
+                n += 1
+                if pos in malformed:
+                    yield {"n": n, "type": "error", "message": malformed[pos]}
+                    continue
+                tx, (success, msg) = next(results)
+                yield {"n": n, "type": "tx", "tx_id": tx["tx_id"], "accepted": success, "message": msg}
+            continue
+
+        n += 1
+        try:
+            result = _apply_event(item, utxo_manager, mempool, chain, block_txs)
+        except Exception as e:
+            result = {"type": "error", "message": f"Bad {item.get('type')!r} event: {type(e).__name__}: {e}"}
+        yield {"n": n, **result}
+
+def summarize(utxo_manager, mempool, chain, counts, elapsed) -> dict:
+    total_sats = sum(record["amount_sats"] for _, record in utxo_manager.items())
+    return {
+        "events": counts["events"],
+        "tx_accepted": counts["accepted"],
+        "tx_rejected": counts["rejected"],
+        "blocks": counts["blocks"],
+        "errors": counts["errors"],
+        "seconds": elapsed,
+        "events_per_sec": counts["events"] / elapsed if elapsed else 0.0,
+        "height": chain.height,
+        "utxo_count": len(utxo_manager),
+        "utxo_total": to_btc(total_sats),
+        "mempool_txs": len(mempool),
+        "mempool_bytes": mempool.total_size,
+    }
+
+def replay(events, utxo_manager, mempool, chain, out=None, block_txs=DEFAULT_BLOCK_TXS) -> dict:
+    """Run a whole event stream, writing each result as a JSON line to 'out' (if given)."""
+    counts = {"events": 0, "accepted": 0, "rejected": 0, "blocks": 0, "errors": 0}
+    start = time.perf_counter()
+    for result in run_events(events, utxo_manager, mempool, chain, block_txs):
+        counts["events"] += 1
+        if result["type"] == "tx":
+            counts["accepted" if result["accepted"] else "rejected"] += 1
+        elif result["type"] == "mine" and result["mined"]:
+            counts["blocks"] += 1
+        elif result["type"] == "error":
+            counts["errors"] += 1
+        if out is not None:
+            out.write(json.dumps(result) + "\n")
+    return summarize(utxo_manager, mempool, chain, counts, time.perf_counter() - start)
+
+def replay_file(path, utxo_manager, output=None, mempool_size=100_000, block_txs=DEFAULT_BLOCK_TXS) -> dict:
+    """Replay a script file; results go to 'output' ('-' = stdout, None = discarded)."""
+    mempool = Mempool(max_size=mempool_size)
+    chain = Blockchain(utxo_manager)
+    if output is None:
+        return replay(read_events(path), utxo_manager, mempool, chain, None, block_txs)
+    if output == "-":
+        return replay(read_events(path), utxo_manager, mempool, chain, sys.stdout, block_txs)
+    with open(output, "w") as out:
+        return replay(read_events(path), utxo_manager, mempool, chain, out, block_txs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a transaction/mining script without the menu")
+    parser.add_argument("script", help="JSONL or binary event script ('-' = JSONL on stdin)")
+    parser.add_argument("--output", default="-", help="Per-event results as JSONL ('-' = stdout)")
+    parser.add_argument("--quiet", action="store_true", help="Don't write per-event results")
+    parser.add_argument("--data-dir", help="Replay on top of saved state (default: fresh genesis in memory)")
+    parser.add_argument("--mempool-size", type=int, default=100_000)
+    parser.add_argument("--block-txs", type=int, default=DEFAULT_BLOCK_TXS, help="Block size for mine events without max_txs")
+    parser.add_argument("--generate", type=int, metavar="N",
+                        help="Instead of replaying, write a synthetic script of N payments to 'script'")
+    parser.add_argument("--binary", action="store_true", help="With --generate: write the binary format")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.generate:
+        from src.workload import Workload
+        workload = Workload(max(10, args.generate // 10), seed=args.seed)
+        count = write_events(workload_events(workload, args.generate, block_txs=args.block_txs), args.script, args.binary)
+        print(f"Wrote {count} events to {args.script}")
+        return
+
+    utxo_manager, store = load_state(args.data_dir)
+    try:
+        summary = replay_file(args.script, utxo_manager, None if args.quiet else args.output,
+                              args.mempool_size, args.block_txs)
+    finally:
+        if store is not None:
+            store.close()
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import hashlib
+import secrets
+
+# secp256k1 (y^2 = x^3 + 7 over F_p) and BIP340 Schnorr signatures, in pure Python.
+# Points are affine (x, y) tuples or Jacobian (X, Y, Z) tuples with x = X/Z^2,
+# y = Y/Z^3; None is the point at infinity. Public keys are 32-byte x-only
+# encodings (even y), signatures are 64 bytes: R.x || s.
+P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+G = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+     0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+
+G_WINDOW = 8  # Bits per window of the precomputed k*G table
+_g_table = None
+
+def tagged_hash(tag: str, data: bytes) -> bytes:
+    tag_hash = hashlib.sha256(tag.encode()).digest()
+    return hashlib.sha256(tag_hash + tag_hash + data).digest()
+
+# --- Field and group arithmetic ---
+
+def _double(p):
+    if p is None:
+        return None
+    x, y, z = p
+    if y == 0:
+        return None
+    a = x * x % P
+    b = y * y % P
+    c = b * b % P
+    d = 2 * ((x + b) * (x + b) - a - c) % P
+    e = 3 * a
+    x3 = (e * e - 2 * d) % P
+    return x3, (e * (d - x3) - 8 * c) % P, 2 * y * z % P
+
+def _add_affine(p, q):
+    """Jacobian p + affine q."""
+    if p is None:
+        return None if q is None else (q[0], q[1], 1)
+    if q is None:
+        return p
+    x1, y1, z1 = p
+    z1z1 = z1 * z1 % P
+    u2 = q[0] * z1z1 % P
+    s2 = q[1] * z1 * z1z1 % P
+    h = (u2 - x1) % P
+    r = 2 * (s2 - y1) % P
+    if h == 0:
+        return _double(p) if r == 0 else None
+    hh = h * h % P
+    i = 4 * hh
+    j = h * i
+    v = x1 * i
+    x3 = (r * r - j - 2 * v) % P
+    return x3, (r * (v - x3) - 2 * y1 * j) % P, ((z1 + h) * (z1 + h) - z1z1 - hh) % P
+
+def _add(p, q):
+    """Jacobian p + Jacobian q."""
+    if p is None:
+        return q
+    if q is None:
+        return p
+    x1, y1, z1 = p
+    x2, y2, z2 = q
+    z1z1 = z1 * z1 % P
+    z2z2 = z2 * z2 % P
+    u1 = x1 * z2z2 % P
+    u2 = x2 * z1z1 % P
+    s1 = y1 * z2 * z2z2 % P
+    s2 = y2 * z1 * z1z1 % P
+    h = (u2 - u1) % P
+    r = 2 * (s2 - s1) % P
+    if h == 0:
+        return _double(p) if r == 0 else None
+    i = 4 * h * h % P
+    j = h * i
+    v = u1 * i
+    x3 = (r * r - j - 2 * v) % P
+    return (x3, (r * (v - x3) - 2 * s1 * j) % P, ((z1 + z2) * (z1 + z2) - z1z1 - z2z2) * h % P)
+
+def _to_affine(p):
+    if p is None:
+        return None
+    x, y, z = p
+    z_inv = pow(z, -1, P)
+    z_inv2 = z_inv * z_inv % P
+    return x * z_inv2 % P, y * z_inv2 * z_inv % P
+
+def _build_g_table():
+    """table[w][d] = d * 2^(G_WINDOW*w) * G (affine), so k*G is one addition per window."""
+    table = []
+    base = (G[0], G[1], 1)
+    for _ in range(-(-256 // G_WINDOW)):
+        row = [None]
+        acc = None
+        for _ in range((1 << G_WINDOW) - 1):
+            acc = _add(acc, base)
+            row.append(_to_affine(acc))
+        table.append(row)
+        for _ in range(G_WINDOW):
+            base = _double(base)
+    return table
+
+def g_mul(k: int):
+    """k*G as a Jacobian point, using the precomputed windows (built on first use)."""
+    global _g_table
+    if _g_table is None:
+        _g_table = _build_g_table()
+    acc = None
+    mask = (1 << G_WINDOW) - 1
+    for row in _g_table:
+        digit = k & mask
+        if digit:
+            acc = _add_affine(acc, row[digit])
+        k >>= G_WINDOW
+        if not k:
+            break
+    return acc
+
+def point_mul(k: int, point):
+    """k*point (point affine), 4-bit fixed window. Returns a Jacobian point."""
+    table = [None, (point[0], point[1], 1)]
+    for _ in range(14):
+        table.append(_add_affine(table[-1], point))
+    acc = None
+    for shift in range((k.bit_length() + 3) // 4 * 4 - 4, -4, -4):
+        acc = _double(_double(_double(_double(acc))))
+        digit = (k >> shift) & 15
+        if digit:
+            acc = _add(acc, table[digit])
+    return acc
+
+def lift_x(x: int):
+    """The point with x coordinate 'x' and even y, or None if there is none."""
+    if x >= P:
+        return None
+    y_sq = (pow(x, 3, P) + 7) % P
+    y = pow(y_sq, (P + 1) // 4, P)
+    if y * y % P != y_sq:
+        return None
+    return x, y if y % 2 == 0 else P - y
+
+# --- BIP340 ---
+
+def pubkey_from_seckey(seckey: int) -> bytes:
+    if not 1 <= seckey < N:
+        raise ValueError("Secret key out of range")
+    return _to_affine(g_mul(seckey))[0].to_bytes(32, "big")
+
+def sign(seckey: int, msg: bytes, aux: bytes = None) -> bytes:
+    """BIP340 signature of a 32-byte message. 'aux' is 32 bytes of randomness (fresh if None)."""
+    if not 1 <= seckey < N:
+        raise ValueError("Secret key out of range")
+    px, py = _to_affine(g_mul(seckey))
+    d = seckey if py % 2 == 0 else N - seckey
+    pubkey = px.to_bytes(32, "big")
+    if aux is None:
+        aux = secrets.token_bytes(32)
+    t = (d ^ int.from_bytes(tagged_hash("BIP0340/aux", aux), "big")).to_bytes(32, "big")
+    k0 = int.from_bytes(tagged_hash("BIP0340/nonce", t + pubkey + msg), "big") % N
+    if k0 == 0:
+        raise ValueError("Nonce is zero (negligible probability)")
+    rx, ry = _to_affine(g_mul(k0))
+    k = k0 if ry % 2 == 0 else N - k0
+    r = rx.to_bytes(32, "big")
+    e = int.from_bytes(tagged_hash("BIP0340/challenge", r + pubkey + msg), "big") % N
+    return r + ((k + e * d) % N).to_bytes(32, "big")
+
+def verify(pubkey: bytes, msg: bytes, sig: bytes) -> bool:
+    """BIP340 verification: R = s*G - e*P must have even y and x == r."""
+    if len(pubkey) != 32 or len(sig) != 64:
+        return False
+    point = lift_x(int.from_bytes(pubkey, "big"))
+    r = int.from_bytes(sig[:32], "big")
+    s = int.from_bytes(sig[32:], "big")
+    if point is None or r >= P or s >= N:
+        return False
+    e = int.from_bytes(tagged_hash("BIP0340/challenge", sig[:32] + pubkey + msg), "big") % N
+    R = _add(g_mul(s), point_mul(N - e, point) if e else None)
+    if R is None:
+        return False
+    x, y, z = R
+    # Compare in Jacobian form: x == r*z^2; only y parity needs the affine value
+    z2 = z * z % P
+    if x != r * z2 % P:
+        return False
+    return _to_affine(R)[1] % 2 == 0
+
+def _multi_mul(pairs):
+    """Sum of k*point over (k, affine point) pairs, Pippenger's bucket method."""
+    pairs = [(k % N, pt) for k, pt in pairs if k % N and pt is not None]
+    if not pairs:
+        return None
+    c = 4 if len(pairs) < 32 else 6 if len(pairs) < 256 else 8
+    mask = (1 << c) - 1
+    acc = None
+    for shift in range(-(-256 // c) * c - c, -c, -c):
+        for _ in range(c):
+            acc = _double(acc)
+        buckets = [None] * (1 << c)
+        for k, pt in pairs:
+            digit = (k >> shift) & mask
+            if digit:
+                buckets[digit] = _add_affine(buckets[digit], pt)
+        # sum(d * bucket[d]) as a running sum from the top bucket down
+        running = None
+        window = None
+        for d in range(mask, 0, -1):
+            running = _add(running, buckets[d])
+            window = _add(window, running)
+        acc = _add(acc, window)
+    return acc
+
+def batch_verify(items) -> bool:
+    """
+    Check many (pubkey, msg, sig) triples at once (BIP340 batch verification):
+    sum(a_i*s_i)*G == sum(a_i*R_i) + sum(a_i*e_i*P_i) for random a_i (a_1 = 1).
+    True only if every signature is valid; on False, verify one by one to find the culprit.
+    """
+    items = list(items)
+    if len(items) < 2:
+        return all(verify(*item) for item in items)
+    seed = hashlib.sha256(b"".join(pk + msg + sig for pk, msg, sig in items)).digest()
+    s_sum = 0
+    pairs = []
+    for i, (pubkey, msg, sig) in enumerate(items):
+        if len(pubkey) != 32 or len(sig) != 64:
+            return False
+        point = lift_x(int.from_bytes(pubkey, "big"))
+        r = int.from_bytes(sig[:32], "big")
+        s = int.from_bytes(sig[32:], "big")
+        R = lift_x(r)
+        if point is None or R is None or s >= N:
+            return False
+        e = int.from_bytes(tagged_hash("BIP0340/challenge", sig[:32] + pubkey + msg), "big") % N
+        a = 1 if i == 0 else int.from_bytes(tagged_hash("BIP0340/batch", seed + i.to_bytes(4, "big")), "big") % N
+        s_sum = (s_sum + a * s) % N
+        pairs.append((a, R))
+        pairs.append((a * e, point))
+    return _add(g_mul(s_sum) if s_sum else None, _neg_jacobian(_multi_mul(pairs))) is None
+
+def _neg_jacobian(p):
+    return None if p is None else (p[0], P - p[1], p[2])
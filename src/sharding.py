@@ -0,0 +1,259 @@
+import os
+import zlib
+import heapq
+import multiprocessing
+from array import array
+
+from src.utxo_manager import UTXOManager, GENESIS_HASH
+from src.units import to_sats, to_btc
+
+# Buffered changes per shard before they are sent without waiting for a read
+WRITE_BATCH = 10_000
+
+def shard_of(tx_id: str, index: int, shards: int) -> int:
+    """Owning shard of an outpoint: CRC-32 of the tx ID plus the output index."""
+    return (zlib.crc32(tx_id.encode()) + index) % shards
+
+# --- Shard process ---
+
+def _get(shard, keys):
+    return [shard.get_utxo(tx_id, index) for tx_id, index in keys]
+
+def _columns(shard, _):
+    amounts, owner_ids, heights, free_rows, owners = shard.columns()
+    return amounts, owner_ids, heights, list(free_rows), list(owners)
+
+_SHARD_OPS = {
+    "get": _get,
+    "len": lambda shard, _: len(shard),
+    "balance": lambda shard, owner: shard.get_balance_sats(owner),
+    "owner": lambda shard, query: list(shard.iter_owner_utxos(*query)),
+    "items": lambda shard, _: list(shard.items()),
+    "columns": _columns,
+    "snapshot": lambda shard, _: shard.snapshot(),
+}
+
+def _shard_main(conn):
+    """Serve one shard: a plain UTXOManager driven by (op, arg) messages on 'conn'."""
+    shard = UTXOManager()
+    while True:
+        op, arg = conn.recv()
+        if op == "apply":
+            # Changes are fire-and-forget: the pipe keeps them ordered before later reads
+            for change in arg:
+                if len(change) == 2:
+                    shard.remove_utxo(*change)
+                else:
+                    shard.add_utxo_sats(*change)
+        elif op == "stop":
+            conn.close()
+            return
+        else:
+            conn.send(_SHARD_OPS[op](shard, arg))
+
+class ShardedUTXOManager:
+    """
+    UTXO set partitioned by outpoint hash over worker processes, one UTXOManager
+    each, driven over pipes. Same API as UTXOManager, plus batched get_many and
+    apply_changes. Each batch is split by shard, sent to every shard involved,
+    and the replies collected, so the shards do their part of a batch in parallel.
+    Changes are buffered and sent in batches; any read sends them first, so reads
+    always see earlier writes. Owner queries (balances, coin selection) ask every
+    shard and merge the answers.
+    Journaling (attach_store) happens here, in the parent; call close() when done.
+    """
+
+    def __init__(self, shards=None):
+        self.shards = shards or os.cpu_count() or 1
+        self._conns = []
+        self._processes = []
+        for _ in range(self.shards):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_shard_main, args=(child_conn,), daemon=True)
+            process.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._processes.append(process)
+        self._pending = [[] for _ in range(self.shards)]  # Unsent changes per shard
+        self.best_height = 0
+        self.best_hash = GENESIS_HASH
+        self.store = None
+        self.commitment = None  # Not maintained here: see UTXOManager.attach_commitment
+
+    def close(self):
+        """Stop the shard processes (the set is lost unless journaled)."""
+        for conn in self._conns:
+            conn.send(("stop", None))
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._conns = []
+        self._processes = []
+
+    def attach_store(self, store):
+        """Journal every add/remove to 'store'; call commit() to make them durable."""
+        self.store = store
+
+    def commit(self):
+        """Flush journaled changes to disk (called once per mined block)."""
+        if self.store is None:
+            return
+        self.store.commit()
+        if self.store.needs_compaction():
+            self.store.compact(self)
+
+    def set_best_block(self, height: int, block_hash: str):
+        """Record which block the set now reflects (journaled with the block's deltas)."""
+        self.best_height = height
+        self.best_hash = block_hash
+        if self.store is not None:
+            self.store.record_tip(height, block_hash)
+
+    # --- IPC ---
+
+    def _send_pending(self):
+        for s, changes in enumerate(self._pending):
+            if changes:
+                self._conns[s].send(("apply", changes))
+                self._pending[s] = []
+
+    def _ask(self, requests):
+        """Send {shard: (op, arg)} to all shards at once, then collect {shard: reply}."""
+        self._send_pending()
+        for s, request in requests.items():
+            self._conns[s].send(request)
+        return {s: self._conns[s].recv() for s in requests}
+
+    def _ask_all(self, op, arg=None) -> list:
+        replies = self._ask({s: (op, arg) for s in range(self.shards)})
+        return [replies[s] for s in range(self.shards)]
+
+    # --- Changes ---
+
+    def apply_changes(self, removes, adds):
+        """
+        Remove the (tx_id, index) outpoints in 'removes', then add the
+        (tx_id, index, amount_sats, owner, height) outputs in 'adds'.
+        """
+        for tx_id, index in removes:
+            self._pending[shard_of(tx_id, index, self.shards)].append((tx_id, index))
+            if self.store is not None:
+                self.store.record_remove(tx_id, index)
+        for change in adds:
+            self._pending[shard_of(change[0], change[1], self.shards)].append(tuple(change))
+            if self.store is not None:
+                self.store.record_add(*change)
+        self._send_pending()
+
+    def add_utxo(self, tx_id: str, index: int, amount: float, owner: str, height: int = 0):
+        """Add a new UTXO to the set."""
+        self.add_utxo_sats(tx_id, index, to_sats(amount), owner, height)
+
+    def add_utxo_sats(self, tx_id: str, index: int, amount_sats: int, owner: str, height: int = 0):
+        """Add a new UTXO with an amount already in satoshis (buffered, see WRITE_BATCH)."""
+        s = shard_of(tx_id, index, self.shards)
+        self._pending[s].append((tx_id, index, amount_sats, owner, height))
+        if self.store is not None:
+            self.store.record_add(tx_id, index, amount_sats, owner, height)
+        if len(self._pending[s]) >= WRITE_BATCH:
+            self._send_pending()
+
+    def remove_utxo(self, tx_id: str, index: int):
+        """Remove a UTXO (when spent)."""
+        s = shard_of(tx_id, index, self.shards)
+        self._pending[s].append((tx_id, index))
+        if self.store is not None:
+            self.store.record_remove(tx_id, index)
+        if len(self._pending[s]) >= WRITE_BATCH:
+            self._send_pending()
+
+    # --- Reads ---
+
+    def get_many(self, keys) -> list:
+        """Records ({amount, amount_sats, owner, height} or None) for (tx_id, index) keys, in order."""
+        keys = list(keys)
+        by_shard = {}
+        for pos, (tx_id, index) in enumerate(keys):
+            by_shard.setdefault(shard_of(tx_id, index, self.shards), []).append(pos)
+        replies = self._ask({s: ("get", [keys[pos] for pos in positions]) for s, positions in by_shard.items()})
+        records = [None] * len(keys)
+        for s, positions in by_shard.items():
+            for pos, record in zip(positions, replies[s]):
+                records[pos] = record
+        return records
+
+    def get_utxo(self, tx_id: str, index: int):
+        """Return {amount, amount_sats, owner, height} for an unspent output, or None."""
+        return self.get_many([(tx_id, index)])[0]
+
+    def exists(self, tx_id: str, index: int) -> bool:
+        """Check if UTXO exists and is unspent."""
+        return self.get_utxo(tx_id, index) is not None
+
+    def __len__(self):
+        return sum(self._ask_all("len"))
+
+    def get_balance(self, owner: str) -> float:
+        return to_btc(self.get_balance_sats(owner))
+
+    def get_balance_sats(self, owner: str) -> int:
+        return sum(self._ask_all("balance", owner))
+
+    def items(self):
+        """Iterate over ((tx_id, index), {amount, amount_sats, owner, height}) pairs, shard by shard."""
+        for rows in self._ask_all("items"):
+            yield from rows
+
+    def columns(self):
+        """
+        Every shard's columns concatenated, in UTXOManager.columns() form (see
+        analytics.py). Owner ids are renumbered into one shared owner list.
+        """
+        amounts, owner_ids, heights = array("q"), array("l"), array("l")
+        free_rows, owners, lookup = [], [], {}
+        for shard_amounts, shard_owner_ids, shard_heights, shard_free, shard_owners in self._ask_all("columns"):
+            offset = len(amounts)
+            mapping = []
+            for owner in shard_owners:
+                owner_id = lookup.get(owner)
+                if owner_id is None:
+                    owner_id = lookup[owner] = len(owners)
+                    owners.append(owner)
+                mapping.append(owner_id)
+            amounts.extend(shard_amounts)
+            owner_ids.extend(map(mapping.__getitem__, shard_owner_ids))
+            heights.extend(shard_heights)
+            free_rows.extend(row + offset for row in shard_free)
+        return amounts, owner_ids, heights, free_rows, owners
+
+    def snapshot(self):
+        """Every shard's UTXOManager.snapshot() concatenated, owner ids renumbered as in columns()."""
+        keys, amounts, owner_ids, heights = [], array("q"), array("l"), array("l")
+        owners, lookup = [], {}
+        for shard_keys, shard_amounts, shard_owner_ids, shard_heights, shard_owners in self._ask_all("snapshot"):
+            mapping = []
+            for owner in shard_owners:
+                owner_id = lookup.get(owner)
+                if owner_id is None:
+                    owner_id = lookup[owner] = len(owners)
+                    owners.append(owner)
+                mapping.append(owner_id)
+            keys.extend(shard_keys)
+            amounts.extend(shard_amounts)
+            owner_ids.extend(map(mapping.__getitem__, shard_owner_ids))
+            heights.extend(shard_heights)
+        return keys, amounts, owner_ids, heights, owners
+
+    def get_utxos_for_owner(self, owner: str) -> list:
+        """Get all UTXOs owned by an address, smallest first (helper for creating txs)."""
+        return [{"tx_id": tx_id, "index": index, "amount": to_btc(amount_sats), "amount_sats": amount_sats}
+                for tx_id, index, amount_sats in self.iter_owner_utxos(owner)]
+
+    def iter_owner_utxos(self, owner: str, min_sats: int = 0, max_sats=None, largest_first: bool = False):
+        """
+        Yield (tx_id, index, amount_sats) like UTXOManager.iter_owner_utxos. Every
+        shard returns its matching coins in one reply and they are merged by value,
+        so this costs one round trip but is not lazy.
+        """
+        rows = self._ask_all("owner", (owner, min_sats, max_sats, largest_first))
+        yield from heapq.merge(*rows, key=lambda row: row[2], reverse=largest_first)
@@ -0,0 +1,249 @@
+import os
+import mmap
+import struct
+import threading
+import zlib
+
+# On-disk layout inside the data directory:
+#   utxo.snapshot          - full UTXO set, rewritten atomically by compaction
+#   journal.<segment>.log  - append-only deltas, one record per committed block
+# The snapshot header stores the last journal segment it already contains, so
+# startup loads the snapshot and replays only the segments after it.
+
+SNAPSHOT_MAGIC = b"UTXOSNP2"
+SNAPSHOT_HEADER = struct.Struct("<8sIQQi32s") # magic, last segment, owner count, utxo count, best height, best hash
+OWNER_LEN = struct.Struct("<H")
+SNAPSHOT_ENTRY = struct.Struct("<IqIi")     # index, amount (sats), owner id, height (after u16 len + tx_id)
+RECORD_HEADER = struct.Struct("<II")        # payload length, crc32 of payload
+OP_ADD = b"A"
+OP_REMOVE = b"R"
+OP_TIP = b"T"
+ADD_FIELDS = struct.Struct("<Iqi")          # index, amount (sats), height
+REMOVE_FIELDS = struct.Struct("<I")         # index
+TIP_FIELDS = struct.Struct("<i32s")         # best height, best hash
+
+SNAPSHOT_FILE = "utxo.snapshot"
+COMPACT_THRESHOLD = 4 * 1024 * 1024         # Roll the journal into a snapshot after ~4 MB
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return OWNER_LEN.pack(len(data)) + data
+
+def _unpack_str(buf, offset: int):
+    (length,) = OWNER_LEN.unpack_from(buf, offset)
+    offset += OWNER_LEN.size
+    return bytes(buf[offset:offset + length]).decode("utf-8"), offset + length
+
+class UTXOStore:
+    """Binary snapshot plus append-only journal for a UTXOManager."""
+
+    def __init__(self, data_dir: str, compact_threshold: int = COMPACT_THRESHOLD):
+        self.data_dir = data_dir
+        self.compact_threshold = compact_threshold
+        os.makedirs(data_dir, exist_ok=True)
+        self._pending = []          # Encoded ops not yet written to the journal
+        self._journal = None
+        self.segment = 0
+        self._lock = threading.Lock()
+        self._compactor = None
+
+    # --- Paths ---
+
+    def _snapshot_path(self):
+        return os.path.join(self.data_dir, SNAPSHOT_FILE)
+
+    def _segment_path(self, segment: int):
+        return os.path.join(self.data_dir, f"journal.{segment:06d}.log")
+
+    def _segments(self):
+        """Return existing journal segment numbers in ascending order."""
+        found = []
+        for name in os.listdir(self.data_dir):
+            parts = name.split(".")
+            if len(parts) == 3 and parts[0] == "journal" and parts[2] == "log" and parts[1].isdigit():
+                found.append(int(parts[1]))
+        return sorted(found)
+
+    def _open_segment(self, segment: int):
+        if self._journal is not None:
+            self._journal.close()
+        self.segment = segment
+        self._journal = open(self._segment_path(segment), "ab")
+
+    # --- Loading ---
+
+    def load(self, utxo_manager) -> bool:
+        """
+        Load the latest snapshot and replay the journal tail into utxo_manager.
+        Must be called before the store is attached, so replay isn't re-journaled.
+        Returns True if any saved state was found.
+        """
+        found = False
+        last_segment = 0
+        if os.path.exists(self._snapshot_path()):
+            last_segment = self._load_snapshot(utxo_manager)
+            found = True
+
+        segments = [s for s in self._segments() if s > last_segment]
+        for segment in segments:
+            self._replay_segment(segment, utxo_manager)
+            found = True
+
+        self._open_segment(segments[-1] if segments else last_segment + 1)
+        return found
+
+    def _load_snapshot(self, utxo_manager) -> int:
+        with open(self._snapshot_path(), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                buf = memoryview(mm)
+                try:
+                    magic, last_segment, owner_count, utxo_count, height, block_hash = SNAPSHOT_HEADER.unpack_from(buf, 0)
+                    if magic != SNAPSHOT_MAGIC:
+                        raise ValueError(f"{self._snapshot_path()} is not a (current version) UTXO snapshot")
+                    utxo_manager.set_best_block(height, block_hash.hex())
+                    offset = SNAPSHOT_HEADER.size
+
+                    owners = []
+                    for _ in range(owner_count):
+                        owner, offset = _unpack_str(buf, offset)
+                        owners.append(owner)
+
+                    for _ in range(utxo_count):
+                        tx_id, offset = _unpack_str(buf, offset)
+                        index, amount_sats, owner_id, height = SNAPSHOT_ENTRY.unpack_from(buf, offset)
+                        offset += SNAPSHOT_ENTRY.size
+                        utxo_manager.add_utxo_sats(tx_id, index, amount_sats, owners[owner_id], height)
+                finally:
+                    buf.release()
+        return last_segment
+
+    def _replay_segment(self, segment: int, utxo_manager):
+        path = self._segment_path(segment)
+        with open(path, "rb") as f:
+            data = f.read()
+
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, crc = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break  # Torn write from a crash: everything after this is garbage
+            self._apply_record(payload, utxo_manager)
+            offset = start + length
+
+        if offset < len(data):
+            # Drop the torn tail so new records append after the last good one
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+
+    def _apply_record(self, payload: bytes, utxo_manager):
+        buf = memoryview(payload)
+        offset = 0
+        while offset < len(buf):
+            op = bytes(buf[offset:offset + 1])
+            if op == OP_TIP:
+                height, block_hash = TIP_FIELDS.unpack_from(buf, offset + 1)
+                offset += 1 + TIP_FIELDS.size
+                utxo_manager.set_best_block(height, block_hash.hex())
+                continue
+            tx_id, offset = _unpack_str(buf, offset + 1)
+            if op == OP_ADD:
+                index, amount_sats, height = ADD_FIELDS.unpack_from(buf, offset)
+                owner, offset = _unpack_str(buf, offset + ADD_FIELDS.size)
+                utxo_manager.add_utxo_sats(tx_id, index, amount_sats, owner, height)
+            elif op == OP_REMOVE:
+                (index,) = REMOVE_FIELDS.unpack_from(buf, offset)
+                offset += REMOVE_FIELDS.size
+                utxo_manager.remove_utxo(tx_id, index)
+            else:
+                raise ValueError(f"Unknown journal op {op!r} in {self.data_dir}")
+
+    # --- Journal ---
+
+    def record_add(self, tx_id: str, index: int, amount_sats: int, owner: str, height: int):
+        self._pending.append(OP_ADD + _pack_str(tx_id) + ADD_FIELDS.pack(index, amount_sats, height) + _pack_str(owner))
+
+    def record_remove(self, tx_id: str, index: int):
+        self._pending.append(OP_REMOVE + _pack_str(tx_id) + REMOVE_FIELDS.pack(index))
+
+    def record_tip(self, height: int, block_hash: str):
+        self._pending.append(OP_TIP + TIP_FIELDS.pack(height, bytes.fromhex(block_hash)))
+
+    def commit(self):
+        """Write all pending deltas as one journal record and fsync it."""
+        if not self._pending:
+            return
+        payload = b"".join(self._pending)
+        self._pending = []
+        with self._lock:
+            if self._journal is None:
+                self._open_segment(self.segment + 1)
+            self._journal.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def needs_compaction(self) -> bool:
+        return self._journal is not None and self._journal.tell() >= self.compact_threshold
+
+    # --- Snapshots ---
+
+    def write_snapshot(self, utxo_manager):
+        """Synchronously snapshot the current set (pending deltas are committed first)."""
+        self.compact(utxo_manager, background=False)
+
+    def compact(self, utxo_manager, background: bool = True):
+        """
+        Fold the journal into a fresh snapshot.
+        The set's columns are copied (see UTXOManager.snapshot) and the journal
+        rolled over to a new segment right away; encoding the rows, writing the
+        snapshot and deleting old segments can then run in a thread.
+        """
+        self.wait()
+        self.commit()
+        columns = utxo_manager.snapshot()
+        tip = (utxo_manager.best_height, utxo_manager.best_hash)
+        with self._lock:
+            sealed = self.segment
+            self._open_segment(sealed + 1)
+
+        if background:
+            self._compactor = threading.Thread(target=self._write_snapshot, args=(columns, tip, sealed), daemon=True)
+            self._compactor.start()
+        else:
+            self._write_snapshot(columns, tip, sealed)
+
+    def _write_snapshot(self, columns, tip, sealed_segment: int):
+        keys, amounts, owner_ids, heights, owners = columns
+        # Owner ids are the manager's interned ids, so owners without UTXOs may be listed too
+        body = [_pack_str(key[0]) + SNAPSHOT_ENTRY.pack(key[1], amounts[row], owner_ids[row], heights[row])
+                for row, key in enumerate(keys) if key is not None]
+
+        tmp_path = self._snapshot_path() + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, sealed_segment, len(owners), len(body), tip[0], bytes.fromhex(tip[1])))
+            f.write(b"".join(_pack_str(o) for o in owners))
+            f.write(b"".join(body))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path())
+
+        # The snapshot now covers these segments
+        for segment in self._segments():
+            if segment <= sealed_segment:
+                os.remove(self._segment_path(segment))
+
+    def wait(self):
+        """Block until a running background compaction has finished."""
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def close(self):
+        self.commit()
+        self.wait()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
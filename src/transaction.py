@@ -1,18 +1,125 @@
-import time
-import random
+import hashlib
+import struct
 
-def generate_tx_id():
-    """Generates a unique transaction ID."""
-    return f"tx_{int(time.time())}_{random.randint(1000, 9999)}"
+from src.units import to_sats, to_btc
+from src.workers import parallel_map
 
-def create_transaction(inputs, outputs):
+U32 = struct.Struct("<I")
+I64 = struct.Struct("<q")
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return U32.pack(len(data)) + data
+
+WITNESS_ENTRY = 32 + 64  # x-only public key + BIP340 signature
+
+def serialize_transaction(tx) -> bytes:
+    """
+    Canonical byte encoding of a transaction's contents (everything except tx_id
+    and the input signatures). Amounts are encoded as integer satoshis so equal
+    values always hash the same. The wire format (see wire.py) is this followed
+    by serialize_witness(); decoded transactions return their buffer.
+    """
+    raw = getattr(tx, "base_bytes", None)
+    if raw is not None:
+        return raw
+    parts = [U32.pack(len(tx["inputs"]))]
+    for inp in tx["inputs"]:
+        parts.append(_pack_str(inp["prev_tx"]))
+        parts.append(U32.pack(inp["index"]))
+        parts.append(_pack_str(inp["owner"]))
+    parts.append(U32.pack(len(tx["outputs"])))
+    for out in tx["outputs"]:
+        parts.append(I64.pack(to_sats(out["amount"])))
+        parts.append(_pack_str(out["address"]))
+    # Coinbase transactions have no inputs; their extra data keeps them unique
+    parts.append(_pack_str(tx.get("coinbase", "")))
+    return b"".join(parts)
+
+def serialize_witness(tx) -> bytes:
+    """
+    Input public keys and signatures, kept out of the tx_id (like segwit) since
+    a signature can't sign itself: u32 count (0 = unsigned, else one entry per
+    input), then per input 32-byte pubkey + 64-byte signature (zeros if missing).
+    """
+    inputs = tx["inputs"]
+    if not any(inp.get("signature") for inp in inputs):
+        return U32.pack(0)
+    parts = [U32.pack(len(inputs))]
+    for inp in inputs:
+        pubkey, signature = inp.get("pubkey"), inp.get("signature")
+        if pubkey and signature:
+            parts.append(bytes.fromhex(pubkey) + bytes.fromhex(signature))
+        else:
+            parts.append(bytes(WITNESS_ENTRY))
+    return b"".join(parts)
+
+def compute_tx_id(tx) -> str:
+    """Content-addressed ID: double SHA-256 of the canonical serialization (hex)."""
+    return hashlib.sha256(hashlib.sha256(serialize_transaction(tx)).digest()).hexdigest()
+
+def get_tx_id(tx) -> str:
+    """Return the cached tx_id, computing and storing it on first use."""
+    tx_id = tx.get("tx_id")
+    if tx_id is None:
+        tx_id = tx["tx_id"] = compute_tx_id(tx)
+    return tx_id
+
+def assign_tx_ids(txs, workers=None) -> list:
+    """
+    Batch path for bulk ingestion: fill in tx_id for every transaction missing one,
+    hashing large batches on the shared process pool. Returns the IDs in order.
+    """
+    missing = [tx for tx in txs if tx.get("tx_id") is None]
+    for tx, tx_id in zip(missing, parallel_map(compute_tx_id, missing, workers)):
+        tx["tx_id"] = tx_id
+    return [tx["tx_id"] for tx in txs]
+
+def transaction_size(tx) -> int:
+    """Size of the transaction on the wire in bytes (signatures included), used for fee rates."""
+    raw = getattr(tx, "wire_bytes", None)
+    if raw is not None:
+        return len(raw)
+    return len(serialize_transaction(tx)) + len(serialize_witness(tx))
+
+def signature_hash(tx) -> bytes:
+    """The 32-byte message every input signs: the tx_id, which commits to all inputs and outputs."""
+    return bytes.fromhex(get_tx_id(tx))
+
+def sign_transaction(tx, keyring):
+    """Sign every input whose owner address 'keyring' holds the key for (adds pubkey/signature)."""
+    msg = signature_hash(tx)
+    for inp in tx["inputs"]:
+        if inp["owner"] in keyring:
+            inp["pubkey"] = keyring.pubkey(inp["owner"]).hex()
+            inp["signature"] = keyring.sign(inp["owner"], msg).hex()
+    return tx
+
+def create_transaction(inputs, outputs, keyring=None):
     """
-    Creates a transaction dictionary.
-    inputs: list of {"prev_tx": str, "index": int, "owner": str}
-    outputs: list of {"amount": float, "address": str}
+    Creates a transaction dictionary, signed with 'keyring' (see keys.py) if given.
+    inputs: list of {"prev_tx": str, "index": int, "owner": address}
+    outputs: list of {"amount": float, "address": address}
     """
-    return {
-        "tx_id": generate_tx_id(),
-        "inputs": inputs,
+    tx = {
+        "inputs": [dict(inp) for inp in inputs],  # Copies: signing adds fields to each input
         "outputs": outputs
-    }
\ No newline at end of file
+    }
+    tx["tx_id"] = compute_tx_id(tx)
+    if keyring is not None:
+        sign_transaction(tx, keyring)
+    return tx
+
+def create_coinbase_transaction(miner_address: str, amount_sats: int, block_tx_ids: list, height: int):
+    """
+    Creates the miner reward transaction for a block.
+    It commits to the block height (as in BIP34) and the IDs of the transactions it
+    confirms, so no two coinbases share an ID, even those of empty blocks.
+    """
+    tx = {
+        "inputs": [],
+        "outputs": [{"amount": to_btc(amount_sats), "address": miner_address}],
+        "coinbase": hashlib.sha256(f"{height}:{''.join(block_tx_ids)}".encode()).hexdigest()
+    }
+    tx["tx_id"] = compute_tx_id(tx)
+    return tx
@@ -0,0 +1,9 @@
+SATS_PER_BTC = 100_000_000
+
+def to_sats(amount: float) -> int:
+    """Convert a BTC amount to integer satoshis (rounded to the nearest satoshi)."""
+    return int(round(amount * SATS_PER_BTC))
+
+def to_btc(sats: int) -> float:
+    """Convert integer satoshis back to a BTC float for display/API use."""
+    return sats / SATS_PER_BTC
@@ -1,37 +1,378 @@
+import sys
+from array import array
+from bisect import bisect_left, insort
+
+from src.units import to_sats, to_btc
+
+GENESIS_HASH = "0" * 64
+
+class OwnerOutputs:
+    """
+    One owner's rows, sorted by (amount, row) so wallets can select coins by value.
+    Rows are kept in chunks of at most CHUNK (SortedList-style): an insert shifts
+    one small array, not the whole wallet. 'key' is UTXOManager._order.
+    """
+    __slots__ = ("chunks", "maxes")
+    CHUNK = 2048
+
+    def __init__(self):
+        self.chunks = []  # array("l") of rows, each sorted by key
+        self.maxes = []   # key of each chunk's last row
+
+    def __len__(self):
+        return sum(map(len, self.chunks))
+
+    def add(self, row: int, key):
+        k = key(row)
+        if not self.chunks:
+            self.chunks.append(array("l", [row]))
+            self.maxes.append(k)
+            return
+        c = min(bisect_left(self.maxes, k), len(self.chunks) - 1)
+        chunk = self.chunks[c]
+        insort(chunk, row, key=key)
+        self.maxes[c] = key(chunk[-1])
+        if len(chunk) > self.CHUNK:
+            half = len(chunk) // 2
+            self.chunks.insert(c + 1, chunk[half:])
+            self.maxes.insert(c + 1, self.maxes[c])
+            del chunk[half:]
+            self.maxes[c] = key(chunk[-1])
+
+    def remove(self, row: int, key):
+        k = key(row)
+        c = bisect_left(self.maxes, k)
+        chunk = self.chunks[c]
+        del chunk[bisect_left(chunk, k, key=key)]
+        if not chunk:
+            del self.chunks[c]
+            del self.maxes[c]
+        else:
+            self.maxes[c] = key(chunk[-1])
+
+    def ascending(self, key, low_key=0):
+        """Rows with key >= low_key, smallest first."""
+        c = bisect_left(self.maxes, low_key)
+        for i in range(c, len(self.chunks)):
+            chunk = self.chunks[i]
+            start = bisect_left(chunk, low_key, key=key) if i == c else 0
+            yield from chunk[start:]
+
+    def descending(self, key, high_key=None):
+        """Rows with key < high_key (all if None), largest first."""
+        c = len(self.chunks) - 1 if high_key is None else min(bisect_left(self.maxes, high_key), len(self.chunks) - 1)
+        for i in range(c, -1, -1):
+            chunk = self.chunks[i]
+            end = bisect_left(chunk, high_key, key=key) if i == c and high_key is not None else len(chunk)
+            yield from reversed(chunk[:end])
+
 class UTXOManager:
+    """
+    Compact UTXO set.
+    Amounts are stored as integer satoshis and owners are interned to small ids,
+    both in flat array columns. The public API still speaks BTC floats and owner names.
+    """
+
     def __init__(self):
-        # Dictionary mapping (tx_id, index) -> {amount, owner}
-        self.utxo_set = {}
+        # Dictionary mapping (tx_id, index) -> row in the column arrays below
+        self._rows = {}
+        # Column storage (one slot per row). Freed rows are recycled.
+        self._amounts = array("q")    # satoshis
+        self._owner_ids = array("l")  # interned owner id
+        self._heights = array("l")    # height of the block that created the output
+        self._keys = []               # (tx_id, index), None for free rows
+        self._free_rows = []
+        # Interned owners: id -> name and name -> id
+        self._owners = []
+        self._owner_lookup = {}
+        # Secondary indexes by owner id: rows sorted by value and running balance (satoshis)
+        self.owner_index = {}  # owner id -> OwnerOutputs
+        self._balances = array("q")
+        # Block the set is at (set by Blockchain; genesis outputs are height 0)
+        self.best_height = 0
+        self.best_hash = GENESIS_HASH
+        # Optional UTXOStore journaling every change (see attach_store)
+        self.store = None
+        # Optional UTXOCommitment kept up to date with every change (see attach_commitment)
+        self.commitment = None
 
-    def add_utxo(self, tx_id: str, index: int, amount: float, owner: str):
+    def attach_store(self, store):
+        """Journal every add/remove to 'store'; call commit() to make them durable."""
+        self.store = store
+
+    def attach_commitment(self, commitment):
+        """Add the current UTXOs to 'commitment' (one pass), then update it on every add/remove."""
+        for row, key in enumerate(self._keys):
+            if key is not None:
+                commitment.add(key[0], key[1], self._amounts[row], self._owners[self._owner_ids[row]], self._heights[row])
+        self.commitment = commitment
+
+    def commit(self):
+        """Flush journaled changes to disk (called once per mined block)."""
+        if self.store is None:
+            return
+        self.store.commit()
+        if self.store.needs_compaction():
+            self.store.compact(self)
+
+    def set_best_block(self, height: int, block_hash: str):
+        """Record which block the set now reflects (journaled with the block's deltas)."""
+        self.best_height = height
+        self.best_hash = block_hash
+        if self.store is not None:
+            self.store.record_tip(height, block_hash)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _order(self, row: int) -> int:
+        # Sort key for OwnerOutputs: by amount, ties by row
+        return self._amounts[row] << 32 | row
+
+    def _intern_owner(self, owner: str) -> int:
+        owner_id = self._owner_lookup.get(owner)
+        if owner_id is None:
+            owner_id = len(self._owners)
+            self._owners.append(sys.intern(owner))
+            self._owner_lookup[owner] = owner_id
+            self._balances.append(0)
+        return owner_id
+
+    def add_utxo(self, tx_id: str, index: int, amount: float, owner: str, height: int = 0):
         """Add a new UTXO to the set."""
-        self.utxo_set[(tx_id, index)] = {"amount": amount, "owner": owner}
+        self.add_utxo_sats(tx_id, index, to_sats(amount), owner, height)
+
+    def add_utxo_sats(self, tx_id: str, index: int, amount_sats: int, owner: str, height: int = 0):
+        """Add a new UTXO with an amount already in satoshis."""
+        key = (tx_id, index)
+        if key in self._rows:
+            # Overwriting an existing entry: drop it from the old owner's index first
+            self.remove_utxo(tx_id, index)
+        key = (sys.intern(tx_id), index)
+        owner_id = self._intern_owner(owner)
+
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._amounts[row] = amount_sats
+            self._owner_ids[row] = owner_id
+            self._heights[row] = height
+            self._keys[row] = key
+        else:
+            row = len(self._amounts)
+            self._amounts.append(amount_sats)
+            self._owner_ids.append(owner_id)
+            self._heights.append(height)
+            self._keys.append(key)
+
+        self._rows[key] = row
+        outputs = self.owner_index.get(owner_id)
+        if outputs is None:
+            outputs = self.owner_index[owner_id] = OwnerOutputs()
+        outputs.add(row, self._order)
+        self._balances[owner_id] += amount_sats
+        if self.store is not None:
+            self.store.record_add(tx_id, index, amount_sats, owner, height)
+        if self.commitment is not None:
+            self.commitment.add(tx_id, index, amount_sats, owner, height)
 
     def remove_utxo(self, tx_id: str, index: int):
         """Remove a UTXO (when spent)."""
-        if (tx_id, index) in self.utxo_set:
-            del self.utxo_set[(tx_id, index)]
+        key = (tx_id, index)
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        owner_id = self._owner_ids[row]
+        self._balances[owner_id] -= self._amounts[row]
+
+        outputs = self.owner_index[owner_id]
+        outputs.remove(row, self._order)
+        if not outputs.chunks:
+            del self.owner_index[owner_id]
+        self._keys[row] = None
+        self._free_rows.append(row)
+        if self.store is not None:
+            self.store.record_remove(tx_id, index)
+        if self.commitment is not None:
+            self.commitment.remove(tx_id, index, self._amounts[row], self._owners[owner_id], self._heights[row])
+
+    def apply_changes(self, removes, adds):
+        """
+        Remove the (tx_id, index) outpoints in 'removes', then add the
+        (tx_id, index, amount_sats, owner, height) outputs in 'adds'.
+        """
+        for tx_id, index in removes:
+            self.remove_utxo(tx_id, index)
+        for change in adds:
+            self.add_utxo_sats(*change)
 
     def get_balance(self, owner: str) -> float:
-        """Calculate total balance for an address."""
-        balance = 0.0
-        for utxo in self.utxo_set.values():
-            if utxo["owner"] == owner:
-                balance += utxo["amount"]
-        return balance
+        """Return total balance for an address (O(1) via the running balance)."""
+        return to_btc(self.get_balance_sats(owner))
+
+    def get_balance_sats(self, owner: str) -> int:
+        owner_id = self._owner_lookup.get(owner)
+        return 0 if owner_id is None else self._balances[owner_id]
 
     def exists(self, tx_id: str, index: int) -> bool:
         """Check if UTXO exists and is unspent."""
-        return (tx_id, index) in self.utxo_set
+        return (tx_id, index) in self._rows
+
+    def get_utxo(self, tx_id: str, index: int):
+        """Return {amount, amount_sats, owner, height} for an unspent output, or None."""
+        row = self._rows.get((tx_id, index))
+        if row is None:
+            return None
+        return self._record(row)
+
+    def get_many(self, keys) -> list:
+        """get_utxo for each (tx_id, index) key, in order."""
+        return [self.get_utxo(tx_id, index) for tx_id, index in keys]
+
+    def _record(self, row: int) -> dict:
+        amount_sats = self._amounts[row]
+        return {
+            "amount": to_btc(amount_sats),
+            "amount_sats": amount_sats,
+            "owner": self._owners[self._owner_ids[row]],
+            "height": self._heights[row]
+        }
+
+    def items(self):
+        """Iterate over ((tx_id, index), {amount, amount_sats, owner, height}) pairs."""
+        for key, row in self._rows.items():
+            yield key, self._record(row)
+
+    def columns(self):
+        """
+        Raw column storage for bulk readers (see analytics.py): (amounts, owner_ids,
+        heights, free_rows, owners). Rows listed in free_rows hold stale values.
+        Read-only, and only valid until the next change to the set.
+        """
+        return self._amounts, self._owner_ids, self._heights, self._free_rows, self._owners
+
+    def snapshot(self):
+        """
+        Copy of the columns for a background snapshot writer: (keys, amounts,
+        owner_ids, heights, owners), where free rows have key None. Plain
+        list/array copies, so no Python work per UTXO on the calling thread.
+        """
+        return list(self._keys), self._amounts[:], self._owner_ids[:], self._heights[:], list(self._owners)
 
     def get_utxos_for_owner(self, owner: str) -> list:
-        """Get all UTXOs owned by an address (helper for creating txs)."""
+        """Get all UTXOs owned by an address, smallest first (helper for creating txs)."""
         user_utxos = []
-        for key, data in self.utxo_set.items():
-            if data["owner"] == owner:
-                user_utxos.append({
-                    "tx_id": key[0],
-                    "index": key[1],
-                    "amount": data["amount"]
-                })
-        return user_utxos
\ No newline at end of file
+        for tx_id, index, amount_sats in self.iter_owner_utxos(owner):
+            user_utxos.append({
+                "tx_id": tx_id,
+                "index": index,
+                "amount": to_btc(amount_sats),
+                "amount_sats": amount_sats
+            })
+        return user_utxos
+
+    def iter_owner_utxos(self, owner: str, min_sats: int = 0, max_sats=None, largest_first: bool = False):
+        """
+        Yield (tx_id, index, amount_sats) for an owner's UTXOs worth min_sats..max_sats,
+        in value order. Starting point is found by bisection, so a wallet with 100k
+        outputs only pays for the coins actually visited. Don't modify the set while iterating.
+        """
+        outputs = self.owner_index.get(self._owner_lookup.get(owner))
+        if outputs is None:
+            return
+        if largest_first:
+            high_key = None if max_sats is None else (max_sats + 1) << 32
+            rows = outputs.descending(self._order, high_key)
+        else:
+            rows = outputs.ascending(self._order, min_sats << 32)
+        for row in rows:
+            amount_sats = self._amounts[row]
+            if amount_sats < min_sats or (max_sats is not None and amount_sats > max_sats):
+                return
+            tx_id, index = self._keys[row]
+            yield tx_id, index, amount_sats
+
+class UTXOView:
+    """
+    Copy-on-write overlay on top of a UTXOManager (or another view).
+    Reads fall through to the base; adds and spends are kept in the overlay until
+    flush() writes them to the base in one go. Dropping the view discards them.
+    prefetch() reads many base records in one batch (one round trip per shard
+    for a ShardedUTXOManager) ahead of the reads that need them.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.added = {}   # (tx_id, index) -> {amount, amount_sats, owner, height}
+        self.spent = {}   # (tx_id, index) -> base record it hides (kept for undo data)
+        self.cache = {}   # (tx_id, index) -> base record or None, read by prefetch()
+
+    def prefetch(self, keys):
+        """Read the base records of 'keys' in one base.get_many call."""
+        missing = [key for key in dict.fromkeys(keys) if key not in self.cache]
+        if missing:
+            self.cache.update(zip(missing, self.base.get_many(missing)))
+
+    def _base_record(self, key):
+        if key in self.cache:
+            return self.cache[key]
+        return self.base.get_utxo(*key)
+
+    def get_many(self, keys) -> list:
+        keys = list(keys)
+        self.prefetch([key for key in keys if key not in self.added and key not in self.spent])
+        return [self.get_utxo(tx_id, index) for tx_id, index in keys]
+
+    def exists(self, tx_id: str, index: int) -> bool:
+        return self.get_utxo(tx_id, index) is not None
+
+    def get_utxo(self, tx_id: str, index: int):
+        key = (tx_id, index)
+        record = self.added.get(key)
+        if record is not None:
+            return record
+        if key in self.spent:
+            return None
+        return self._base_record(key)
+
+    def add_utxo(self, tx_id: str, index: int, amount: float, owner: str, height: int = 0):
+        self.add_utxo_sats(tx_id, index, to_sats(amount), owner, height)
+
+    def add_utxo_sats(self, tx_id: str, index: int, amount_sats: int, owner: str, height: int = 0):
+        self.added[(tx_id, index)] = {
+            "amount": to_btc(amount_sats),
+            "amount_sats": amount_sats,
+            "owner": owner,
+            "height": height
+        }
+
+    def remove_utxo(self, tx_id: str, index: int):
+        key = (tx_id, index)
+        if self.added.pop(key, None) is not None:
+            return  # Created and spent inside the overlay: the base never sees it
+        record = self._base_record(key)
+        if record is not None:
+            self.spent[key] = record
+
+    def apply_changes(self, removes, adds):
+        for tx_id, index in removes:
+            self.remove_utxo(tx_id, index)
+        for change in adds:
+            self.add_utxo_sats(*change)
+
+    def flush(self) -> dict:
+        """
+        Apply the overlay to the base and return undo data:
+        {"spent": [(tx_id, index, amount_sats, owner, height)], "created": [(tx_id, index)]}
+        """
+        undo = {
+            "spent": [(tx_id, index, record["amount_sats"], record["owner"], record["height"])
+                      for (tx_id, index), record in self.spent.items()],
+            "created": list(self.added),
+        }
+        adds = [(tx_id, index, record["amount_sats"], record["owner"], record["height"])
+                for (tx_id, index), record in self.added.items()]
+        self.base.apply_changes(list(self.spent), adds)
+        self.added = {}
+        self.spent = {}
+        self.cache = {}
+        return undo
@@ -1,47 +1,240 @@
-def validate_transaction(tx, utxo_manager, mempool):
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+
+from src.units import to_sats, to_btc
+from src.transaction import compute_tx_id, signature_hash
+from src.keys import address_from_pubkey
+from src.schnorr import verify, batch_verify
+from src.workers import parallel_map
+from src import metrics
+
+# Signatures already verified (at mempool admission), so mining and re-validation
+# skip the elliptic-curve work. Bounded LRU: sha256(pubkey + msg + sig) -> None.
+# The node checks batches on an executor thread, hence the lock.
+SIG_CACHE_SIZE = 100_000
+BATCH_VERIFY_SIZE = 64  # Signatures per batch verification
+_sig_cache = OrderedDict()
+_sig_cache_lock = threading.Lock()
+
+# What reading a transaction with missing or mistyped fields raises
+MALFORMED_ERRORS = (KeyError, TypeError, ValueError, AttributeError, struct.error)
+MALFORMED = "Malformed transaction"
+
+def _cache_key(pubkey: bytes, msg: bytes, sig: bytes) -> bytes:
+    return hashlib.sha256(pubkey + msg + sig).digest()
+
+def _cache_hit(key) -> bool:
+    with _sig_cache_lock:
+        hit = key in _sig_cache
+        if hit:
+            _sig_cache.move_to_end(key)
+    if hit:
+        if metrics.ENABLED:
+            metrics.inc("sig_cache_total", result="hit")
+        return True
+    if metrics.ENABLED:
+        metrics.inc("sig_cache_total", result="miss")
+    return False
+
+def _cache_add(key):
+    with _sig_cache_lock:
+        _sig_cache[key] = None
+        if len(_sig_cache) > SIG_CACHE_SIZE:
+            _sig_cache.popitem(last=False)
+
+def clear_signature_cache():
+    with _sig_cache_lock:
+        _sig_cache.clear()
+
+def _input_signature(inp, msg: bytes):
+    """(pubkey, msg, sig) as bytes for one input, or None if missing or not hex."""
+    pubkey, sig = inp.get("pubkey"), inp.get("signature")
+    if not pubkey or not sig:
+        return None
+    try:
+        return bytes.fromhex(pubkey), msg, bytes.fromhex(sig)
+    except (ValueError, TypeError):
+        return None
+
+def check_input_signature(tx, i: int):
+    """Verify input i's signature over the tx digest (cached). Returns (ok, message)."""
+    item = _input_signature(tx["inputs"][i], signature_hash(tx))
+    if item is None:
+        return False, f"Missing signature for input {i}"
+    key = _cache_key(*item)
+    if _cache_hit(key):
+        return True, ""
+    if not verify(*item):
+        return False, f"Invalid signature for input {i}"
+    _cache_add(key)
+    return True, ""
+
+def _check_structure(tx):
+    """Rules that need nothing but the transaction itself, except signatures."""
+    try:
+        return _check_fields(tx)
+    except MALFORMED_ERRORS as e:
+        # Missing or mistyped fields: reject this tx alone, never the batch around it
+        return False, malformed_message(e)
+
+def malformed_message(error) -> str:
+    return f"{MALFORMED}: {type(error).__name__}: {error}"
+
+def _check_fields(tx):
+    if tx["tx_id"] != compute_tx_id(tx):
+        return False, "Transaction ID does not match its contents"
+    if not tx["inputs"]:
+        return False, "Transaction has no inputs"
+
+    used_inputs_in_this_tx = set()
+    for inp in tx["inputs"]:
+        tx_key = (inp["prev_tx"], inp["index"])
+        if tx_key in used_inputs_in_this_tx:
+            return False, "Double spend detected within transaction inputs"
+        used_inputs_in_this_tx.add(tx_key)
+
+    for out in tx["outputs"]:
+        if out["amount"] < 0:
+            return False, "Output amount cannot be negative"
+    return True, "Transaction Valid"
+
+def check_transaction_stateless(tx):
+    """
+    Checks that need nothing but the transaction itself (ID, Rules 2 and 4, signatures).
+    Safe to run in any process. Returns: (is_valid: bool, message: str)
+    """
+    ok, msg = _check_structure(tx)
+    if not ok:
+        return ok, msg
+    for i in range(len(tx["inputs"])):
+        ok, msg = check_input_signature(tx, i)
+        if not ok:
+            return ok, msg
+    return True, "Transaction Valid"
+
+def _verify_chunk(items) -> list:
+    """One verdict per (pubkey, msg, sig); a failed batch is re-checked one by one."""
+    if batch_verify(items):
+        return [True] * len(items)
+    return [verify(*item) for item in items]
+
+@metrics.timed("stateless_batch")
+def check_transactions_stateless(txs, workers=None) -> list:
+    """
+    Run the stateless checks over a batch. Structure is checked per transaction;
+    signatures not already cached are then checked together with batch
+    verification, in chunks split across worker processes when the batch is
+    large enough to pay for it. Results are in input order.
+    """
+    results = parallel_map(_check_structure, txs, workers)
+
+    pending = []  # (tx position, input index, cache key, (pubkey, msg, sig))
+    for pos, tx in enumerate(txs):
+        if not results[pos][0]:
+            continue
+        msg = signature_hash(tx)
+        for i, inp in enumerate(tx["inputs"]):
+            item = _input_signature(inp, msg)
+            if item is None:
+                results[pos] = (False, f"Missing signature for input {i}")
+                break
+            key = _cache_key(*item)
+            if not _cache_hit(key):
+                pending.append((pos, i, key, item))
+
+    chunks = [[p[3] for p in pending[i:i + BATCH_VERIFY_SIZE]] for i in range(0, len(pending), BATCH_VERIFY_SIZE)]
+    verdicts = [ok for chunk in parallel_map(_verify_chunk, chunks, workers, min_batch=2) for ok in chunk]
+    for (pos, i, key, _), ok in zip(pending, verdicts):
+        if ok:
+            _cache_add(key)
+        elif results[pos][0]:
+            results[pos] = (False, f"Invalid signature for input {i}")
+    return results
+
+@metrics.timed("validate", lambda r: "valid" if r[0] else metrics.rejection_reason(r[1]))
+def validate_transaction(tx, utxo_manager, mempool, prechecked=False, allow_replacement=False):
     """
     Validates a transaction against UTXO set and Mempool.
+    Inputs may spend confirmed UTXOs or outputs of pending mempool transactions.
+    Amounts are summed as integer satoshis so fee math is exact.
+    'prechecked' skips the stateless rules when check_transaction_stateless already passed.
+    'mempool' may be None (block validation): then only confirmed inputs count.
+    'allow_replacement' lets inputs that pending txs already spend through; the mempool
+    then decides whether this tx may replace them (replace-by-fee).
     Returns: (is_valid: bool, message: str, fee: float)
     """
-    input_sum = 0.0
-    output_sum = 0.0
+    try:
+        return _validate(tx, utxo_manager, mempool, prechecked, allow_replacement)
+    except MALFORMED_ERRORS as e:
+        return False, malformed_message(e), 0.0
+
+def _validate(tx, utxo_manager, mempool, prechecked, allow_replacement):
+    # Never trust a supplied ID: outputs are stored under it once mined
+    if not prechecked:
+        if tx["tx_id"] != compute_tx_id(tx):
+            return False, "Transaction ID does not match its contents", 0.0
+        if not tx["inputs"]:
+            return False, "Transaction has no inputs", 0.0
+
+    input_sum = 0
+    output_sum = 0
     
     # 1. Check if inputs exist and calculate input sum
     used_inputs_in_this_tx = set()
+    # One batched lookup for every input (a sharded set answers it shard-parallel)
+    confirmed = utxo_manager.get_many([(inp["prev_tx"], inp["index"]) for inp in tx["inputs"]])
     
-    for inp in tx["inputs"]:
+    for i, inp in enumerate(tx["inputs"]):
         tx_key = (inp["prev_tx"], inp["index"])
         
-        # Rule 1: Input must exist in UTXO set
-        if not utxo_manager.exists(inp["prev_tx"], inp["index"]):
+        # Rule 1: Input must exist in UTXO set (or be an unconfirmed mempool output)
+        utxo_data = confirmed[i]
+        if utxo_data is None and mempool is not None:
+            utxo_data = mempool.get_unconfirmed_output(inp["prev_tx"], inp["index"])
+        if utxo_data is None:
             return False, f"Input {tx_key} does not exist in UTXO set", 0.0
         
         # Rule 2: No double spending within the same transaction
-        if tx_key in used_inputs_in_this_tx:
-            return False, f"Double spend detected within transaction inputs", 0.0
-        used_inputs_in_this_tx.add(tx_key)
+        if not prechecked:
+            if tx_key in used_inputs_in_this_tx:
+                return False, f"Double spend detected within transaction inputs", 0.0
+            used_inputs_in_this_tx.add(tx_key)
 
         # Rule 5: No conflict with mempool (Race Attack Check)
-        if tx_key in mempool.spent_utxos:
-            return False, f"UTXO {tx_key} already spent in pending transaction (Mempool conflict)", 0.0
+        if mempool is not None and not allow_replacement and tx_key in mempool.spent_utxos:
+            return False, f"UTXO {tx_key} already spent in pending transaction {mempool.spent_utxos[tx_key]} (Mempool conflict)", 0.0
 
-        # Verify owner (Simple signature simulation)
-        utxo_data = utxo_manager.utxo_set[tx_key]
+        # Verify owner: the input's key must hash to the UTXO's address and sign the tx
         if utxo_data["owner"] != inp["owner"]:
              return False, f"Signature mismatch: {inp['owner']} cannot spend {utxo_data['owner']}'s UTXO", 0.0
+        pubkey = inp.get("pubkey")
+        if not pubkey:
+            return False, f"Missing signature for input {i}", 0.0
+        try:
+            key_address = address_from_pubkey(bytes.fromhex(pubkey))
+        except ValueError:
+            return False, f"Invalid signature for input {i}", 0.0
+        if key_address != utxo_data["owner"]:
+            return False, f"Signature mismatch: key for {key_address} cannot spend {utxo_data['owner']}'s UTXO", 0.0
+        if not prechecked:
+            ok, msg = check_input_signature(tx, i)
+            if not ok:
+                return False, msg, 0.0
 
-        input_sum += utxo_data["amount"]
+        input_sum += utxo_data["amount_sats"]
 
     # Calculate output sum
     for out in tx["outputs"]:
         # Rule 4: No negative amounts
-        if out["amount"] < 0:
+        if not prechecked and out["amount"] < 0:
             return False, "Output amount cannot be negative", 0.0
-        output_sum += out["amount"]
+        output_sum += to_sats(out["amount"])
 
     # Rule 3: Sum(inputs) >= Sum(outputs)
     if input_sum < output_sum:
-        return False, f"Insufficient funds: Inputs ({input_sum}) < Outputs ({output_sum})", 0.0
+        return False, f"Insufficient funds: Inputs ({to_btc(input_sum)}) < Outputs ({to_btc(output_sum)})", 0.0
 
     fee = input_sum - output_sum
-    return True, "Transaction Valid", fee
\ No newline at end of file
+    return True, "Transaction Valid", to_btc(fee)
@@ -0,0 +1,232 @@
+import struct
+
+from src.transaction import U32, I64, WITNESS_ENTRY, serialize_transaction, serialize_witness, compute_tx_id
+from src.chain import compute_block_hash
+from src.pow import HEADER
+from src.units import to_btc
+
+# Binary wire format (little-endian). A transaction is its canonical
+# serialization followed by the witness:
+#   u32 input count,  per input:  str prev_tx, u32 index, str owner
+#   u32 output count, per output: i64 amount (sats), str address
+#   str coinbase data
+#   u32 witness count (0 or input count), per entry: 32-byte pubkey, 64-byte signature
+# where str = u32 byte length + UTF-8 bytes. The tx_id covers everything before
+# the witness, so signatures don't change it.
+# A block is: the 80-byte header (see pow.HEADER), u32 tx count,
+# then per tx: u32 byte length + transaction bytes. Its hash is recomputed on decode.
+
+_UNSIGNED = bytes(WITNESS_ENTRY)  # Witness entry of an input with no signature
+
+def _skip_str(buf, offset: int):
+    """Return (start, end) of the string at 'offset' without copying it."""
+    (length,) = U32.unpack_from(buf, offset)
+    start = offset + U32.size
+    end = start + length
+    if end > len(buf):
+        raise ValueError("Malformed transaction: string runs past end of buffer")
+    return start, end
+
+def _read_str(buf, start: int, end: int) -> str:
+    return str(buf[start:end], "utf-8")
+
+class InputView:
+    """Read-only input backed by the transaction buffer; supports inp["prev_tx"] etc."""
+    __slots__ = ("_buf", "_prev_tx", "_index", "_owner", "_witness")
+
+    def __init__(self, buf, prev_tx, index_offset, owner):
+        self._buf = buf
+        self._prev_tx = prev_tx
+        self._index = index_offset
+        self._owner = owner
+        self._witness = None  # Offset of this input's pubkey + signature, if signed
+
+    def __getitem__(self, key):
+        if key == "prev_tx":
+            return _read_str(self._buf, *self._prev_tx)
+        if key == "index":
+            return U32.unpack_from(self._buf, self._index)[0]
+        if key == "owner":
+            return _read_str(self._buf, *self._owner)
+        if key == "pubkey" and self._witness is not None:
+            return self._buf[self._witness:self._witness + 32].hex()
+        if key == "signature" and self._witness is not None:
+            return self._buf[self._witness + 32:self._witness + WITNESS_ENTRY].hex()
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+class OutputView:
+    """Read-only output backed by the transaction buffer; supports out["amount"] etc."""
+    __slots__ = ("_buf", "_amount", "_address")
+
+    def __init__(self, buf, amount_offset, address):
+        self._buf = buf
+        self._amount = amount_offset
+        self._address = address
+
+    def __getitem__(self, key):
+        if key == "amount":
+            return to_btc(I64.unpack_from(self._buf, self._amount)[0])
+        if key == "amount_sats":
+            return I64.unpack_from(self._buf, self._amount)[0]
+        if key == "address":
+            return _read_str(self._buf, *self._address)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+class TxView:
+    """
+    A decoded transaction that reads its fields straight out of a memoryview.
+    It behaves like the dict from create_transaction (tx["inputs"], tx["tx_id"], ...),
+    so the validator, mempool and mining code accept it unchanged.
+    """
+    __slots__ = ("_buf", "_inputs", "_outputs", "_coinbase", "_tx_id")
+
+    def __init__(self, buf, inputs, outputs, coinbase):
+        self._buf = buf
+        self._inputs = inputs
+        self._outputs = outputs
+        self._coinbase = coinbase
+        self._tx_id = None
+
+    @property
+    def wire_bytes(self):
+        """The encoded transaction, witness included (a memoryview, no copy)."""
+        return self._buf
+
+    @property
+    def base_bytes(self):
+        """The part the tx_id is computed over (everything before the witness)."""
+        return self._buf[:self._coinbase[1]]
+
+    def __getitem__(self, key):
+        if key == "tx_id":
+            if self._tx_id is None:
+                self._tx_id = compute_tx_id(self)
+            return self._tx_id
+        if key == "inputs":
+            return self._inputs
+        if key == "outputs":
+            return self._outputs
+        if key == "coinbase" and self._coinbase[1] > self._coinbase[0]:
+            return _read_str(self._buf, *self._coinbase)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __reduce__(self):
+        # Pickle as bytes so views can be sent to worker processes
+        return decode_transaction, (bytes(self._buf),)
+
+    def to_dict(self) -> dict:
+        """Copy into the plain dict form used by create_transaction."""
+        inputs = []
+        for i in self._inputs:
+            inp = {"prev_tx": i["prev_tx"], "index": i["index"], "owner": i["owner"]}
+            if i.get("signature"):
+                inp["pubkey"] = i["pubkey"]
+                inp["signature"] = i["signature"]
+            inputs.append(inp)
+        tx = {
+            "tx_id": self["tx_id"],
+            "inputs": inputs,
+            "outputs": [{"amount": o["amount"], "address": o["address"]} for o in self._outputs]
+        }
+        if "coinbase" in self:
+            tx["coinbase"] = self["coinbase"]
+        return tx
+
+def encode_transaction(tx) -> bytes:
+    raw = getattr(tx, "wire_bytes", None)
+    if raw is not None:
+        return bytes(raw)
+    return serialize_transaction(tx) + serialize_witness(tx)
+
+def decode_transaction(data) -> TxView:
+    """Parse a transaction without copying: only field offsets are recorded."""
+    buf = memoryview(data)
+    try:
+        (count,) = U32.unpack_from(buf, 0)
+        offset = U32.size
+        inputs = []
+        for _ in range(count):
+            prev_tx = _skip_str(buf, offset)
+            index_offset = prev_tx[1]
+            owner = _skip_str(buf, index_offset + U32.size)
+            inputs.append(InputView(buf, prev_tx, index_offset, owner))
+            offset = owner[1]
+
+        (count,) = U32.unpack_from(buf, offset)
+        offset += U32.size
+        outputs = []
+        for _ in range(count):
+            address = _skip_str(buf, offset + I64.size)
+            outputs.append(OutputView(buf, offset, address))
+            offset = address[1]
+
+        coinbase = _skip_str(buf, offset)
+        (count,) = U32.unpack_from(buf, coinbase[1])
+    except Exception as e:
+        # struct.error on truncation, or our own ValueError
+        raise ValueError(f"Malformed transaction: {e}") from None
+    if count not in (0, len(inputs)):
+        raise ValueError("Malformed transaction: witness count does not match inputs")
+    offset = coinbase[1] + U32.size
+    for inp in inputs[:count]:
+        if buf[offset:offset + WITNESS_ENTRY] != _UNSIGNED:
+            inp._witness = offset
+        offset += WITNESS_ENTRY
+    if offset != len(buf):
+        raise ValueError("Malformed transaction: trailing bytes" if offset < len(buf) else "Malformed transaction: witness truncated")
+    return TxView(buf, inputs, outputs, coinbase)
+
+BLOCK_HEADER = struct.Struct(HEADER.format + "I")  # header, tx count
+
+def encode_block(block) -> bytes:
+    """Encode a block dict (see chain.Blockchain.create_block) into one buffer."""
+    transactions = block["transactions"]
+    parts = [BLOCK_HEADER.pack(block["height"], bytes.fromhex(block["prev_hash"]), bytes.fromhex(block["merkle_root"]),
+                               block["timestamp"], block["bits"], block["nonce"], len(transactions))]
+    for tx in transactions:
+        raw = encode_transaction(tx)
+        parts.append(U32.pack(len(raw)))
+        parts.append(raw)
+    return b"".join(parts)
+
+def decode_block(data) -> dict:
+    """Decode a block; its transactions are TxViews sharing the block's buffer."""
+    buf = memoryview(data)
+    try:
+        height, prev_hash, root, timestamp, bits, nonce, count = BLOCK_HEADER.unpack_from(buf, 0)
+        offset = BLOCK_HEADER.size
+        transactions = []
+        for _ in range(count):
+            start, end = _skip_str(buf, offset)
+            transactions.append(decode_transaction(buf[start:end]))
+            offset = end
+    except Exception as e:
+        # struct.error on truncation, or a transaction's own ValueError
+        raise ValueError(f"Malformed block: {e}") from None
+    if offset != len(buf):
+        raise ValueError("Malformed block: trailing bytes")
+    block = {"height": height, "prev_hash": prev_hash.hex(), "merkle_root": root.hex(),
+             "timestamp": timestamp, "bits": bits, "nonce": nonce, "transactions": transactions}
+    block["hash"] = compute_block_hash(block)
+    return block
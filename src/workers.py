@@ -0,0 +1,28 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Batches smaller than this run inline: process start-up and pickling cost more
+PARALLEL_MIN_BATCH = 256
+_pool = None
+
+def _run_chunk(func, items):
+    return [func(item) for item in items]
+
+def parallel_map(func, items, workers=None, min_batch=PARALLEL_MIN_BATCH) -> list:
+    """
+    Apply 'func' (a module-level function) to every item, splitting large batches
+    across a shared process pool. Results come back in input order.
+    """
+    global _pool
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or len(items) < min_batch:
+        return [func(item) for item in items]
+
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers)
+    chunk = -(-len(items) // (workers * 4))
+    parts = [items[i:i + chunk] for i in range(0, len(items), chunk)]
+    results = []
+    for part in _pool.map(_run_chunk, [func] * len(parts), parts):
+        results.extend(part)
+    return results
@@ -0,0 +1,116 @@
+import itertools
+import random
+
+from src.mempool import MAX_ANCESTORS, MAX_DESCENDANTS
+from src.transaction import create_transaction
+from src.keys import DEMO_KEYS
+from src.units import to_btc, SATS_PER_BTC
+
+class Workload:
+    """
+    Seeded synthetic traffic.
+    Wallets are funded genesis-style (one "genesis" tx with many outputs). Payments
+    then follow a skewed graph: a few wallets are very active senders and a few
+    addresses ("merchants") receive most payments. The generator tracks every
+    wallet's coins, including unconfirmed change, so each transaction it yields is
+    valid if all earlier ones were accepted, and it keeps unconfirmed chains inside
+    the mempool's package limits. Wallets and merchants are demo keys in 'keyring'
+    (named "wallet_<i>"/"merchant_<i>"), which signs every input. The same seed
+    gives the same traffic (signatures use fresh nonces, so tx ids still match).
+    """
+
+    def __init__(self, n_wallets=1000, coins_per_wallet=4, n_merchants=50, seed=1, keyring=DEMO_KEYS):
+        self.rng = random.Random(seed)
+        self.keyring = keyring
+        self.wallets = [keyring.address(f"wallet_{i}") for i in range(n_wallets)]
+        self.merchants = [keyring.address(f"merchant_{i}") for i in range(n_merchants)]
+        self.coins_per_wallet = coins_per_wallet
+        self.coins = {}  # owner -> list of (tx_id, index, amount_sats)
+        self.genesis = []
+        self.ancestors = {}    # unconfirmed tx_id -> set of unconfirmed ancestor ids
+        self.descendants = {}  # unconfirmed tx_id -> descendant count, itself included (as in Mempool)
+        for w, wallet in enumerate(self.wallets):
+            for c in range(coins_per_wallet):
+                # Log-normal balances: mostly small coins, a few large ones (median ~0.5 BTC)
+                sats = max(10_000, int(self.rng.lognormvariate(0, 1.5) * SATS_PER_BTC / 2))
+                index = w * coins_per_wallet + c
+                self.genesis.append((index, sats, wallet))
+                self.coins.setdefault(wallet, []).append(("genesis", index, sats))
+        # Zipf-like activity: wallet k sends with weight 1 / (k + 1)
+        # (cumulative, so each draw is a bisection rather than a pass over every wallet)
+        self._sender_weights = list(itertools.accumulate(1 / (k + 1) for k in range(n_wallets)))
+        self._merchant_weights = list(itertools.accumulate(1 / (k + 1) for k in range(n_merchants)))
+
+    def fund(self, utxo_manager):
+        """Create the starting UTXO set (same outputs for every run with this seed)."""
+        for index, sats, wallet in self.genesis:
+            utxo_manager.add_utxo_sats("genesis", index, sats, wallet)
+
+    def confirm(self, tx_ids):
+        """Forget confirmed transactions so their outputs stop counting toward chain limits."""
+        for tx_id in tx_ids:
+            self.ancestors.pop(tx_id, None)
+            self.descendants.pop(tx_id, None)
+
+    def _package(self, spent):
+        """Unconfirmed ancestors of a tx spending 'spent', or None if it would break a limit."""
+        ancestors = set()
+        for prev_tx, _, _ in spent:
+            if prev_tx in self.ancestors:
+                ancestors.add(prev_tx)
+                ancestors |= self.ancestors[prev_tx]
+        ancestors &= self.ancestors.keys()  # Drop ones confirmed since
+        if len(ancestors) + 1 > MAX_ANCESTORS:
+            return None
+        if any(self.descendants[a] + 1 > MAX_DESCENDANTS for a in ancestors):
+            return None
+        return ancestors
+
+    def _pick_recipient(self, sender):
+        if self.rng.random() < 0.6:
+            return self.rng.choices(self.merchants, cum_weights=self._merchant_weights)[0]
+        recipient = self.rng.choice(self.wallets)
+        return recipient if recipient != sender else self.rng.choice(self.merchants)
+
+    def transactions(self, n):
+        """Yield up to 'n' payment transactions (stops early if every wallet is empty)."""
+        made = 0
+        attempts = 0
+        while made < n and attempts < 20 * n:
+            attempts += 1
+            sender = self.rng.choices(self.wallets, cum_weights=self._sender_weights)[0]
+            coins = self.coins.get(sender)
+            if not coins:
+                continue
+
+            # Spend 1-3 coins, pay part of them, return the rest as change
+            self.rng.shuffle(coins)
+            spent = [coins.pop() for _ in range(min(len(coins), self.rng.randint(1, 3)))]
+            total = sum(c[2] for c in spent)
+            fee = self.rng.randint(200, 5_000)
+            if total <= fee + 1_000:
+                continue  # Dust: drop it rather than build an invalid tx
+            ancestors = self._package(spent)
+            if ancestors is None:
+                coins.extend(spent)  # Too deep for now; try again after a block
+                continue
+            pay = self.rng.randint(1_000, total - fee)
+            change = total - fee - pay
+            recipient = self._pick_recipient(sender)
+
+            outputs = [{"amount": to_btc(pay), "address": recipient}]
+            if change > 0:
+                outputs.append({"amount": to_btc(change), "address": sender})
+            tx = create_transaction(
+                [{"prev_tx": c[0], "index": c[1], "owner": sender} for c in spent],
+                outputs, self.keyring
+            )
+            self.ancestors[tx["tx_id"]] = ancestors
+            self.descendants[tx["tx_id"]] = 1
+            for a in ancestors:
+                self.descendants[a] += 1
+            self.coins.setdefault(recipient, []).append((tx["tx_id"], 0, pay))
+            if change > 0:
+                coins.append((tx["tx_id"], 1, change))
+            made += 1
+            yield tx
@@ -9,8 +9,12 @@ sys.path.append(parent_dir)
 
 from src.utxo_manager import UTXOManager
 from src.mempool import Mempool
-from src.transaction import create_transaction
+from src.transaction import create_transaction, compute_tx_id, signature_hash
 from src.mining import mine_block
+from src.chain import Blockchain, compute_block_hash, merkle_root
+from src.pow import POW_LIMIT, target_to_bits, check_pow, mine_header
+from src.keys import DEMO_KEYS, demo_address
+from src.commitment import UTXOCommitment, verify_utxo
 
 def print_result(test_name, success, message=""):
     status = "✅ PASS" if success else "❌ FAIL"
@@ -27,44 +31,65 @@ def run_security_audit():
     utxo = UTXOManager()
     mempool = Mempool()
     
-    # Genesis: Alice=50, Bob=30
-    utxo.add_utxo("genesis", 0, 50.0, "Alice")
-    utxo.add_utxo("genesis", 1, 30.0, "Bob")
+    # Genesis: Alice=50, Bob=30 (coins locked to the demo keys' addresses)
+    alice, bob, eve = map(demo_address, ["Alice", "Bob", "Eve"])
+    utxo.add_utxo("genesis", 0, 50.0, alice)
+    utxo.add_utxo("genesis", 1, 30.0, bob)
 
     # --- TEST 1: The "Negative Money" Printer ---
     # Attempt: Create a transaction with negative output (printing money)
-    inputs = [{"prev_tx": "genesis", "index": 0, "owner": "Alice"}]
+    inputs = [{"prev_tx": "genesis", "index": 0, "owner": alice}]
     outputs = [
-        {"amount": -100.0, "address": "Bob"}, # Malicious negative amount
-        {"amount": 150.0, "address": "Alice"} # Trying to gain free money
+        {"amount": -100.0, "address": bob}, # Malicious negative amount
+        {"amount": 150.0, "address": alice} # Trying to gain free money
     ]
-    tx_neg = create_transaction(inputs, outputs)
+    tx_neg = create_transaction(inputs, outputs, DEMO_KEYS)
     success, msg = mempool.add_transaction(tx_neg, utxo)
     print_result("Detect Negative Outputs", not success, msg)
 
     # --- TEST 2: The "Inflation" Attack ---
     # Attempt: Output total (100) > Input total (50)
-    outputs_inf = [{"amount": 100.0, "address": "Bob"}]
-    tx_inf = create_transaction(inputs, outputs_inf)
+    outputs_inf = [{"amount": 100.0, "address": bob}]
+    tx_inf = create_transaction(inputs, outputs_inf, DEMO_KEYS)
     success, msg = mempool.add_transaction(tx_inf, utxo)
     print_result("Detect Inflation (In < Out)", not success, msg)
 
     # --- TEST 3: The "Signature Spoofing" Attack ---
-    # Attempt: Eve tries to spend Alice's coin
-    inputs_theft = [{"prev_tx": "genesis", "index": 0, "owner": "Eve"}] # Eve claims Alice's UTXO
-    outputs_theft = [{"amount": 50.0, "address": "Eve"}]
+    # Attempt: Eve names Alice's address as the owner but can only sign with her own key
+    inputs_theft = [{"prev_tx": "genesis", "index": 0, "owner": alice}]
+    outputs_theft = [{"amount": 50.0, "address": eve}]
     tx_theft = create_transaction(inputs_theft, outputs_theft)
+    tx_theft["inputs"][0]["pubkey"] = DEMO_KEYS.pubkey(eve).hex()
+    tx_theft["inputs"][0]["signature"] = DEMO_KEYS.sign(eve, signature_hash(tx_theft)).hex()
     success, msg = mempool.add_transaction(tx_theft, utxo)
     print_result("Detect Signature Spoofing", not success, msg)
 
+    # --- TEST 3b: Forged and Missing Signatures ---
+    # Attempt: Alice's public key with Eve's signature, then no signature at all
+    tx_forged = create_transaction(inputs_theft, outputs_theft)
+    tx_forged["inputs"][0]["pubkey"] = DEMO_KEYS.pubkey(alice).hex()
+    tx_forged["inputs"][0]["signature"] = DEMO_KEYS.sign(eve, signature_hash(tx_forged)).hex()
+    success, msg = mempool.add_transaction(tx_forged, utxo)
+    print_result("Detect Forged Signature", not success and "Invalid signature" in msg, msg)
+    success, msg = mempool.add_transaction(create_transaction(inputs_theft, outputs_theft), utxo)
+    print_result("Detect Unsigned Input", not success and "Missing signature" in msg, msg)
+
+    # --- TEST 3c: Tampering After Signing ---
+    # Attempt: redirect a signed payment to Eve (the ID is recomputed, the signature can't be)
+    tx_tampered = create_transaction(inputs, [{"amount": 49.0, "address": bob}], DEMO_KEYS)
+    tx_tampered["outputs"][0]["address"] = eve
+    tx_tampered["tx_id"] = compute_tx_id(tx_tampered)
+    success, msg = mempool.add_transaction(tx_tampered, utxo)
+    print_result("Detect Tampered Outputs", not success and "Invalid signature" in msg, msg)
+
     # --- TEST 4: The "Double Spend" (Mempool Conflict) ---
     # 1. Valid TX: Alice -> Bob (50)
-    outputs_valid = [{"amount": 50.0, "address": "Bob"}]
-    tx_valid = create_transaction(inputs, outputs_valid)
+    outputs_valid = [{"amount": 50.0, "address": bob}]
+    tx_valid = create_transaction(inputs, outputs_valid, DEMO_KEYS)
     mempool.add_transaction(tx_valid, utxo)
     
     # 2. Malicious TX: Alice -> Eve (50) using SAME input
-    tx_double = create_transaction(inputs, [{"amount": 50.0, "address": "Eve"}])
+    tx_double = create_transaction(inputs, [{"amount": 50.0, "address": eve}], DEMO_KEYS)
     success, msg = mempool.add_transaction(tx_double, utxo)
     print_result("Prevent Mempool Double Spend", not success, msg)
 
@@ -78,11 +103,69 @@ def run_security_audit():
 
     # --- TEST 6: The "Non-Existent Input" Attack ---
     # Attempt: Spending a coin that never existed
-    inputs_fake = [{"prev_tx": "fake_tx_id", "index": 0, "owner": "Alice"}]
-    tx_fake = create_transaction(inputs_fake, [{"amount": 10.0, "address": "Bob"}])
+    inputs_fake = [{"prev_tx": "fake_tx_id", "index": 0, "owner": alice}]
+    tx_fake = create_transaction(inputs_fake, [{"amount": 10.0, "address": bob}], DEMO_KEYS)
     success, msg = mempool.add_transaction(tx_fake, utxo)
     print_result("Detect Non-Existent Input", not success, msg)
 
+    # --- TEST 7: The "Half-Applied Block" ---
+    # Attempt: A block where two transactions spend Bob's same coin
+    chain = Blockchain(utxo)
+    before = sorted(utxo.items())
+    spend_bob = [{"prev_tx": "genesis", "index": 1, "owner": bob}]
+    tx_a = create_transaction(spend_bob, [{"amount": 30.0, "address": alice}], DEMO_KEYS)
+    tx_b = create_transaction(spend_bob, [{"amount": 30.0, "address": eve}], DEMO_KEYS)
+    success, msg = chain.connect_block(chain.create_block("Miner1", [tx_a, tx_b], 0))
+    print_result("Reject Conflicting Block Atomically", not success and sorted(utxo.items()) == before, msg)
+
+    # --- TEST 8: Reorg Undo ---
+    # A valid block is connected, then disconnected: the set must be exactly as before
+    success, msg = chain.connect_block(chain.create_block("Miner1", [tx_a], 0))
+    chain.disconnect_block()
+    print_result("Undo Block Restores UTXO Set", success and sorted(utxo.items()) == before, msg)
+
+    # --- TEST 9: Forged Proof-of-Work ---
+    # Attempt: a block whose nonce misses the target, then one mined at an easier target than required
+    hard_chain = Blockchain(utxo, initial_bits=target_to_bits(POW_LIMIT >> 12), workers=1)
+    block = hard_chain.create_block("Miner1", [tx_a], 0)
+    while check_pow(block["hash"], block["bits"]):
+        block["nonce"] += 1
+        block["hash"] = compute_block_hash(block)
+    success, msg = hard_chain.connect_block(block)
+    print_result("Reject Block Missing the PoW Target", not success and "target" in msg and sorted(utxo.items()) == before, msg)
+
+    block["bits"] = Blockchain(utxo).next_bits()
+    mine_header(block, workers=1)
+    success, msg = hard_chain.connect_block(block)
+    print_result("Reject Block With Easier Difficulty", not success and "difficulty" in msg and sorted(utxo.items()) == before, msg)
+
+    # Attempt: redirect the reward of a valid block, keeping the coinbase's old tx_id
+    # (so the merkle root and header hash still match)
+    block = chain.create_block("Miner1", [tx_a], 0)
+    block["transactions"][0]["outputs"][0]["address"] = eve
+    success, msg = chain.connect_block(block)
+    print_result("Reject Block With Forged Coinbase", not success and "Coinbase ID" in msg and sorted(utxo.items()) == before, msg)
+
+    # Attempt: a coinbase paying +1000 BTC to the miner and -1000 BTC elsewhere (sums to 0)
+    block = chain.block_template("Miner1", [tx_a], 0)
+    coinbase = block["transactions"][0]
+    coinbase["outputs"] = [{"amount": 1000.0, "address": demo_address("Miner1")}, {"amount": -1000.0, "address": eve}]
+    coinbase["tx_id"] = compute_tx_id(coinbase)
+    block["merkle_root"] = merkle_root([tx["tx_id"] for tx in block["transactions"]])
+    chain.solve_block(block)
+    success, msg = chain.connect_block(block)
+    print_result("Reject Coinbase With Negative Output", not success and "negative" in msg and sorted(utxo.items()) == before, msg)
+
+    # --- TEST 10: Forged Inclusion Proofs ---
+    # Attempt: prove Bob's coin is worth more, then reuse its proof for Alice's spent coin
+    utxo.attach_commitment(UTXOCommitment())
+    root = utxo.commitment.root
+    proof = utxo.commitment.prove("genesis", 1)
+    inflated = verify_utxo(root, "genesis", 1, 31 * 10**8, bob, 0, proof)
+    print_result("Reject Proof With Inflated Amount", not inflated and verify_utxo(root, "genesis", 1, 30 * 10**8, bob, 0, proof))
+    spent = verify_utxo(root, "genesis", 0, 50 * 10**8, alice, 0, proof)
+    print_result("Reject Proof For Spent Coin", not spent and utxo.commitment.prove("genesis", 0) is None)
+
     print("\n" + "="*40)
     print("AUDIT COMPLETE")
     print("="*40)
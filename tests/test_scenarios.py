@@ -1,21 +1,34 @@
+import time
+
 from src.transaction import create_transaction
+from src.mempool import Mempool
+from src.wire import encode_transaction, decode_transaction
+from src import metrics
+from src.wallet import create_payment, bump_fee
+from src.keys import DEMO_KEYS, demo_address
+from src.validator import check_transactions_stateless
+from src.sharding import ShardedUTXOManager
+from src.utxo_manager import UTXOManager
+from src.commitment import UTXOCommitment, verify_utxo
 
 def run_tests(utxo_manager, mempool, mine_block_func):
     print("\n--- Running Test Scenarios ---")
     
     # Helper to reset state for tests (Optional, but clean)
     mempool.clear()
+    # Genesis coins belong to the demo keys' addresses (see main.initialize_genesis)
+    alice, bob, charlie, david, eve = map(demo_address, ["Alice", "Bob", "Charlie", "David", "Eve"])
     
     # Test 1: Basic Valid Transaction
     print("\n[Test 1] Basic Valid Transaction (Alice -> Bob)")
     # Alice has 50 BTC at (genesis, 0)
-    inputs = [{"prev_tx": "genesis", "index": 0, "owner": "Alice"}]
+    inputs = [{"prev_tx": "genesis", "index": 0, "owner": alice}]
     # Send 10 to Bob, 39.999 Change to Alice (0.001 Fee)
     outputs = [
-        {"amount": 10.0, "address": "Bob"},
-        {"amount": 39.999, "address": "Alice"}
+        {"amount": 10.0, "address": bob},
+        {"amount": 39.999, "address": alice}
     ]
-    tx1 = create_transaction(inputs, outputs)
+    tx1 = create_transaction(inputs, outputs, DEMO_KEYS)
     success, msg = mempool.add_transaction(tx1, utxo_manager)
     print(f"Result: {success} - {msg}")
 
@@ -23,9 +36,9 @@ def run_tests(utxo_manager, mempool, mine_block_func):
     print("\n[Test 3/4] Double Spend Attempt")
     # Try to spend the SAME input (genesis, 0) again
     # Sending to Charlie
-    inputs_bad = [{"prev_tx": "genesis", "index": 0, "owner": "Alice"}]
-    outputs_bad = [{"amount": 50.0, "address": "Charlie"}]
-    tx_bad = create_transaction(inputs_bad, outputs_bad)
+    inputs_bad = [{"prev_tx": "genesis", "index": 0, "owner": alice}]
+    outputs_bad = [{"amount": 50.0, "address": charlie}]
+    tx_bad = create_transaction(inputs_bad, outputs_bad, DEMO_KEYS)
     
     success, msg = mempool.add_transaction(tx_bad, utxo_manager)
     print(f"Result (Should Fail): {success} - {msg}")
@@ -33,34 +46,148 @@ def run_tests(utxo_manager, mempool, mine_block_func):
     # Test 5: Insufficient Funds
     print("\n[Test 5] Insufficient Funds")
     # Bob has 30 BTC (genesis, 1). Try to send 35.
-    inputs_broke = [{"prev_tx": "genesis", "index": 1, "owner": "Bob"}]
-    outputs_broke = [{"amount": 35.0, "address": "Charlie"}]
-    tx_broke = create_transaction(inputs_broke, outputs_broke)
+    inputs_broke = [{"prev_tx": "genesis", "index": 1, "owner": bob}]
+    outputs_broke = [{"amount": 35.0, "address": charlie}]
+    tx_broke = create_transaction(inputs_broke, outputs_broke, DEMO_KEYS)
     success, msg = mempool.add_transaction(tx_broke, utxo_manager)
     print(f"Result: {success} - {msg}")
 
     # Test 6: Negative Amount
     print("\n[Test 6] Negative Output")
-    outputs_neg = [{"amount": -5.0, "address": "Bob"}]
-    tx_neg = create_transaction(inputs, outputs_neg) # Reuse valid inputs
+    outputs_neg = [{"amount": -5.0, "address": bob}]
+    tx_neg = create_transaction(inputs, outputs_neg, DEMO_KEYS) # Reuse valid inputs
     success, msg = mempool.add_transaction(tx_neg, utxo_manager)
     print(f"Result: {success} - {msg}")
 
-    # Test 8: Race Attack (First Seen Rule)
-    print("\n[Test 8] Race Attack Simulation")
+    # Test 8: Race Attack / Replace-by-fee
+    print("\n[Test 8] Race Attack Simulation (Replace-by-fee)")
     mempool.clear() # Clear mempool to reset locks
     # 1. Low fee tx arrives
-    out_low = [{"amount": 10.0, "address": "Bob"}, {"amount": 39.999, "address": "Alice"}] # Fee 0.001
-    tx_low = create_transaction(inputs, out_low)
+    out_low = [{"amount": 10.0, "address": bob}, {"amount": 39.999, "address": alice}] # Fee 0.001
+    tx_low = create_transaction(inputs, out_low, DEMO_KEYS)
     mempool.add_transaction(tx_low, utxo_manager)
     print("1. Low fee transaction broadcast first.")
     
     # 2. High fee tx arrives trying to spend same input
-    out_high = [{"amount": 10.0, "address": "Bob"}, {"amount": 39.0, "address": "Alice"}] # Fee 1.0
-    tx_high = create_transaction(inputs, out_high)
+    out_high = [{"amount": 10.0, "address": bob}, {"amount": 39.0, "address": alice}] # Fee 1.0
+    tx_high = create_transaction(inputs, out_high, DEMO_KEYS)
     success, msg = mempool.add_transaction(tx_high, utxo_manager)
     print(f"2. High fee transaction broadcast second.")
-    print(f"Result (First-Seen Rule): {success} - {msg}")
+    print(f"Result (Higher fee replaces the first tx): {success and tx_low['tx_id'] not in mempool.entries} - {msg}")
+
+    # Test 9: Fee-rate eviction when the mempool is full
+    print("\n[Test 9] Full Mempool Eviction")
+    small_pool = Mempool(max_size=1)
+    # Bob pays 0.001 fee, then Charlie pays 1.0 fee while the pool is full
+    tx_cheap = create_transaction([{"prev_tx": "genesis", "index": 1, "owner": bob}], [{"amount": 29.999, "address": alice}], DEMO_KEYS)
+    small_pool.add_transaction(tx_cheap, utxo_manager)
+    tx_rich = create_transaction([{"prev_tx": "genesis", "index": 2, "owner": charlie}], [{"amount": 19.0, "address": alice}], DEMO_KEYS)
+    success, msg = small_pool.add_transaction(tx_rich, utxo_manager)
+    print(f"Result (Should evict low fee tx): {success} - {msg}")
+
+    # Test 10: Spending unconfirmed change, Child-Pays-For-Parent
+    print("\n[Test 10] Chained Unconfirmed Transactions (CPFP)")
+    mempool.clear()
+    # David pays almost no fee; Eve spends that output before it is mined and pays 1.0
+    tx_parent = create_transaction([{"prev_tx": "genesis", "index": 3, "owner": david}], [{"amount": 9.9999, "address": eve}], DEMO_KEYS)
+    mempool.add_transaction(tx_parent, utxo_manager)
+    tx_child = create_transaction([{"prev_tx": tx_parent["tx_id"], "index": 0, "owner": eve}], [{"amount": 8.9999, "address": bob}], DEMO_KEYS)
+    success, msg = mempool.add_transaction(tx_child, utxo_manager)
+    print(f"Child accepted: {success} - {msg}")
+    template = [item["tx"]["tx_id"] for item in mempool.build_block_template(2)]
+    print(f"Result (Parent pulled in first): {template == [tx_parent['tx_id'], tx_child['tx_id']]}")
+
+    # Test 11: Submitting a transaction decoded from the binary wire format
+    print("\n[Test 11] Binary Wire Format")
+    raw = encode_transaction(tx_child)
+    decoded = decode_transaction(raw)
+    print(f"Encoded size: {len(raw)} bytes, same ID after decoding: {decoded['tx_id'] == tx_child['tx_id']}")
+    mempool.clear()
+    success, msg = mempool.add_transaction(decode_transaction(encode_transaction(tx_parent)), utxo_manager)
+    print(f"Result (Decoded tx accepted): {success} - {msg}")
+
+    # Test 12: Instrumentation counts admissions by outcome
+    print("\n[Test 12] Metrics")
+    was_enabled = metrics.ENABLED
+    metrics.enable()
+    mempool.clear()
+    mempool.add_transaction(tx_parent, utxo_manager)
+    mempool.add_transaction(tx_parent, utxo_manager)
+    counts = {row["labels"]["result"]: row["value"] for row in metrics.snapshot()["counters"] if row["name"] == "mempool_add_total"}
+    print(f"Result (Accepted and rejected counted): {counts.get('accepted', 0) >= 1 and counts.get('already_in_mempool', 0) >= 1} - {counts}")
+    if not was_enabled:
+        metrics.disable()
+
+    # Test 13: Wallet coin selection, several recipients in one transaction
+    print("\n[Test 13] Wallet Coin Selection")
+    mempool.clear()
+    tx_batch, msg = create_payment(utxo_manager, bob, [(alice, 5.0), (charlie, 2.5), (david, 1.0)], fee_rate=2.0, mempool=mempool)
+    print(f"Selected: {msg}")
+    success, msg = mempool.add_transaction(tx_batch, utxo_manager)
+    print(f"Result (Batched payment accepted): {success} - {msg}")
+    tx_again, msg = create_payment(utxo_manager, bob, [(eve, 1.0)], mempool=mempool)
+    print(f"Result (Coins pending in mempool are skipped): {tx_again is None} - {msg}")
+
+    # Test 14: Batch signature checks pick out the one bad signature
+    print("\n[Test 14] Batch Signature Verification")
+    forged = create_transaction([{"prev_tx": "genesis", "index": 4, "owner": eve}], [{"amount": 4.9, "address": alice}], DEMO_KEYS)
+    forged["inputs"][0]["signature"] = tx1["inputs"][0]["signature"]
+    results = check_transactions_stateless([tx1, tx_parent, forged, tx_child])
+    print(f"Result (Only the forged tx fails): {[ok for ok, _ in results] == [True, True, False, True]} - {results[2][1]}")
+
+    # Test 15: Bumping the fee of a stuck transaction evicts its descendants
+    print("\n[Test 15] Fee Bump (RBF with Descendants)")
+    mempool.clear()
+    # Charlie pays Bob with a tiny fee, and Bob spends the payment before it confirms
+    tx_stuck = create_transaction([{"prev_tx": "genesis", "index": 2, "owner": charlie}],
+                                  [{"amount": 5.0, "address": bob}, {"amount": 14.99999, "address": charlie}], DEMO_KEYS)
+    tx_spend = create_transaction([{"prev_tx": tx_stuck["tx_id"], "index": 0, "owner": bob}], [{"amount": 4.9999, "address": alice}], DEMO_KEYS)
+    mempool.add_transaction(tx_stuck, utxo_manager)
+    mempool.add_transaction(tx_spend, utxo_manager)
+    tx_bump, msg = bump_fee(mempool, tx_stuck["tx_id"], fee_rate=50.0)
+    print(f"Bump: {msg}")
+    success, msg = mempool.add_transaction(tx_bump, utxo_manager)
+    print(f"Result (Parent and child replaced): {success and list(mempool.entries) == [tx_bump['tx_id']]} - {msg}")
+    success, msg = mempool.add_transaction(tx_stuck, utxo_manager)
+    print(f"Result (Original can't come back at its lower fee): {not success} - {msg}")
+
+    # Test 16: Stale transactions expire without scanning the pool
+    print("\n[Test 16] Mempool Expiry")
+    aging_pool = Mempool(expiry=3600)
+    aging_pool.add_transaction(tx_parent, utxo_manager)
+    aging_pool.add_transaction(tx_child, utxo_manager)
+    kept = aging_pool.expire(now=time.time() + 60)
+    expired = aging_pool.expire(now=time.time() + 7200)
+    print(f"Result (Both expire after an hour, not before): {kept == [] and len(expired) == 2 and len(aging_pool) == 0} - {expired}")
+
+    # Test 17: A set sharded over worker processes answers like the in-process one
+    print("\n[Test 17] Sharded UTXO Set")
+    sharded = ShardedUTXOManager(shards=2)
+    sharded.apply_changes([], [(tx_id, index, record["amount_sats"], record["owner"], record["height"])
+                               for (tx_id, index), record in utxo_manager.items()])
+    verdicts = [Mempool().add_transactions([tx1, tx_bad], utxo) for utxo in (utxo_manager, sharded)]
+    same = (sorted(sharded.items()) == sorted(utxo_manager.items()) and verdicts[0] == verdicts[1]
+            and sharded.get_balance(alice) == utxo_manager.get_balance(alice))
+    sharded.close()
+    print(f"Result (Same UTXOs, balances and verdicts): {same} - {[ok for ok, _ in verdicts[1]]}")
+
+    # Test 18: Commitments compare whole sets and prove single UTXOs without a scan
+    print("\n[Test 18] UTXO Set Commitment")
+    rows = sorted(utxo_manager.items())
+    live, rebuilt = UTXOManager(), UTXOManager()
+    live.attach_commitment(UTXOCommitment())  # Updated on every add...
+    for (tx_id, index), record in rows:
+        live.add_utxo_sats(tx_id, index, record["amount_sats"], record["owner"], record["height"])
+    for (tx_id, index), record in reversed(rows):
+        rebuilt.add_utxo_sats(tx_id, index, record["amount_sats"], record["owner"], record["height"])
+    rebuilt.attach_commitment(UTXOCommitment())  # ...or built in one pass, in another order
+    same = (live.commitment.digest() == rebuilt.commitment.digest() and live.commitment.root == rebuilt.commitment.root)
+    (tx_id, index), record = rows[0]
+    rebuilt.remove_utxo(tx_id, index)
+    changed = rebuilt.commitment.digest() != live.commitment.digest()
+    proof = live.commitment.prove(tx_id, index)
+    proven = verify_utxo(live.commitment.root, tx_id, index, record["amount_sats"], record["owner"], record["height"], proof)
+    print(f"Result (Equal sets match, a spend changes the digest, proof checks): {same and changed and proven} - {len(proof)} proof hashes")
 
     # Clean up for main execution
     mempool.clear()